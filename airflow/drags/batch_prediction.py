@@ -6,6 +6,19 @@ import os
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 
+# number of shards the pending input files are split into, each one is scored by its own mapped task
+N_PREDICTION_SHARDS = int(os.getenv("N_PREDICTION_SHARDS", "4"))
+# cores one shard may use; by default every shard could land on the same host, so the host is split between all of them
+PREDICTION_SHARD_CPUS = int(os.getenv("PREDICTION_SHARD_CPUS", "0")) or max(1, (os.cpu_count() or 1)//N_PREDICTION_SHARDS)
+
+# the tasks may run on different workers without a shared volume, so every task exchanges its files through
+# the object store: inputs under input_files, outputs under prediction_files and quarantine_files and the
+# manifest of scored files under prediction_manifest
+INPUT_DIR = "/app/input_files"
+PREDICTION_DIR = "/app/prediction"
+MANIFEST_DIR = "/app/prediction_manifest"
+SHARD_DIR = "/app/prediction_shards"
+
 
 with DAG(
     'sensor_training',
@@ -18,43 +31,98 @@ with DAG(
     tags=['example'],
 ) as dag:
 
+    def get_batch_prediction_config(shard_index=None):
+        from sensor.entity.config_entity import BatchPredictionConfig
+        #write only row_id and predictions as compressed parquet, the input columns are already in s3
+        #files already scored by the current champion model are skipped using the manifest
+        #every shard writes its predictions and quarantined inputs to its own folders, which it uploads itself
+        prediction_dir = PREDICTION_DIR
+        if shard_index is not None:
+            prediction_dir = os.path.join(SHARD_DIR, str(shard_index), "prediction")
+        return BatchPredictionConfig(prediction_dir=prediction_dir, max_threads=PREDICTION_SHARD_CPUS,
+                                    output_format="parquet", compression="zstd", passthrough_columns=[],
+                                    manifest_file_path=os.path.join(MANIFEST_DIR, "manifest.yaml"))
+
+    def plan_shards(**kwargs):
+        from sensor.object_store import ObjectStoreSync
+        from sensor.pipeline.batch_prediction import plan_batch_prediction_shards
+        #only new or changed input files are downloaded, the planner hashes them against the manifest
+        ObjectStoreSync().download_dir(prefix="input_files", local_dir=INPUT_DIR)
+        ObjectStoreSync().download_dir(prefix="prediction_manifest", local_dir=MANIFEST_DIR)
+        #pin the model version and split pending files into size balanced shards, one mapped task per shard
+        return plan_batch_prediction_shards(input_dir=INPUT_DIR, n_shards=N_PREDICTION_SHARDS,
+                                            batch_prediction_config=get_batch_prediction_config())
+
+    def shard_op_kwargs(**kwargs):
+        plan = kwargs["ti"].xcom_pull(task_ids="plan_shards")
+        return [{"input_file_paths": shard["input_file_paths"], "model_version": plan["model_version"],
+                 "shard_index": shard["shard_index"]} for shard in plan["shards"]]
+
+    def batch_prediction(input_file_paths, model_version, shard_index, **kwargs):
+        import shutil
+        from sensor.object_store import ObjectStoreSync
+        from sensor.pipeline.batch_prediction import predict_shard
+        #the shard downloads only its own input files, to the same paths they have in the plan
+        ObjectStoreSync().download_keys(prefix="input_files", local_dir=INPUT_DIR,
+            relative_keys=["/".join(os.path.relpath(input_file_path, INPUT_DIR).split(os.sep))
+                           for input_file_path in input_file_paths])
+        shutil.rmtree(os.path.join(SHARD_DIR, str(shard_index)), ignore_errors=True)
+        batch_prediction_config = get_batch_prediction_config(shard_index=shard_index)
+        #make prediction for every file of the shard, the model is loaded once per worker process
+        summary = predict_shard(input_file_paths=input_file_paths, model_version=model_version, shard_index=shard_index,
+                                batch_prediction_config=batch_prediction_config)
+        ObjectStoreSync().upload_dir(local_dir=batch_prediction_config.prediction_dir, prefix="prediction_files")
+        #quarantined inputs and their validation reports go to their own prefix
+        if os.path.isdir(batch_prediction_config.quarantine_dir):
+            ObjectStoreSync().upload_dir(local_dir=batch_prediction_config.quarantine_dir, prefix="quarantine_files")
+        return summary
+
+    def gather_predictions(**kwargs):
+        from sensor.object_store import ObjectStoreSync
+        from sensor.pipeline.batch_prediction import gather_shard_summaries
+        ti = kwargs["ti"]
+        plan = ti.xcom_pull(task_ids="plan_shards")
+        if plan is None:
+            raise Exception("No shard plan, plan_shards did not succeed")
+        #no shard is mapped when every input file was already scored, a failed shard task has no summary
+        shard_summaries = list(ti.xcom_pull(task_ids="prediction") or [])
+        ObjectStoreSync().download_dir(prefix="prediction_manifest", local_dir=MANIFEST_DIR)
+        try:
+            #one run summary and manifest update for all shards, raises once both are written if any file failed
+            gather_shard_summaries(plan=plan, shard_summaries=shard_summaries,
+                                   batch_prediction_config=get_batch_prediction_config())
+        finally:
+            #the shards uploaded their predictions, the run summary and the manifest are uploaded from this same task
+            report = ObjectStoreSync().upload_dir(local_dir=PREDICTION_DIR, prefix="prediction_files")
+            report["manifest"] = ObjectStoreSync().upload_dir(local_dir=MANIFEST_DIR, prefix="prediction_manifest")
+        return report
     
-    def download_files(**kwargs):
-        bucket_name = os.getenv("BUCKET_NAME")
-        input_dir = "/app/input_files"
-        #creating directory
-        os.makedirs(input_dir,exist_ok=True)
-        os.system(f"aws s3 sync s3://{bucket_name}/input_files /app/input_files")
-
-    def batch_prediction(**kwargs):
-        from sensor.pipeline.batch_prediction import start_batch_prediction
-        input_dir = "/app/input_files"
-        for file_name in os.listdir(input_dir):
-            #make prediction
-            start_batch_prediction(input_file_path=os.path.join(input_dir,file_name))
-    
-    def sync_prediction_dir_to_s3_bucket(**kwargs):
-        bucket_name = os.getenv("BUCKET_NAME")
-        #upload prediction folder to predictionfiles folder in s3 bucket
-        os.system(f"aws s3 sync /app/prediction s3://{bucket_name}/prediction_files")
-    
 
-    download_input_files  = PythonOperator(
-            task_id="download_file",
-            python_callable=download_files
+    plan_prediction_shards = PythonOperator(
+            task_id="plan_shards",
+            python_callable=plan_shards
+
+    )
+
+    list_prediction_shards = PythonOperator(
+            task_id="list_shards",
+            python_callable=shard_op_kwargs
 
     )
 
-    generate_prediction_files = PythonOperator(
+    #dynamic task mapping (airflow>=2.3): one prediction task instance per shard, each can run on its own worker
+    generate_prediction_files = PythonOperator.partial(
             task_id="prediction",
             python_callable=batch_prediction
 
-    )
+    ).expand(op_kwargs=list_prediction_shards.output)
 
-    upload_prediction_files = PythonOperator(
-            task_id="upload_prediction_files",
-            python_callable=sync_prediction_dir_to_s3_bucket
+    #runs once every shard is done, failed or not, and when the plan has no shard and the prediction task is skipped
+    gather_prediction_files = PythonOperator(
+            task_id="gather_predictions",
+            python_callable=gather_predictions,
+            trigger_rule="all_done"
 
     )
 
-    download_input_files >> generate_prediction_files >> upload_prediction_files
\ No newline at end of file
+    plan_prediction_shards >> list_prediction_shards >> generate_prediction_files >> gather_prediction_files
\ No newline at end of file
@@ -24,9 +24,10 @@ with DAG(
         start_training_pipeline()
     
     def sync_artifact_to_s3_bucket(**kwargs):
-        bucket_name = os.getenv("BUCKET_NAME")
-        os.system(f"aws s3 sync /app/artifact s3://{bucket_name}/artifacts")
-        os.system(f"aws s3 sync /app/saved_models s3://{bucket_name}/saved_models")
+        from sensor.object_store import ObjectStoreSync
+        object_store_sync = ObjectStoreSync()
+        return {"artifacts": object_store_sync.upload_dir(local_dir="/app/artifact", prefix="artifacts"),
+                "saved_models": object_store_sync.upload_dir(local_dir="/app/saved_models", prefix="saved_models")}
 
     training_pipeline  = PythonOperator(
             task_id="train_pipeline",
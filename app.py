@@ -0,0 +1,6 @@
+import uvicorn
+from sensor.entity.config_entity import ServingConfig
+
+if __name__=="__main__":
+    serving_config = ServingConfig()
+    uvicorn.run("sensor.serving.app:create_app", factory=True, host=serving_config.host, port=serving_config.port)
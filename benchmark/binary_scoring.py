@@ -0,0 +1,71 @@
+"""
+Throughput of the bulk binary scoring payloads against the csv path of start_batch_prediction
+
+python -m benchmark.binary_scoring --input_file_path input.csv --model_registry saved_models
+"""
+from sensor.predictor import Predictor, predict_dataframe
+from sensor.serving import binary_codec
+from sensor.serving.scoring_service import ScoringService
+from sensor.entity.config_entity import ServingConfig
+import pandas as pd
+import numpy as np
+import argparse
+import io
+import time
+
+
+def time_call(fn, repeat:int)->float:
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def run(input_file_path:str, model_registry:str="saved_models", repeat:int=3)->pd.DataFrame:
+    service = ScoringService(serving_config=ServingConfig(model_registry=model_registry, reload_poll_seconds=None))
+    bundle = Predictor(model_registry=model_registry).get_bundle()
+    service.bundle = bundle
+    feature_names = list(bundle.transformer.feature_names_in_)
+
+    df = pd.read_csv(input_file_path, na_values="na")
+    matrix = df[feature_names].to_numpy(dtype=np.float32)
+    with open(input_file_path, "rb") as file_obj:
+        csv_payload = file_obj.read()
+    float32_payload = binary_codec.encode_float32_matrix(feature_names, matrix)
+    arrow_payload = binary_codec.encode_arrow_matrix(feature_names, matrix)
+
+    def score_csv():
+        csv_df = pd.read_csv(io.BytesIO(csv_payload))
+        csv_df.replace({"na": np.nan}, inplace=True)
+        csv_df = predict_dataframe(df=csv_df, transformer=bundle.transformer, model=bundle.model,
+                                   target_encoder=bundle.target_encoder)
+        csv_df[["prediction", "cat_pred"]].to_csv(io.StringIO(), index=False)
+
+    def score_float32():
+        names, rows = binary_codec.decode_float32_matrix(float32_payload)
+        prediction, _, _ = service.predict_matrix(matrix=rows, feature_names=names)
+        binary_codec.encode_prediction_int32(prediction)
+
+    def score_arrow():
+        names, rows = binary_codec.decode_arrow_matrix(arrow_payload)
+        prediction, cat_prediction, _ = service.predict_matrix(matrix=rows, feature_names=names)
+        binary_codec.encode_arrow_predictions(prediction, cat_prediction)
+
+    results = []
+    for name, payload, fn in [("csv", csv_payload, score_csv), ("float32", float32_payload, score_float32),
+                              ("arrow", arrow_payload, score_arrow)]:
+        seconds = time_call(fn, repeat=repeat)
+        results.append({"payload": name, "payload_bytes": len(payload), "seconds": round(seconds, 4),
+                        "rows_per_second": round(len(df)/seconds, 1)})
+    return pd.DataFrame(results)
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_file_path", required=True)
+    parser.add_argument("--model_registry", default="saved_models")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(run(input_file_path=args.input_file_path, model_registry=args.model_registry, repeat=args.repeat).to_string(index=False))
@@ -0,0 +1,72 @@
+"""
+Import time of the entry points used by the Airflow DAGs, each measured in a fresh interpreter.
+Fails when an import pulls in a heavy library it does not need or takes longer than --max_seconds,
+so it can run in CI to keep DAG parsing and batch prediction start up fast.
+
+python -m benchmark.import_time
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pymongo", "scipy", "sklearn", "imblearn", "xgboost"]
+
+# module imported -> heavy modules it is allowed to load
+IMPORT_TARGETS = {
+    "sensor.pipeline.batch_prediction": [],
+    "sensor.pipeline.training_pipeline": [],
+    "sensor.serving.scoring_service": [],
+}
+DAG_FILES = [os.path.join(ROOT_DIR, "airflow", "drags", "batch_prediction.py"),
+             os.path.join(ROOT_DIR, "airflow", "drags", "training_pipeline.py")]
+
+_MEASURE = """
+import json, sys, time
+start_time = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start_time
+print(json.dumps({{"seconds": seconds, "modules": [name for name in {heavy} if name in sys.modules]}}))
+"""
+
+
+def measure(statement:str)->dict:
+    # run from a scratch directory so the logs folder created on import does not land in the repository
+    work_dir = tempfile.mkdtemp(prefix="sensor_import_time_")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, os.getenv("PYTHONPATH")])))
+    try:
+        output = subprocess.run([sys.executable, "-c", _MEASURE.format(statement=statement, heavy=HEAVY_MODULES)],
+                                cwd=work_dir, env=env, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if output.returncode != 0:
+        return {"seconds": None, "modules": [], "error": output.stderr.strip().splitlines()[-1]}
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def run(max_seconds:float=2.0)->bool:
+    passed = True
+    targets = [(f"import {module_name}", module_name, allowed) for module_name, allowed in IMPORT_TARGETS.items()]
+    for dag_file in DAG_FILES:
+        targets.append((f"exec(compile(open({dag_file!r}).read(), {dag_file!r}, 'exec'))", os.path.relpath(dag_file, ROOT_DIR), []))
+    for statement, name, allowed in targets:
+        result = measure(statement)
+        if "error" in result:
+            print(f"SKIP {name}: {result['error']}")
+            continue
+        unexpected = [module_name for module_name in result["modules"] if module_name not in allowed]
+        ok = not unexpected and result["seconds"] <= max_seconds
+        passed = passed and ok
+        print(f"{'OK  ' if ok else 'FAIL'} {name}: {result['seconds']:.3f}s heavy modules loaded: {unexpected or 'none'}")
+    return passed
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max_seconds", type=float, default=2.0)
+    args = parser.parse_args()
+    sys.exit(0 if run(max_seconds=args.max_seconds) else 1)
@@ -0,0 +1,67 @@
+"""
+Rows/s of XGBClassifier.predict on float64 against InplacePredictor on float32, alone and with concurrent callers
+
+python -m benchmark.inplace_predict --n_rows 200000 --n_callers 4
+"""
+from sensor.predictor import InplacePredictor
+from benchmark.synthetic_data import make_aps_dataframe
+from sensor.config import TARGET_COLUMN
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import numpy as np
+import argparse
+import os
+import time
+
+
+def time_call(fn, repeat:int)->float:
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def run(n_rows:int=200000, n_train_rows:int=20000, n_features:int=170, n_callers:int=4, batch_rows:int=64,
+        repeat:int=3, seed:int=42)->pd.DataFrame:
+    from xgboost import XGBClassifier
+    train_df = make_aps_dataframe(n_rows=n_train_rows, n_features=n_features, seed=seed)
+    y = (train_df.pop(TARGET_COLUMN) == "pos").astype(int).to_numpy()
+    model = XGBClassifier(n_estimators=100, tree_method="hist")
+    model.fit(train_df.replace("na", np.nan).to_numpy(dtype=np.float64), y)
+
+    x = make_aps_dataframe(n_rows=n_rows, n_features=n_features, seed=seed+1,
+                           with_target=False).replace("na", np.nan).to_numpy(dtype=np.float64)
+    n_threads = max(1, (os.cpu_count() or 1)//n_callers)
+    predictors = {"xgb_predict": model,
+                  "inplace_predict": InplacePredictor(model=model),
+                  "inplace_predict_capped": InplacePredictor(model=model, nthread=n_threads)}
+    if not all(np.array_equal(predictor.predict(x[:1000]), model.predict(x[:1000])) for predictor in predictors.values()):
+        raise Exception("Inplace predictions differ from XGBClassifier.predict")
+
+    results = []
+    for name, predictor in predictors.items():
+        single_seconds = time_call(lambda: predictor.predict(x), repeat=repeat)
+        parts = np.array_split(x, n_callers)
+        with ThreadPoolExecutor(max_workers=n_callers) as executor:
+            concurrent_seconds = time_call(lambda: list(executor.map(predictor.predict, parts)), repeat=repeat)
+        # many small calls, like the micro batches of the scoring service, where the per call overhead dominates
+        batches = np.array_split(x[:batch_rows*200], 200)
+        small_batch_seconds = time_call(lambda: [predictor.predict(batch) for batch in batches], repeat=repeat)
+        results.append({"backend": name,
+                        "rows_per_second": round(n_rows/single_seconds, 1),
+                        f"rows_per_second_{batch_rows}_row_calls": round(batch_rows*200/small_batch_seconds, 1),
+                        f"rows_per_second_{n_callers}_callers": round(n_rows/concurrent_seconds, 1)})
+    return pd.DataFrame(results)
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_rows", type=int, default=200000)
+    parser.add_argument("--n_callers", type=int, default=4)
+    parser.add_argument("--batch_rows", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(run(n_rows=args.n_rows, n_callers=args.n_callers, batch_rows=args.batch_rows,
+              repeat=args.repeat).to_string(index=False))
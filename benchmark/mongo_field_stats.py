@@ -0,0 +1,53 @@
+"""
+Time of the field statistics aggregated by the database, and documents/bytes transferred by a full read
+against the read projected without the mostly missing fields.
+tests/test_field_stats.py checks the aggregated statistics against pandas.
+
+python -m benchmark.mongo_field_stats --n_rows 5000
+"""
+from sensor import utils
+from benchmark.synthetic_data import make_aps_dataframe
+from benchmark.pipeline_benchmark import use_mongo_stand_in
+import pandas as pd
+import argparse
+import time
+
+DATABASE_NAME = "aps"
+COLLECTION_NAME = "sensor"
+
+
+def timed_read(client, projection:dict=None)->dict:
+    import bson
+    start_time = time.perf_counter()
+    documents = list(client[DATABASE_NAME][COLLECTION_NAME].find({}, projection))
+    seconds = time.perf_counter() - start_time
+    return {"documents": len(documents),
+            "fields": len(documents[0]) - 1 if documents else 0,
+            "mb_transferred": round(sum(len(bson.encode(document)) for document in documents)/2**20, 2),
+            "seconds": round(seconds, 4)}
+
+
+def run(n_rows:int=5000, n_features:int=170, missing_threshold:float=0.7, seed:int=42)->pd.DataFrame:
+    df = make_aps_dataframe(n_rows=n_rows, n_features=n_features, seed=seed)
+    client = use_mongo_stand_in(df, database_name=DATABASE_NAME, collection_name=COLLECTION_NAME)
+
+    start_time = time.perf_counter()
+    field_stats = utils.get_collection_field_stats(database_name=DATABASE_NAME, collection_name=COLLECTION_NAME)
+    aggregation_seconds = round(time.perf_counter() - start_time, 4)
+
+    keep_fields = [field for field, stats in field_stats["fields"].items() if stats["missing_ratio"] <= missing_threshold]
+    print(f"{field_stats['count']} documents, {len(field_stats['fields'])} fields aggregated in {aggregation_seconds}s, "
+          f"{len(field_stats['fields']) - len(keep_fields)} fields missing above {missing_threshold} are not read")
+    results = [{"read": "full", **timed_read(client)},
+               {"read": "projected", **timed_read(client, projection={field: 1 for field in keep_fields})}]
+    return pd.DataFrame(results)
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_rows", type=int, default=5000)
+    parser.add_argument("--n_features", type=int, default=170)
+    parser.add_argument("--missing_threshold", type=float, default=0.7)
+    args = parser.parse_args()
+    print(run(n_rows=args.n_rows, n_features=args.n_features,
+              missing_threshold=args.missing_threshold).to_string(index=False))
@@ -0,0 +1,139 @@
+"""
+Offline benchmark of every training component, end to end training and batch prediction.
+Runs on synthetic APS-shaped data against an in-process Mongo stand-in (mongomock), so it needs neither
+MONGO_DB_URL nor the training csv. Every run is stored in results_dir and can be compared with earlier runs.
+
+python -m benchmark.pipeline_benchmark --n_rows 20000 --n_prediction_rows 50000
+python -m benchmark.pipeline_benchmark --compare
+"""
+from sensor.utils import write_yaml_file, read_yaml_file
+from benchmark.synthetic_data import make_aps_dataframe
+from sensor.config import TARGET_COLUMN, get_env_var
+from datetime import datetime
+from glob import glob
+import pandas as pd
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def get_git_commit()->str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def use_mongo_stand_in(df:pd.DataFrame, database_name:str="aps", collection_name:str="sensor"):
+    """
+    Loads df into an in-process mongomock client and points the sensor package at it
+    """
+    import mongomock
+    from sensor.config import set_mongo_client
+    client = mongomock.MongoClient()
+    client[database_name][collection_name].insert_many(json.loads(df.to_json(orient="records")))
+    set_mongo_client(client)
+    return client
+
+
+def time_call(fn)->float:
+    start_time = time.perf_counter()
+    fn()
+    return round(time.perf_counter() - start_time, 4)
+
+
+def run(n_rows:int=20000, n_prediction_rows:int=50000, n_features:int=170, chunk_size:int=10000,
+        n_prediction_files:int=4, seed:int=42, results_dir:str=RESULTS_DIR, keep_work_dir:bool=False)->dict:
+    from sensor.pipeline.training_pipeline import start_training_pipeline
+    from sensor.pipeline.batch_prediction import start_batch_prediction, start_parallel_batch_prediction
+    from sensor.entity.config_entity import BatchPredictionConfig
+
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="sensor_benchmark_")
+    try:
+        os.chdir(work_dir)
+        # training and prediction rows come from one draw, so the column missing rates match and the
+        # prediction inputs pass the batch prediction input validation
+        df = make_aps_dataframe(n_rows=n_rows+n_prediction_rows, n_features=n_features, seed=seed)
+        train_df = df.iloc[:n_rows].reset_index(drop=True)
+        train_df.to_csv("base.csv", index=False)
+        get_env_var().base_file_path = os.path.join(work_dir, "base.csv")
+        use_mongo_stand_in(train_df)
+
+        training_seconds = time_call(start_training_pipeline)
+        run_profile = read_yaml_file(glob(os.path.join("artifact", "*", "run_profile.yaml"))[0])
+
+        input_df = df.iloc[n_rows:].drop(columns=TARGET_COLUMN).reset_index(drop=True)
+        os.makedirs("input_files", exist_ok=True)
+        input_df.to_csv("input.csv", index=False)
+        rows_per_file = -(-n_prediction_rows//n_prediction_files)
+        for file_index in range(n_prediction_files):
+            input_df.iloc[file_index*rows_per_file:(file_index+1)*rows_per_file].to_csv(
+                os.path.join("input_files", f"input_{file_index}.csv"), index=False)
+
+        prediction = {
+            "whole_file_seconds": time_call(lambda: start_batch_prediction("input.csv")),
+            "chunked_seconds": time_call(lambda: start_batch_prediction(
+                "input.csv", BatchPredictionConfig(prediction_dir="prediction_chunked", chunk_size=chunk_size))),
+            "parallel_seconds": time_call(lambda: start_parallel_batch_prediction(
+                "input_files", BatchPredictionConfig(prediction_dir="prediction_parallel"))),
+        }
+        for key in list(prediction):
+            prediction[key.replace("seconds", "rows_per_second")] = round(n_prediction_rows/prediction[key], 1)
+
+        result = {"timestamp": datetime.now().isoformat(timespec="seconds"),
+                  "git_commit": get_git_commit(),
+                  "params": {"n_rows": n_rows, "n_prediction_rows": n_prediction_rows, "n_features": n_features,
+                             "chunk_size": chunk_size, "n_prediction_files": n_prediction_files, "seed": seed},
+                  "training_seconds": training_seconds,
+                  "stages": run_profile["stages"],
+                  "batch_prediction": prediction}
+    finally:
+        os.chdir(cwd)
+        if not keep_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    result_file_path = os.path.join(results_dir, f"benchmark_{datetime.now().strftime('%m%d%Y__%H%M%S')}.yaml")
+    write_yaml_file(file_path=result_file_path, data=result)
+    print(f"Benchmark result written to {result_file_path}")
+    return result
+
+
+def compare(results_dir:str=RESULTS_DIR, last:int=5)->pd.DataFrame:
+    """
+    One column per stored run (oldest first) and one row per timing, to spot regressions between runs
+    """
+    results = sorted((read_yaml_file(file_path) for file_path in glob(os.path.join(results_dir, "benchmark_*.yaml"))),
+                     key=lambda result: result["timestamp"])[-last:]
+    table = dict()
+    for result in results:
+        column = dict()
+        for stage in result["stages"]:
+            column[f"{stage['stage']}_seconds"] = stage["wall_seconds"]
+        column["training_seconds"] = result["training_seconds"]
+        column.update(result["batch_prediction"])
+        table[f"{result['timestamp']} {result['git_commit']}"] = column
+    return pd.DataFrame(table)
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n_rows", type=int, default=20000)
+    parser.add_argument("--n_prediction_rows", type=int, default=50000)
+    parser.add_argument("--n_features", type=int, default=170)
+    parser.add_argument("--chunk_size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--results_dir", default=RESULTS_DIR)
+    parser.add_argument("--compare", action="store_true", help="only print the stored runs side by side")
+    args = parser.parse_args()
+    if not args.compare:
+        run(n_rows=args.n_rows, n_prediction_rows=args.n_prediction_rows, n_features=args.n_features,
+            chunk_size=args.chunk_size, seed=args.seed, results_dir=args.results_dir)
+    print(compare(results_dir=args.results_dir).to_string())
@@ -0,0 +1,41 @@
+"""
+Synthetic data shaped like the APS failure dataset: ~170 sparse non negative sensor columns,
+"na" as missing value sentinel, a few mostly empty columns and a 1:60 pos/neg class imbalance
+"""
+from sensor.config import TARGET_COLUMN
+import pandas as pd
+import numpy as np
+import string
+
+NA_VALUE = "na"
+
+
+def get_feature_names(n_features:int)->list:
+    letters = string.ascii_lowercase
+    return [f"{letters[(index//26) % 26]}{letters[index % 26]}_{index//676:03d}" for index in range(n_features)]
+
+
+def make_aps_dataframe(n_rows:int, n_features:int=170, positive_ratio:float=1/61, n_informative:int=30,
+                       seed:int=42, with_target:bool=True)->pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    feature_names = get_feature_names(n_features)
+    target = rng.random(n_rows) < positive_ratio
+
+    # counters and histogram bins: mostly zero, heavy tailed when not
+    values = rng.lognormal(mean=3.0, sigma=2.0, size=(n_rows, n_features))
+    values[rng.random((n_rows, n_features)) < 0.3] = 0.0
+    # failing trucks read higher on the informative sensors
+    informative = rng.choice(n_features, size=min(n_informative, n_features), replace=False)
+    values[np.ix_(target, informative)] *= rng.uniform(50, 200, size=len(informative))
+    values = np.round(values, 0)
+
+    # most columns miss a few percent of readings, some miss almost all of them
+    missing_rate = rng.beta(0.5, 8.0, size=n_features)
+    missing_rate[rng.choice(n_features, size=max(1, n_features//20), replace=False)] = rng.uniform(0.72, 0.85)
+    missing = rng.random((n_rows, n_features)) < missing_rate
+
+    df = pd.DataFrame(values, columns=feature_names).astype(object)
+    df = df.mask(missing, NA_VALUE)
+    if with_target:
+        df.insert(0, TARGET_COLUMN, np.where(target, "pos", "neg"))
+    return df
@@ -1,3 +0,0 @@
-from dotenv import load_dotenv
-print(f"loading Environment variable from .env file")
-load_dotenv()
\ No newline at end of file
@@ -0,0 +1,103 @@
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.entity.config_entity import ArtifactRetentionConfig, RUN_INFO_FILE_NAME, MODEL_FILE_NAME
+from sensor.utils import read_yaml_file, get_file_hash, compress_file, open_artifact, resolve_artifact_path, COMPRESSED_ARTIFACT_SUFFIX
+from datetime import datetime
+from typing import List, Set
+import hashlib
+import os, sys
+import shutil
+
+# name of the artifact/<timestamp> directories created by TrainingPipelineConfig
+RUN_DIR_FORMAT = "%m%d%Y__%H%M%S"
+
+
+def list_runs(artifact_root:str)->List[str]:
+    """
+    Returns the run directories of artifact_root, oldest first
+    """
+    def run_time(run_dir:str):
+        try:
+            return datetime.strptime(os.path.basename(run_dir), RUN_DIR_FORMAT).timestamp()
+        except ValueError:
+            return os.path.getmtime(run_dir)
+    if not os.path.isdir(artifact_root):
+        return []
+    run_dirs = [os.path.join(artifact_root, name) for name in os.listdir(artifact_root)
+                if os.path.isdir(os.path.join(artifact_root, name))]
+    return sorted(run_dirs, key=run_time)
+
+
+def get_published_runs(artifact_root:str, saved_model_dir:str)->Set[str]:
+    """
+    Run directories that produced a registry version, from the run info written by the model pusher.
+    Versions published before run info existed are matched on the hash of the pushed model.
+    """
+    published_runs, unlinked_model_hashes = set(), set()
+    if not os.path.isdir(saved_model_dir):
+        return published_runs
+    for version in os.listdir(saved_model_dir):
+        version_dir = os.path.join(saved_model_dir, version)
+        run_info_file_path = os.path.join(version_dir, RUN_INFO_FILE_NAME)
+        if os.path.exists(run_info_file_path):
+            artifact_dir = read_yaml_file(run_info_file_path)["artifact_dir"]
+            published_runs.add(os.path.join(artifact_root, os.path.basename(os.path.normpath(artifact_dir))))
+        elif os.path.exists(os.path.join(version_dir, "model", MODEL_FILE_NAME)):
+            unlinked_model_hashes.add(get_file_hash(os.path.join(version_dir, "model", MODEL_FILE_NAME)))
+    if unlinked_model_hashes:
+        for run_dir in list_runs(artifact_root):
+            pushed_model_path = os.path.join(run_dir, "model_pusher", "saved_models", MODEL_FILE_NAME)
+            if not os.path.exists(resolve_artifact_path(pushed_model_path)):
+                continue
+            # the pushed copy may already be compressed, hash its content
+            with open_artifact(pushed_model_path) as file_obj:
+                if hashlib.sha256(file_obj.read()).hexdigest() in unlinked_model_hashes:
+                    published_runs.add(run_dir)
+    return published_runs
+
+
+def compress_run(run_dir:str, min_bytes:int, level:int=3)->int:
+    """
+    Stores every file of run_dir of at least min_bytes zstd compressed, returns the bytes saved
+    """
+    bytes_saved = 0
+    for dir_path, _, file_names in os.walk(run_dir):
+        for file_name in file_names:
+            file_path = os.path.join(dir_path, file_name)
+            if file_name.endswith(COMPRESSED_ARTIFACT_SUFFIX) or os.path.getsize(file_path) < min_bytes:
+                continue
+            size = os.path.getsize(file_path)
+            compressed_file_path = compress_file(file_path=file_path, level=level)
+            bytes_saved += size - os.path.getsize(compressed_file_path)
+    return bytes_saved
+
+
+def apply_artifact_retention(artifact_retention_config:ArtifactRetentionConfig=None)->dict:
+    """
+    Deletes the runs of artifact_root which are neither among the last keep_last_n
+    nor behind a published registry version, and compresses the large files of the retained ones
+    """
+    try:
+        artifact_retention_config = artifact_retention_config or ArtifactRetentionConfig()
+        run_dirs = list_runs(artifact_retention_config.artifact_root)
+        published_runs = get_published_runs(artifact_root=artifact_retention_config.artifact_root,
+                                            saved_model_dir=artifact_retention_config.saved_model_dir)
+        recent_runs = set(run_dirs[-artifact_retention_config.keep_last_n:]) if artifact_retention_config.keep_last_n > 0 else set()
+
+        deleted_runs, retained_runs, bytes_saved = [], [], 0
+        for run_dir in run_dirs:
+            if run_dir not in recent_runs and run_dir not in published_runs:
+                shutil.rmtree(run_dir)
+                deleted_runs.append(run_dir)
+                continue
+            retained_runs.append(run_dir)
+            if artifact_retention_config.compress_min_bytes is not None:
+                bytes_saved += compress_run(run_dir=run_dir, min_bytes=artifact_retention_config.compress_min_bytes,
+                                            level=artifact_retention_config.compression_level)
+        report = {"retained_runs": retained_runs, "deleted_runs": deleted_runs,
+                  "published_runs": sorted(published_runs & set(retained_runs)),
+                  "compressed_bytes_saved": bytes_saved}
+        logging.info("Artifact retention report: %s", report)
+        return report
+    except Exception as e:
+        raise SensorException(e, sys)
@@ -3,9 +3,10 @@ from sensor.entity import config_entity
 from sensor.entity import artifact_entity
 from sensor.exception import SensorException
 from sensor.logger import logging
+from sensor.instrumentation import record_shape
+from sensor.config import TARGET_COLUMN
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
 import os,sys
 
 class DataIngestion:
@@ -16,16 +17,48 @@ class DataIngestion:
             self.data_ingestion_config=data_ingestion_config
         except Exception as e:
             raise SensorException(e, sys)
+    def drop_missing_fields(self, columns:list=None)->list:
+        """
+        Aggregates the statistics of every field in the database and writes them to field_stats_file_path,
+        returns columns (every field when None) without the fields missing above missing_threshold
+        """
+        try:
+            field_stats = utils.get_collection_field_stats(
+                database_name=self.data_ingestion_config.database_name,
+                collection_name=self.data_ingestion_config.collection_name,
+                fields=columns)
+            threshold = self.data_ingestion_config.missing_threshold
+            drop_fields = [field for field, stats in field_stats["fields"].items()
+                           if stats["missing_ratio"] > threshold and field != TARGET_COLUMN]
+            logging.info("Fields missing in more than %s of the documents are not read: %s", threshold, drop_fields)
+            field_stats["missing_threshold"] = threshold
+            field_stats["drop_fields"] = drop_fields
+            utils.write_yaml_file(file_path=self.data_ingestion_config.field_stats_file_path, data=field_stats)
+            return [field for field in field_stats["fields"] if field not in drop_fields]
+        except Exception as e:
+            raise SensorException(e, sys)
+
     def initiate_data_ingestion(self)->artifact_entity.DataIngestionArtifact:
         try:
+            #every column is read so feature selection can bring back a feature the published model dropped,
+            #prediction reads only the features of the published transformer
+            if self.data_ingestion_config.push_down_field_stats:
+                projected_columns = self.drop_missing_fields()
+                field_stats_file_path = self.data_ingestion_config.field_stats_file_path
+            else:
+                projected_columns, field_stats_file_path = None, None
+
             logging.info(f"Exporting collection data as pandas dataframe")
             #Exporting collection data as pandas dataframe
             df:pd.DataFrame  = utils.get_collection_as_dataframe(
                 database_name=self.data_ingestion_config.database_name, 
-                collection_name=self.data_ingestion_config.collection_name)
+                collection_name=self.data_ingestion_config.collection_name,
+                columns=projected_columns)
 
             logging.info("Save data in feature store")
 
+            record_shape(rows=df.shape[0], columns=df.shape[1])
+
             #replace na with Nan
             df.replace(to_replace="na",value=np.NAN,inplace=True)
 
@@ -40,25 +73,26 @@ class DataIngestion:
 
 
             logging.info("split dataset into train and test set")
-            #split dataset into train and test set
-            train_df,test_df = train_test_split(df,test_size=self.data_ingestion_config.test_size,random_state=42)
-            
-            logging.info("create dataset directory folder if not available")
-            #create dataset directory folder if not available
-            dataset_dir = os.path.dirname(self.data_ingestion_config.train_file_path)
-            os.makedirs(dataset_dir,exist_ok=True)
+            from sklearn.model_selection import train_test_split
+            #split the row positions, stratified on the target so both splits keep the class imbalance
+            class_counts = df[TARGET_COLUMN].value_counts()
+            stratify = df[TARGET_COLUMN] if len(class_counts) > 1 and class_counts.min() >= 2 else None
+            if stratify is None:
+                logging.info("Target classes %s can not be stratified, splitting at random", class_counts.to_dict())
+            train_index,test_index = train_test_split(np.arange(len(df)),test_size=self.data_ingestion_config.test_size,
+                                                      random_state=42,stratify=stratify)
 
-            logging.info("Save df to feature store folder")
-            #Save df to feature store folder
-            train_df.to_csv(path_or_buf=self.data_ingestion_config.train_file_path,index=False,header=True)
-            test_df.to_csv(path_or_buf=self.data_ingestion_config.test_file_path,index=False,header=True)
+            logging.info("Save the split row positions")
+            utils.save_split_indices(file_path=self.data_ingestion_config.split_file_path,
+                                     split_indices={"train": train_index, "test": test_index})
             
             #Prepare artifact
 
             data_ingestion_artifact = artifact_entity.DataIngestionArtifact(
                 feature_store_file_path=self.data_ingestion_config.feature_store_file_path,
-                train_file_path=self.data_ingestion_config.train_file_path, 
-                test_file_path=self.data_ingestion_config.test_file_path)
+                split_file_path=self.data_ingestion_config.split_file_path,
+                projected_columns=projected_columns,
+                field_stats_file_path=field_stats_file_path)
 
             logging.info(f"Data ingestion artifact: {data_ingestion_artifact}")
             return data_ingestion_artifact
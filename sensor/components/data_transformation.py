@@ -2,31 +2,32 @@ from sensor.entity import artifact_entity
 from sensor.entity import config_entity
 from sensor.exception import SensorException
 from sensor.logger import logging
+from sensor.instrumentation import record_shape
 import os, sys
 import pandas as pd
 import numpy as np
-from sklearn.pipeline import Pipeline
 from typing import Optional
 from sensor import utils
 from sensor.config import TARGET_COLUMN
 
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import RobustScaler, LabelEncoder
-from imblearn.combine import SMOTETomek
-
 class DataTransformation:
     
     def __init__(self,data_transformation_config:config_entity.DataTransformationConfig,
-                data_ingestion_artifact:artifact_entity.DataIngestionArtifact):
+                data_ingestion_artifact:artifact_entity.DataIngestionArtifact,
+                feature_selection_artifact:Optional[artifact_entity.FeatureSelectionArtifact]=None):
         try:
             logging.info(f"{'>>'*20} Data Transformation {'<<'*20}")
             self.data_transformation_config=data_transformation_config
             self.data_ingestion_artifact=data_ingestion_artifact
+            self.feature_selection_artifact=feature_selection_artifact
         except Exception as e:
             raise SensorException(e, sys)
     @classmethod
-    def get_data_transformer_object(cls)->Pipeline:
+    def get_data_transformer_object(cls)->"Pipeline":
         try:
+            from sklearn.pipeline import Pipeline
+            from sklearn.impute import SimpleImputer
+            from sklearn.preprocessing import RobustScaler
             simple_imputer = SimpleImputer(strategy="constant",fill_value=0)
             robust_scaler = RobustScaler()
             pipeline= Pipeline(steps=[('Imputer',simple_imputer),('RobustScaler',robust_scaler) ])
@@ -36,9 +37,18 @@ class DataTransformation:
 
     def initiate_data_transformation(self,)->artifact_entity.DataTransformationArtifact:
         try:
-            # Reading Training and testing file
-            train_df=pd.read_csv(self.data_ingestion_artifact.train_file_path)
-            test_df=pd.read_csv(self.data_ingestion_artifact.test_file_path)
+            from sklearn.preprocessing import LabelEncoder
+            from imblearn.combine import SMOTETomek
+            # Reading Training and testing file, only the selected features when there is a selection
+            usecols=None
+            if self.feature_selection_artifact is not None:
+                usecols=self.feature_selection_artifact.selected_features + [TARGET_COLUMN]
+            train_df,test_df=utils.read_dataset_splits(feature_store_file_path=self.data_ingestion_artifact.feature_store_file_path,
+                                                       split_file_path=self.data_ingestion_artifact.split_file_path, usecols=usecols)
+            if usecols is not None:
+                # read_csv keeps the file order, the transformer is fitted in the order of the selection
+                train_df, test_df = train_df[usecols], test_df[usecols]
+            record_shape(rows=train_df.shape[0]+test_df.shape[0], columns=train_df.shape[1])
 
             # selecting input feature for train and test data frame
             input_feature_train_df= train_df.drop(TARGET_COLUMN, axis=1)
@@ -48,7 +58,7 @@ class DataTransformation:
             target_feature_train_df= train_df[TARGET_COLUMN]
             target_feature_test_df=test_df[TARGET_COLUMN]
 
-            logging.info(f"Trarget Train feature before encoding: {target_feature_train_df}")
+            logging.info("Trarget Train feature before encoding: %s", target_feature_train_df.value_counts().to_dict())
             logging.info("#################################################################")
 
 
@@ -59,7 +69,11 @@ class DataTransformation:
             target_feature_train_arr=label_encoder.transform(target_feature_train_df)
             target_feature_test_arr=label_encoder.transform(target_feature_test_df)
 
-            logging.info(f"Trarget Train feature after encoding: {target_feature_train_arr}")
+            logging.info("Trarget Train feature after encoding: %s", dict(zip(*np.unique(target_feature_train_arr, return_counts=True))))
+
+            # batch prediction inputs are checked against the training null ratios and value ranges
+            utils.write_yaml_file(file_path=self.data_transformation_config.feature_stats_file_path,
+                                  data=utils.get_feature_stats(df=input_feature_train_df))
 
             transformation_pipeline = DataTransformation.get_data_transformer_object()
             transformation_pipeline.fit(input_feature_train_df)
@@ -67,16 +81,20 @@ class DataTransformation:
             input_feature_train_arr = transformation_pipeline.transform(input_feature_train_df)
             input_feature_test_arr =  transformation_pipeline.transform(input_feature_test_df)
 
+            # cross validation folds have to be cut before re sampling, synthetic rows would leak into the validation folds
+            utils.save_numpy_array_data(file_path=self.data_transformation_config.unsampled_train_path,
+                                        array=np.c_[input_feature_train_arr, target_feature_train_arr])
+
             smt=SMOTETomek(random_state=42)
-            logging.info(f"before re sampling in the training set input:{input_feature_train_arr.shape},Target: {target_feature_train_arr.shape}")
+            logging.info("before re sampling in the training set input:%s,Target: %s", input_feature_train_arr.shape, target_feature_train_arr.shape)
             input_feature_train_arr, target_feature_train_arr = smt.fit_resample(input_feature_train_arr,target_feature_train_arr)
-            logging.info(f"After re sampling in the training set input:{input_feature_train_arr.shape},Target: {target_feature_train_arr.shape}")
+            logging.info("After re sampling in the training set input:%s,Target: %s", input_feature_train_arr.shape, target_feature_train_arr.shape)
             
-            logging.info(f"before re sampling in the training set input:{input_feature_test_arr.shape},Target: {target_feature_test_arr.shape}")
+            logging.info("before re sampling in the test set input:%s,Target: %s", input_feature_test_arr.shape, target_feature_test_arr.shape)
 
             input_feature_test_arr, target_feature_test_arr = smt.fit_resample(input_feature_test_arr,target_feature_test_arr)
 
-            logging.info(f"After re sampling in the training set input:{input_feature_test_arr.shape},Target: {target_feature_test_arr.shape}")
+            logging.info("After re sampling in the test set input:%s,Target: %s", input_feature_test_arr.shape, target_feature_test_arr.shape)
 
             # Traget Encoder:
             train_arr = np.c_[input_feature_train_arr, target_feature_train_arr]
@@ -99,9 +117,11 @@ class DataTransformation:
                 transform_object_path = self.data_transformation_config.transform_object_path, 
                 transformed_train_path = self.data_transformation_config.transformed_train_path, 
                 transformed_test_path = self.data_transformation_config.transformed_test_path,
-                target_encoder_path = self.data_transformation_config.target_encoder_path )
+                target_encoder_path = self.data_transformation_config.target_encoder_path,
+                feature_stats_file_path = self.data_transformation_config.feature_stats_file_path,
+                unsampled_train_path = self.data_transformation_config.unsampled_train_path )
 
-            logging.info(f"Data Transformation object:{data_transformation_artifact}")
+            logging.info("Data Transformation object:%s", data_transformation_artifact)
             return data_transformation_artifact
           
         except Exception as e:
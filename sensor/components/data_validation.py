@@ -3,8 +3,8 @@ from sensor.entity import artifact_entity
 from sensor.entity import config_entity
 from sensor.exception import SensorException
 from sensor.logger import logging
+from sensor.instrumentation import record_shape
 import os, sys
-from scipy.stats import ks_2samp
 import pandas as pd
 import numpy as np
 from typing import Optional
@@ -43,7 +43,7 @@ class DataValidation:
             logging.info(f"selecting the columns name which contains the null values above to {threshold} ")
             drop_columns_names=null_report[null_report>threshold].index
 
-            logging.info(f"columns to drop: {list(drop_columns_names)} ")
+            logging.info("columns to drop: %s ", list(drop_columns_names))
             
             self.validation_error[report_key_name]=list(drop_columns_names)
             df.drop(list(drop_columns_names), axis=1,inplace=True)
@@ -64,7 +64,7 @@ class DataValidation:
             missing_columns=[]
             for base_column in base_columns:
                 if base_column not in current_columns:
-                    logging.info(f"Column:[{base}is not in not available]")
+                    logging.info("Column:[%s] is not available", base_column)
                     missing_columns.append(base_column)
             
             if len(missing_columns)>0:
@@ -77,13 +77,14 @@ class DataValidation:
 
     def data_drift(self,base_df:pd.DataFrame, current_df:pd.DataFrame,report_key_name:str):
         try:
+            from scipy.stats import ks_2samp
             drift_report=dict()
             base_columns= base_df.columns
             current_columns=current_df.columns
             for base_column in base_columns:
                 base_data, current_data= base_df[base_column], current_df[base_column]
                 # Null_hypothesis is both columns data drawn from same distribution
-                logging.info(f"Hypoyhesis{base_column}:{base_data.dtype},{current_data.dtype}")
+                logging.debug("Hypoyhesis%s:%s,%s", base_column, base_data.dtype, current_data.dtype)
                 same_distribution=ks_2samp(base_data, current_data)
 
                 if same_distribution.pvalue>0.05:
@@ -114,14 +115,21 @@ class DataValidation:
             base_df=pd.read_csv(self.data_validation_config.base_file_path)
             logging.info(f"Replace Null Values in Base data frame")
             base_df.replace({"na":np.NAN},inplace=True)
+            if self.data_ingestion_artifact.projected_columns is not None:
+                # only the fields kept by the database statistics were ingested, the others are not expected in train and test
+                base_df=base_df[[column for column in base_df.columns if column in self.data_ingestion_artifact.projected_columns]]
+            if self.data_ingestion_artifact.field_stats_file_path is not None:
+                # fields dropped by ingestion from the database statistics never reached train and test
+                field_stats=utils.read_yaml_file(file_path=self.data_ingestion_artifact.field_stats_file_path)
+                self.validation_error["missing_values_within_database"]=field_stats["drop_fields"]
             # base_df  has na as null
             logging.info(f"droping the null values columns from base data frame")
             base_df=self.drop_missing_values_columns(df=base_df, report_key_name="missing_values_within _base_dataset")
 
-            logging.info(f"Reading Train data Frame")
-            train_df=pd.read_csv(self.data_ingestion_artifact.train_file_path)
-            logging.info(f"Reading Test data Frame")
-            test_df=pd.read_csv(self.data_ingestion_artifact.test_file_path)
+            logging.info("Reading Train and Test data Frame")
+            train_df,test_df=utils.read_dataset_splits(feature_store_file_path=self.data_ingestion_artifact.feature_store_file_path,
+                                                       split_file_path=self.data_ingestion_artifact.split_file_path)
+            record_shape(rows=train_df.shape[0]+test_df.shape[0], columns=train_df.shape[1])
 
             logging.info(f"droping the null values columns from train data frame")
             train_df=self.drop_missing_values_columns(df=train_df, report_key_name="missing_values_within_train_dataset")
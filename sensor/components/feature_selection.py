@@ -0,0 +1,119 @@
+from sensor.entity import artifact_entity
+from sensor.entity import config_entity
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.instrumentation import record_shape
+import os, sys
+import pandas as pd
+import numpy as np
+from sensor import utils
+from sensor.config import TARGET_COLUMN
+
+# key under which data validation reports the train columns above the missing value threshold
+MISSING_VALUES_REPORT_KEY="missing_values_within_train_dataset"
+
+
+class FeatureSelection:
+    def __init__(self, feature_selection_config:config_entity.FeatureSelectionConfig,
+                data_ingestion_artifact:artifact_entity.DataIngestionArtifact,
+                data_validation_artifact:artifact_entity.DataValidationArtifact):
+        try:
+            logging.info(f"{'>>'*20} Feature Selection {'<<'*20}")
+            self.feature_selection_config=feature_selection_config
+            self.data_ingestion_artifact=data_ingestion_artifact
+            self.data_validation_artifact=data_validation_artifact
+            self.dropped_features=dict()
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def drop_missing_values_features(self, features:list)->list:
+        """
+        Drops the features data validation found above the missing value threshold
+        """
+        try:
+            report = utils.read_yaml_file(self.data_validation_artifact.report_file_path) or dict()
+            missing_features = set(report.get(MISSING_VALUES_REPORT_KEY, []))
+            self.dropped_features["missing_values"] = [feature for feature in features if feature in missing_features]
+            return [feature for feature in features if feature not in missing_features]
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def drop_near_constant_features(self, df:pd.DataFrame, features:list)->list:
+        try:
+            threshold = self.feature_selection_config.near_constant_threshold
+            near_constant = []
+            for feature in features:
+                # share of the most frequent value, missing values counted as a value
+                top_share = df[feature].value_counts(dropna=False, normalize=True).iloc[0]
+                if top_share > threshold:
+                    near_constant.append(feature)
+            self.dropped_features["near_constant"] = near_constant
+            return [feature for feature in features if feature not in near_constant]
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def drop_correlated_features(self, df:pd.DataFrame, features:list)->list:
+        """
+        Of every pair above the correlation threshold keeps the feature that comes first
+        """
+        try:
+            arr = df[features].to_numpy(dtype=np.float32)
+            # missing values take the column median, so the correlation is computed in one vectorized pass
+            medians = np.nanmedian(arr, axis=0)
+            missing_rows, missing_cols = np.where(np.isnan(arr))
+            arr[missing_rows, missing_cols] = medians[missing_cols]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                corr = np.abs(np.corrcoef(arr, rowvar=False))
+            upper = np.triu(np.nan_to_num(corr, nan=0.0), k=1)
+            correlated = [features[i] for i in np.where((upper > self.feature_selection_config.correlation_threshold).any(axis=0))[0]]
+            self.dropped_features["correlated"] = correlated
+            return [feature for feature in features if feature not in correlated]
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def drop_zero_gain_features(self, df:pd.DataFrame, features:list)->list:
+        """
+        Drops the features no split of a small xgboost model uses
+        """
+        try:
+            from xgboost import XGBClassifier
+            y = pd.factorize(df[TARGET_COLUMN], sort=True)[0]
+            model = XGBClassifier(n_estimators=self.feature_selection_config.gain_n_estimators, tree_method="hist")
+            model.fit(df[features].to_numpy(dtype=np.float32), y)
+            gain = model.get_booster().get_score(importance_type="gain")
+            # the booster names the columns f0, f1... in the order they were passed
+            used = {int(name[1:]) for name, value in gain.items() if value > 0}
+            zero_gain = [feature for index, feature in enumerate(features) if index not in used]
+            self.dropped_features["zero_gain"] = zero_gain
+            return [feature for feature in features if feature not in zero_gain]
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def initiate_feature_selection(self)->artifact_entity.FeatureSelectionArtifact:
+        try:
+            logging.info("Reading Train data Frame")
+            train_df=utils.read_dataset_split(feature_store_file_path=self.data_ingestion_artifact.feature_store_file_path,
+                                              split_file_path=self.data_ingestion_artifact.split_file_path, split="train")
+            record_shape(rows=train_df.shape[0], columns=train_df.shape[1])
+            features=[column for column in train_df.columns if column != TARGET_COLUMN]
+
+            features=self.drop_missing_values_features(features=features)
+            features=self.drop_near_constant_features(df=train_df, features=features)
+            features=self.drop_correlated_features(df=train_df, features=features)
+            if self.feature_selection_config.drop_zero_gain:
+                features=self.drop_zero_gain_features(df=train_df, features=features)
+            if len(features)==0:
+                raise Exception("No feature left after feature selection")
+
+            logging.info("Selected %s of %s features, dropped: %s", len(features), train_df.shape[1]-1,
+                         {reason: len(dropped) for reason, dropped in self.dropped_features.items()})
+            utils.write_yaml_file(file_path=self.feature_selection_config.selected_features_file_path,
+                                  data={"selected_features": features, "dropped_features": self.dropped_features})
+
+            feature_selection_artifact=artifact_entity.FeatureSelectionArtifact(
+                selected_features_file_path=self.feature_selection_config.selected_features_file_path,
+                selected_features=features)
+            logging.info("Feature selection artifact: %s", feature_selection_artifact.selected_features_file_path)
+            return feature_selection_artifact
+        except Exception as e:
+            raise SensorException(e, sys)
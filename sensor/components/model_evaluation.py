@@ -1,10 +1,10 @@
-from sensor.predictor import ModelResolver
+from sensor.predictor import ModelResolver, get_fast_predictor
 from sensor.entity import config_entity,artifact_entity
 from sensor.exception import SensorException
 from sensor.logger import logging
+from sensor.instrumentation import record_shape
 import os,sys
-from sensor.utils import load_object
-from sklearn.metrics import f1_score
+from sensor.utils import load_object, read_dataset_split
 import pandas as pd
 from sensor.config import TARGET_COLUMN
 
@@ -47,7 +47,7 @@ class ModelEvaluation:
             logging.info("previously trained objects of transformer , model and target encoder")
             # loading the objects:
             transformer = load_object(file_path=transformer_path)
-            model = load_object(file_path= model_path)
+            model = get_fast_predictor(model=load_object(file_path= model_path))
             target_encoder = load_object(file_path = target_encoder_path)
 
 
@@ -55,11 +55,17 @@ class ModelEvaluation:
             logging.info("currently trained objects of transformer , model and target encoder")
 
             current_transformer = load_object(file_path=self.data_transformation_artifact.transform_object_path)
-            current_model = load_object(file_path=self.model_trainer_artifact.model_path)
+            current_model = get_fast_predictor(model=load_object(file_path=self.model_trainer_artifact.model_path))
             current_target_encoder = load_object(file_path=self.data_transformation_artifact.target_encoder_path)
 
+            from sklearn.metrics import f1_score
             # 
-            test_df=pd.read_csv(self.data_ingestion_artifact.test_file_path)
+            # only the features either transformer was fitted on are read
+            usecols = set(transformer.feature_names_in_) | set(current_transformer.feature_names_in_) | {TARGET_COLUMN}
+            test_df=read_dataset_split(feature_store_file_path=self.data_ingestion_artifact.feature_store_file_path,
+                                       split_file_path=self.data_ingestion_artifact.split_file_path, split="test",
+                                       usecols=lambda column: column in usecols)
+            record_shape(rows=test_df.shape[0], columns=test_df.shape[1])
             target_df = test_df[TARGET_COLUMN]
             y_true = target_encoder.transform(target_df)
 
@@ -78,7 +84,7 @@ class ModelEvaluation:
             # Accuracy using current model
             logging.info(" finding out accuracy of currently Trained Model")
 
-            input_feature_name = list(transformer.feature_names_in_)
+            input_feature_name = list(current_transformer.feature_names_in_)
             input_arr = current_transformer.transform(test_df[input_feature_name])
             y_pred = current_model.predict(input_arr)
             y_true = current_target_encoder.transform(target_df)
@@ -1,22 +1,27 @@
 from sensor.predictor import ModelResolver
 from sensor.entity.config_entity import ModelPusherConfig
-from sensor.entity.artifact_entity import DataTransformationArtifact , ModelTrainerArtifact , ModelPusherArtifact
+from sensor.entity.artifact_entity import DataTransformationArtifact , ModelTrainerArtifact , ModelPusherArtifact, FeatureSelectionArtifact
 from sensor.logger import logging
 from sensor.exception import SensorException
 import os ,sys
-from sensor.utils import save_object, load_object
+import shutil
+from typing import Optional
+from sensor.utils import save_object, load_object, write_yaml_file
+from sensor.entity.config_entity import RUN_INFO_FILE_NAME, SELECTED_FEATURES_FILE_NAME, FEATURE_STATS_FILE_NAME
 
 
 class ModelPusher:
     def __init__(self, model_pusher_config:ModelPusherConfig, 
                 data_transformation_artifact: DataTransformationArtifact,
                 model_trainer_artifact: ModelTrainerArtifact,
+                feature_selection_artifact: Optional[FeatureSelectionArtifact]=None,
                  ):
         try:
             logging.info(f"{'>>'*20} Data Transformation {'<<'*20}")
             self.model_pusher_config = model_pusher_config
             self.data_transformation_artifact = data_transformation_artifact
             self.model_trainer_artifact = model_trainer_artifact
+            self.feature_selection_artifact = feature_selection_artifact
             self.model_resolver = ModelResolver(model_registry=self.model_pusher_config.saved_model_dir)
 
         except Exception as e:
@@ -46,6 +51,18 @@ class ModelPusher:
             save_object(file_path=transformer_path, obj=transformer)
             save_object(file_path=model_path, obj=model)
             save_object(file_path=target_encoder_path, obj=target_encoder)
+            saved_model_version_dir = os.path.dirname(os.path.dirname(model_path))
+            # the artifact retention policy keeps the run behind every published version
+            write_yaml_file(file_path=os.path.join(saved_model_version_dir, RUN_INFO_FILE_NAME),
+                            data={"artifact_dir": self.model_pusher_config.artifact_dir})
+            # the selected and dropped features are published with the version for reference
+            if self.feature_selection_artifact is not None:
+                shutil.copyfile(self.feature_selection_artifact.selected_features_file_path,
+                                os.path.join(saved_model_version_dir, SELECTED_FEATURES_FILE_NAME))
+            # batch prediction inputs are validated against the training statistics of the published model
+            if self.data_transformation_artifact.feature_stats_file_path is not None:
+                shutil.copyfile(self.data_transformation_artifact.feature_stats_file_path,
+                                os.path.join(saved_model_version_dir, FEATURE_STATS_FILE_NAME))
 
             model_pusher_artifact = ModelPusherArtifact(pusher_model_dir=self.model_pusher_config.pusher_model_dir,
                                                         saved_model_dir = self.model_pusher_config.saved_model_dir )
@@ -2,10 +2,33 @@ from sensor.entity import artifact_entity
 from sensor.entity import config_entity
 from sensor.exception import SensorException
 from sensor.logger import logging
+from sensor.instrumentation import record_shape
 import os, sys
-from xgboost import XGBClassifier
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from sensor import utils
-from sklearn.metrics import f1_score
+from sensor.predictor import get_fast_predictor
+
+
+def _fit_fold(train_array_path:str, y, train_index, valid_index, n_jobs:int)->dict:
+    """
+    Trains and scores one fold in a worker process, the rows are read from the memory mapped train array.
+    Only the training rows of the fold are re sampled, the validation rows stay as they were collected.
+    The training rows are still copied out of the memmap once per fold, SMOTETomek needs an array of its own,
+    and that copy is reused for the train score.
+    """
+    from xgboost import XGBClassifier
+    from sklearn.metrics import f1_score
+    from imblearn.combine import SMOTETomek
+    x = np.load(train_array_path, mmap_mode="r")
+    x_train, y_train = x[train_index], y[train_index]
+    x_resampled, y_resampled = SMOTETomek(random_state=42).fit_resample(x_train, y_train)
+    model = XGBClassifier(n_jobs=n_jobs)
+    model.fit(x_resampled, y_resampled)
+    del x_resampled, y_resampled
+    fast_predictor = get_fast_predictor(model=model, nthread=n_jobs)
+    return {"f1_train_score": float(f1_score(y_true=y_train, y_pred=fast_predictor.predict(x_train))),
+            "f1_valid_score": float(f1_score(y_true=y[valid_index], y_pred=fast_predictor.predict(x[valid_index])))}
 
 
 class ModelTrainer:
@@ -20,12 +43,46 @@ class ModelTrainer:
 
     def train_model(self,x,y):
         try:
+            from xgboost import XGBClassifier
             xgb_clf= XGBClassifier()
             xgb_clf.fit(x,y)
             return xgb_clf  
         except Exception as e:
             raise SensorException(e, sys)
     
+    def cross_validate(self, x, y)->list:
+        """
+        Trains the cv_folds folds concurrently, the threads of cv_max_threads are split between the running folds.
+        x and y are the train rows before re sampling, every fold re samples its own training rows.
+        x is written once as a float32 memmap instead of being pickled to every worker process,
+        each fold then copies only its own training rows.
+        Returns the train and validation f1 of every fold.
+        """
+        try:
+            from sklearn.model_selection import StratifiedKFold
+            n_folds = self.model_trainer_config.cv_folds
+            max_threads = self.model_trainer_config.cv_max_threads or os.cpu_count() or 1
+            n_workers = min(n_folds, max_threads)
+            n_jobs = max(1, max_threads//n_workers)
+
+            train_array_path = self.model_trainer_config.cv_train_array_path
+            os.makedirs(os.path.dirname(train_array_path), exist_ok=True)
+            np.save(train_array_path, np.ascontiguousarray(x, dtype=np.float32))
+            try:
+                folds = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=42).split(x, y)
+                logging.info("Cross validating %s folds, %s at once with %s threads each", n_folds, n_workers, n_jobs)
+                with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                    futures = [executor.submit(_fit_fold, train_array_path, y, train_index, valid_index, n_jobs)
+                               for train_index, valid_index in folds]
+                    fold_scores = [future.result() for future in futures]
+            finally:
+                # the memmap is only needed while the folds train
+                os.remove(train_array_path)
+            logging.info("Fold scores: %s", fold_scores)
+            return fold_scores
+        except Exception as e:
+            raise SensorException(e, sys)
+
     def fine_tune(self):
         try:
             pass
@@ -42,28 +99,43 @@ class ModelTrainer:
             logging.info(f"splitting the input and target feature from both train and test array")
             x_train, y_train= train_arr[:,:-1], train_arr[:,-1]
             x_test, y_test= test_arr[:,:-1], test_arr[:,-1]
+            record_shape(rows=x_train.shape[0], columns=x_train.shape[1])
 
             logging.info(f"train the model")
             model = self.train_model(x=x_train, y=y_train)
             
+            from sklearn.metrics import f1_score
+            fast_predictor = get_fast_predictor(model=model)
             logging.info(f"Calculating F1 train score")
-            yhat_train=model.predict(x_train)
+            yhat_train=fast_predictor.predict(x_train)
             f1_train_score=f1_score(y_true=y_train,y_pred=yhat_train)
 
             logging.info(f"Calculating F2 train score")
-            yhat_test=model.predict(x_test)
+            yhat_test=fast_predictor.predict(x_test)
             f1_test_score=f1_score(y_true=y_test,y_pred=yhat_test)
 
             logging.info(f"train score:{f1_train_score} and tests score {f1_test_score}")
 
+            # with cross validation the checks use the mean over the folds instead of the single train/test pair
+            cv_f1_scores, cv_f1_mean, cv_f1_std = None, None, None
+            score, diff = f1_test_score, abs(f1_train_score-f1_test_score)
+            if self.model_trainer_config.cv_folds > 1:
+                # folds are cut from the train array before re sampling so no synthetic row is validated on
+                unsampled_train_arr = utils.load_numpy_array_data(file_path=self.data_transformation_artifact.unsampled_train_path)
+                fold_scores = self.cross_validate(x=unsampled_train_arr[:,:-1], y=unsampled_train_arr[:,-1])
+                cv_f1_scores = [fold_score["f1_valid_score"] for fold_score in fold_scores]
+                cv_f1_mean, cv_f1_std = float(np.mean(cv_f1_scores)), float(np.std(cv_f1_scores))
+                score = cv_f1_mean
+                diff = float(np.mean([abs(fold_score["f1_train_score"]-fold_score["f1_valid_score"]) for fold_score in fold_scores]))
+                logging.info("cross validation f1 mean: %s std: %s", cv_f1_mean, cv_f1_std)
+
             # Check for over fitting or under fitting or expected score
             logging.info(f"checking our model is underfitting or not")
 
-            if f1_test_score < self.model_trainer_config.expected_score:
+            if score < self.model_trainer_config.expected_score:
                 raise Exception(f"model is not good as it is not able to give excepted Accuracy \
-                                    excpected Accuracy{ self.model_trainer_config.expected_score} : Actual Score: {f1_test_score}")
+                                    excpected Accuracy{ self.model_trainer_config.expected_score} : Actual Score: {score}")
             logging.info(f"checking our model is overfitted or not")
-            diff = abs(f1_train_score-f1_test_score)
 
             if diff > self.model_trainer_config.overfitting_threshold:
                 raise Exception(f"Train and test score difference :{ diff} is more than Over fitting \
@@ -77,7 +149,8 @@ class ModelTrainer:
             # prepare artifact:
             logging.info(f"preparing the artifact")
             model_trainer_artifact = artifact_entity.ModelTrainerArtifact(model_path = self.model_trainer_config.model_path, f1_train_score=f1_train_score, \
-                                                     f1_test_score= f1_test_score )
+                                                     f1_test_score= f1_test_score, cv_f1_scores=cv_f1_scores, \
+                                                     cv_f1_mean=cv_f1_mean, cv_f1_std=cv_f1_std )
             logging.info(f" model Trainer Artifact: {model_trainer_artifact}" )
             return model_trainer_artifact
 
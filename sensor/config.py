@@ -1,20 +1,57 @@
-import pymongo
-import pandas as pd
-import json
-from dataclasses import dataclass
 import os
+from dataclasses import dataclass, field
 # provide then local host url to connect the python to mongo db
 
 
 @dataclass
 class EnvironmentVariable:
-    mongo_db_url:str=os.getenv("MONGO_DB_URL")
-    aws_access_key_id:str=os.getenv("AWS_ACCESS_KEY_ID")
-    aws_access_secret_key:str=os.getenv("AWS_ACCESS_SECRET_KEY")
+    mongo_db_url:str=field(default_factory=lambda: os.getenv("MONGO_DB_URL"))
+    aws_access_key_id:str=field(default_factory=lambda: os.getenv("AWS_ACCESS_KEY_ID"))
+    aws_access_secret_key:str=field(default_factory=lambda: os.getenv("AWS_ACCESS_SECRET_KEY"))
+    base_file_path:str=field(default_factory=lambda: os.getenv("BASE_FILE_PATH", "/config/workspace/aps_failure_training_set1.csv"))
+    model_trainer_cv_folds:int=field(default_factory=lambda: int(os.getenv("MODEL_TRAINER_CV_FOLDS", "0")))
+    object_store_backend:str=field(default_factory=lambda: os.getenv("OBJECT_STORE_BACKEND", "s3"))
+    bucket_name:str=field(default_factory=lambda: os.getenv("BUCKET_NAME"))
+    object_store_local_root:str=field(default_factory=lambda: os.getenv("OBJECT_STORE_LOCAL_ROOT"))
+    artifact_keep_last_n:int=field(default_factory=lambda: int(os.getenv("ARTIFACT_KEEP_LAST_N", "3")))
 
 
-env_var=EnvironmentVariable()
-mongo_client = pymongo.MongoClient(env_var.mongo_db_url)
 TARGET_COLUMN="class"
 
+# built on first use, so importing sensor never reads .env nor opens a mongo client
+_env_var = None
+_mongo_client = None
 
+
+def get_env_var()->EnvironmentVariable:
+    global _env_var
+    if _env_var is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_var = EnvironmentVariable()
+    return _env_var
+
+
+def get_mongo_client():
+    global _mongo_client
+    if _mongo_client is None:
+        import pymongo
+        _mongo_client = pymongo.MongoClient(get_env_var().mongo_db_url)
+    return _mongo_client
+
+
+def set_mongo_client(client):
+    """
+    Replaces the mongo client, e.g. by an in-process stand-in for benchmarks
+    """
+    global _mongo_client
+    _mongo_client = client
+
+
+def __getattr__(name):
+    # keeps `from sensor.config import env_var, mongo_client` working while staying lazy
+    if name == "env_var":
+        return get_env_var()
+    if name == "mongo_client":
+        return get_mongo_client()
+    raise AttributeError(f"module {__name__} has no attribute {name}")
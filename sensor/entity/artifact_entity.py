@@ -2,24 +2,38 @@ from dataclasses import dataclass
 @dataclass
 class DataIngestionArtifact:
     feature_store_file_path:str
-    train_file_path:str
-    test_file_path:str
+    # row positions of the train and test split in the feature store, read with utils.read_dataset_split(s)
+    split_file_path:str
+    # fields kept by the database statistics (missing at most missing_threshold), None when they were not computed
+    projected_columns:list = None
+    # per field statistics aggregated by the database, None when they were not computed
+    field_stats_file_path:str = None
 
 @dataclass
 class DataValidationArtifact:
     report_file_path:str
 @dataclass
+class FeatureSelectionArtifact:
+    selected_features_file_path:str
+    selected_features:list
+@dataclass
 class DataTransformationArtifact:
     transform_object_path:str
     transformed_train_path:str
     transformed_test_path:str
     target_encoder_path:str
     target_encoder_path:str
+    feature_stats_file_path:str = None
+    unsampled_train_path:str = None
 @dataclass    
 class ModelTrainerArtifact:
     model_path:str
     f1_train_score:float
     f1_test_score:float
+    # per fold validation f1 and their spread, None when cross validation is disabled
+    cv_f1_scores:list = None
+    cv_f1_mean:float = None
+    cv_f1_std:float = None
 @dataclass   
 class ModelEvaluationArtifact:
     is_model_accepted:bool
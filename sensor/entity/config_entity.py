@@ -1,6 +1,7 @@
 import os, sys
 from sensor.exception import SensorException
 from sensor.logger import logging
+from sensor.config import get_env_var
 from datetime import datetime
 
 FILE_NAME="sensor.csv"
@@ -9,12 +10,21 @@ TEST_FILE_NAME="test.csv"
 TRANSFORMER_OBJECT_FILE_NAME="transformer.pkl"
 TARGET_ENCODER_OBJECT_FILE_NAME="target_encoder.pkl"
 MODEL_FILE_NAME="model.pkl"
+# written next to every published model, links the registry version to the artifact run that produced it
+RUN_INFO_FILE_NAME="run_info.yaml"
+SELECTED_FEATURES_FILE_NAME="selected_features.yaml"
+# null ratio and value range of every feature in the training data, batch prediction inputs are checked against them
+FEATURE_STATS_FILE_NAME="feature_stats.yaml"
 
 class TrainingPipelineConfig:
 
-    def __init__(self):
+    def __init__(self, stage_profiler:str=None):
         try:
             self.artifact_dir = os.path.join(os.getcwd(),"artifact",f"{datetime.now().strftime('%m%d%Y__%H%M%S')}")
+            # timing, memory and throughput of every stage are written next to the artifacts
+            self.run_profile_file_path = os.path.join(self.artifact_dir,"run_profile.yaml")
+            # None, "cprofile" or "pyinstrument" to also profile every stage
+            self.stage_profiler = stage_profiler
         except Exception  as e:
             raise SensorException(e,sys)
 
@@ -25,9 +35,14 @@ class DataIngestionConfig:
             self.collection_name="sensor"
             self.data_ingestion_dir = os.path.join(training_pipeline_config.artifact_dir , "data_ingestion")
             self.feature_store_file_path = os.path.join(self.data_ingestion_dir,"feature_store",FILE_NAME)
-            self.train_file_path = os.path.join(self.data_ingestion_dir,"dataset",TRAIN_FILE_NAME)
-            self.test_file_path = os.path.join(self.data_ingestion_dir,"dataset",TEST_FILE_NAME)
+            # the split is stored as row positions of the feature store instead of train and test copies of the rows
+            self.split_file_path = os.path.join(self.data_ingestion_dir,"dataset","split_indices.npz")
             self.test_size = 0.2
+            # null/"na" counts and min/max of every field are aggregated by the database before the read,
+            # fields missing in more than missing_threshold of the documents are then never transferred
+            self.push_down_field_stats = True
+            self.missing_threshold:float=0.7
+            self.field_stats_file_path = os.path.join(self.data_ingestion_dir,"field_stats.yaml")
         except Exception  as e:
             raise SensorException(e,sys)     
 
@@ -46,7 +61,20 @@ class DataValidationConfig:
         self.data_validation_dir = os.path.join(training_pipeline_config.artifact_dir , "data_validation")
         self.report_file_path=os.path.join(self.data_validation_dir,"report.yaml")
         self.missing_threshold:float=0.7
-        self.base_file_path=os.path.join("/config/workspace/aps_failure_training_set1.csv")
+        self.base_file_path=get_env_var().base_file_path
+
+
+class FeatureSelectionConfig:
+    def __init__(self,training_pipeline_config:TrainingPipelineConfig):
+        self.feature_selection_dir = os.path.join(training_pipeline_config.artifact_dir , "feature_selection")
+        self.selected_features_file_path = os.path.join(self.feature_selection_dir,SELECTED_FEATURES_FILE_NAME)
+        # a feature whose most frequent value covers more than this share of the rows is dropped
+        self.near_constant_threshold:float=0.999
+        # of two features with an absolute correlation above this, the later one is dropped
+        self.correlation_threshold:float=0.98
+        # features never used by a small xgboost model are dropped, n_estimators of that model
+        self.drop_zero_gain:bool=True
+        self.gain_n_estimators:int=50
 
 
 class DataTransformationConfig:
@@ -55,7 +83,10 @@ class DataTransformationConfig:
         self.transform_object_path = os.path.join(self.data_transformation_dir,"transformer",TRANSFORMER_OBJECT_FILE_NAME)
         self.transformed_train_path =  os.path.join(self.data_transformation_dir,"transformed",TRAIN_FILE_NAME.replace("csv","npz"))
         self.transformed_test_path =os.path.join(self.data_transformation_dir,"transformed",TEST_FILE_NAME.replace("csv","npz"))
+        # the transformed train array before re sampling, cross validation re samples inside every training fold
+        self.unsampled_train_path = os.path.join(self.data_transformation_dir,"transformed","train_unsampled.npz")
         self.target_encoder_path = os.path.join(self.data_transformation_dir,"target_encoder",TARGET_ENCODER_OBJECT_FILE_NAME)
+        self.feature_stats_file_path = os.path.join(self.data_transformation_dir,FEATURE_STATS_FILE_NAME)
         
 
 class ModelTrainerConfig:
@@ -64,6 +95,12 @@ class ModelTrainerConfig:
         self.model_path = os.path.join(self.model_trainer_dir,"model",MODEL_FILE_NAME)
         self.expected_score = 0.7
         self.overfitting_threshold = 0.1 
+        # k-fold cross validation of the train array, acceptance then uses the mean fold scores; 0 or 1 disables it
+        self.cv_folds = get_env_var().model_trainer_cv_folds
+        # threads shared by all the folds trained at once, None uses os.cpu_count()
+        self.cv_max_threads = None
+        # the train array is written once as float32 here and memory mapped by every fold worker
+        self.cv_train_array_path = os.path.join(self.model_trainer_dir,"cv","train_x.npy")
 class ModelEvaluationConfig:
     def __init__(self,training_pipeline_config:TrainingPipelineConfig):
         self.change_threshold = 0.01
@@ -75,6 +112,102 @@ class ModelPusherConfig:
         self.pusher_model_path = os.path.join(self.pusher_model_dir, MODEL_FILE_NAME)
         self.pusher_transformer_path = os.path.join(self.pusher_model_dir, TRANSFORMER_OBJECT_FILE_NAME)
         self.pusher_target_encoder_path = os.path.join(self.pusher_model_dir,TARGET_ENCODER_OBJECT_FILE_NAME)
-        
+        self.artifact_dir = training_pipeline_config.artifact_dir
+
+
+class BatchPredictionConfig:
+    def __init__(self, prediction_dir:str="prediction", chunk_size:int=None, queue_size:int=4, max_workers:int=None,
+                max_threads:int=None, output_format:str="csv", compression:str=None, passthrough_columns:list=None, row_id_column:str="row_id",
+                manifest_file_path:str=None, attribution_top_k:int=None, attribution_approx:bool=False,
+                attribution_flagged_only:bool=True, deduplicate_rows:bool=True, prediction_cache_file_path:str=None,
+                input_validation:str="first_chunk", quarantine_dir:str=None, max_unparseable_ratio:float=0.001,
+                max_null_ratio_increase:float=0.2, range_margin:float=0.1, max_out_of_range_ratio:float=0.01):
+        # chunk_size=None scores the whole file at once, otherwise the file is streamed in chunks of chunk_size rows
+        self.prediction_dir = prediction_dir
+        self.chunk_size = chunk_size
+        # number of chunks allowed in flight between the reader, scoring and writer threads
+        self.queue_size = queue_size
+        # number of worker processes used when a whole directory is scored, None uses one per core of max_threads
+        self.max_workers = max_workers
+        # cores shared by the worker processes and their model threads, None uses os.cpu_count();
+        # set it to a share of the host when several shards are scored on the same host
+        self.max_threads = max_threads
+        self.summary_file_name = f"batch_summary_{datetime.now().strftime('%m%d%Y__%H%M%S')}.yaml"
+        # csv, parquet or feather; compression is gzip/bz2/xz for csv and a pyarrow codec (snappy, zstd, lz4...) otherwise
+        self.output_format = output_format
+        self.compression = compression
+        # None echoes every input column, [] writes only row_id_column and the predictions
+        self.passthrough_columns = passthrough_columns
+        self.row_id_column = row_id_column
+        # when set, files already scored with the current model version are skipped by start_parallel_batch_prediction
+        self.manifest_file_path = manifest_file_path
+        # when set, the top_k features behind every prediction are written next to it (xgboost models only),
+        # attribution_approx trades exact tree SHAP for the cheaper Saabas approximation,
+        # attribution_flagged_only explains the trucks predicted as failing and leaves the other rows empty
+        self.attribution_top_k = attribution_top_k
+        self.attribution_approx = attribution_approx
+        self.attribution_flagged_only = attribution_flagged_only
+        # rows with the same feature values are transformed and predicted once per chunk
+        self.deduplicate_rows = deduplicate_rows
+        # when set, predictions are cached by (row hash, model content hash) in this sqlite file across files and runs,
+        # the cache is bypassed while attributions are written
+        self.prediction_cache_file_path = prediction_cache_file_path
+        # "first_chunk" checks the first chunk_size rows of a streamed file, "full" the whole file, None disables the check.
+        # Files failing it are copied to quarantine_dir with a validation report, before any model work is done.
+        # quarantine_dir defaults to a sibling of prediction_dir, so it is not synced along with the predictions
+        self.input_validation = input_validation
+        self.quarantine_dir = quarantine_dir or f"{os.path.normpath(prediction_dir)}_quarantine"
+        # a feature fails when more than max_unparseable_ratio of its values are not numbers,
+        # when its null ratio exceeds the training one by more than max_null_ratio_increase,
+        # or when more than max_out_of_range_ratio of its values fall outside the training range
+        # widened by range_margin times its span on both sides
+        self.max_unparseable_ratio = max_unparseable_ratio
+        self.max_null_ratio_increase = max_null_ratio_increase
+        self.range_margin = range_margin
+        self.max_out_of_range_ratio = max_out_of_range_ratio
+
+
+class ServingConfig:
+    def __init__(self, model_registry:str="saved_models", max_batch_size:int=64, max_wait_ms:float=2.0,
+                metrics_window:int=10000, host:str="0.0.0.0", port:int=8000, reload_poll_seconds:float=30.0):
+        self.model_registry = model_registry
+        # concurrent requests are scored together until max_batch_size rows or max_wait_ms after the first request
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        # number of most recent requests used for the latency percentiles
+        self.metrics_window = metrics_window
+        self.host = host
+        self.port = port
+        # how often the registry is checked for a newly published model, None disables hot reload
+        self.reload_poll_seconds = reload_poll_seconds
+
+
+class ObjectStoreConfig:
+    def __init__(self, backend:str=None, bucket_name:str=None, local_root:str=None,
+                max_workers:int=8, max_concurrency:int=4, max_retries:int=3, backoff_seconds:float=0.5,
+                multipart_threshold:int=8*1024*1024, multipart_chunksize:int=8*1024*1024):
+        # "s3" or "local", local keeps objects under local_root and stands in for s3 in tests
+        self.backend = backend or get_env_var().object_store_backend
+        self.bucket_name = bucket_name or get_env_var().bucket_name
+        self.local_root = local_root or get_env_var().object_store_local_root or os.path.join(os.getcwd(), "object_store")
+        # files transferred at once, and parts of one multipart transfer in flight at once
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        # same defaults as the aws cli, so etags of files synced by it still match
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+
 
 
+class ArtifactRetentionConfig:
+    def __init__(self, artifact_root:str=None, saved_model_dir:str="saved_models", keep_last_n:int=None,
+                compress_min_bytes:int=1024*1024, compression_level:int=3):
+        self.artifact_root = artifact_root or os.path.join(os.getcwd(),"artifact")
+        self.saved_model_dir = saved_model_dir
+        # most recent runs always kept, runs that produced a published registry version are kept as well
+        self.keep_last_n = keep_last_n if keep_last_n is not None else get_env_var().artifact_keep_last_n
+        # files of retained runs at least this large are stored zstd compressed, None disables compression
+        self.compress_min_bytes = compress_min_bytes
+        self.compression_level = compression_level
@@ -0,0 +1,182 @@
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.utils import write_yaml_file
+from contextlib import contextmanager
+from typing import Optional
+import os, sys
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+STAGE_PROFILERS = ["cprofile", "pyinstrument"]
+# psutil samples the rss while a stage runs, without it ru_maxrss only gives the peak of the whole process so far,
+# so every stage after the largest one reports that same peak
+PEAK_RSS_SOURCE = "stage" if psutil is not None else ("process_peak" if resource is not None else None)
+
+# stage currently running, components report the size of what they processed to it
+_current_stage = threading.local()
+
+
+def _rss_bytes()->Optional[int]:
+    if psutil is not None:
+        return psutil.Process(os.getpid()).memory_info().rss
+    if resource is not None:
+        # ru_maxrss is the peak of the process so far, in KB on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+    return None
+
+
+class _PeakRssSampler:
+    """
+    Samples the resident set size on a background thread while a stage runs
+    """
+
+    def __init__(self, interval_seconds:float=0.05):
+        self.interval_seconds = interval_seconds
+        self.peak_rss = _rss_bytes()
+        self._stop_event = threading.Event()
+        self._worker = None
+
+    def __enter__(self):
+        if psutil is not None:
+            self._worker = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._worker.start()
+        return self
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            self.peak_rss = max(self.peak_rss, _rss_bytes())
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join()
+        rss = _rss_bytes()
+        if rss is not None:
+            self.peak_rss = max(self.peak_rss or 0, rss)
+
+
+class StageRecord:
+
+    def __init__(self, name:str):
+        self.name = name
+        self.rows = None
+        self.columns = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_rss_bytes = None
+        self.status = "running"
+        self.profile_file_path = None
+
+    def set_shape(self, rows:int, columns:int):
+        self.rows = int(rows)
+        self.columns = int(columns)
+
+    def to_dict(self)->dict:
+        rows_per_second = None
+        if self.rows is not None and self.wall_seconds:
+            rows_per_second = round(self.rows/self.wall_seconds, 2)
+        return {"stage": self.name, "status": self.status,
+                "wall_seconds": self.wall_seconds, "cpu_seconds": self.cpu_seconds,
+                "peak_rss_mb": round(self.peak_rss_bytes/2**20, 2) if self.peak_rss_bytes else None,
+                "peak_rss_source": PEAK_RSS_SOURCE,
+                "rows": self.rows, "columns": self.columns, "rows_per_second": rows_per_second,
+                "profile_file_path": self.profile_file_path}
+
+
+def record_shape(rows:int, columns:int):
+    """
+    Called by components to report the rows and columns they processed, no-op outside a profiled stage
+    """
+    stage = getattr(_current_stage, "record", None)
+    if stage is not None:
+        stage.set_shape(rows=rows, columns=columns)
+
+
+class RunProfiler:
+    """
+    Records wall time, cpu time, peak rss and rows/s of every pipeline stage
+    and writes them as a machine readable run profile
+
+    profiler: None, "cprofile" or "pyinstrument" to also write a per stage profile into profile_dir
+    """
+
+    def __init__(self, run_profile_file_path:str, profiler:Optional[str]=None, profile_dir:Optional[str]=None):
+        try:
+            if profiler is not None and profiler not in STAGE_PROFILERS:
+                raise Exception(f"Stage profiler: {profiler} is not one of {STAGE_PROFILERS}")
+            self.run_profile_file_path = run_profile_file_path
+            self.profiler = profiler
+            self.profile_dir = profile_dir or os.path.join(os.path.dirname(run_profile_file_path), "profiles")
+            self.stages = []
+            self.start_time = time.perf_counter()
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    @contextmanager
+    def _stage_profiler(self, record:StageRecord):
+        if self.profiler is None:
+            yield
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        if self.profiler == "cprofile":
+            import cProfile
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                record.profile_file_path = os.path.join(self.profile_dir, f"{record.name}.prof")
+                profile.dump_stats(record.profile_file_path)
+        else:
+            from pyinstrument import Profiler
+            profile = Profiler()
+            profile.start()
+            try:
+                yield
+            finally:
+                profile.stop()
+                record.profile_file_path = os.path.join(self.profile_dir, f"{record.name}.html")
+                with open(record.profile_file_path, "w") as file_obj:
+                    file_obj.write(profile.output_html())
+
+    @contextmanager
+    def stage(self, name:str):
+        record = StageRecord(name=name)
+        self.stages.append(record)
+        _current_stage.record = record
+        rss_sampler = _PeakRssSampler()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            with rss_sampler, self._stage_profiler(record):
+                yield record
+            record.status = "succeeded"
+        except BaseException:
+            record.status = "failed"
+            raise
+        finally:
+            _current_stage.record = None
+            record.wall_seconds = round(time.perf_counter() - wall_start, 4)
+            record.cpu_seconds = round(time.process_time() - cpu_start, 4)
+            record.peak_rss_bytes = rss_sampler.peak_rss
+            logging.info("Stage profile: %s", record.to_dict())
+            self.save()
+
+    def to_dict(self)->dict:
+        return {"total_wall_seconds": round(time.perf_counter() - self.start_time, 4),
+                "stages": [record.to_dict() for record in self.stages]}
+
+    def save(self):
+        try:
+            write_yaml_file(file_path=self.run_profile_file_path, data=self.to_dict())
+        except Exception as e:
+            raise SensorException(e, sys)
@@ -1,5 +1,9 @@
 import logging
+import logging.handlers
+import atexit
+import json
 import os
+import queue
 from datetime import datetime
 # log file name
 LOG_FILE_NAME=f"{datetime.now().strftime('%m%d%y__%H%M%S')}.log"
@@ -12,9 +16,125 @@ os.makedirs(LOG_FILE_DIR,exist_ok=True)
 # log file Path:
 LOG_FILE_PATH=os.path.join(LOG_FILE_DIR,LOG_FILE_NAME)
 
+LOG_FORMAT="[%(asctime)s] %(lineno)d %(name)s -%(levelname)s- %(message)s"
+# root level, per module levels as "sensor.components.data_validation=WARNING,sensor.predictor=DEBUG"
+LOG_LEVEL=os.getenv("SENSOR_LOG_LEVEL","INFO")
+MODULE_LOG_LEVELS=os.getenv("SENSOR_MODULE_LOG_LEVELS","")
+# "text" keeps the classic line format, "json" writes one structured record per line
+LOG_RECORD_FORMAT=os.getenv("SENSOR_LOG_FORMAT","text")
+# messages longer than this are cut, so logging a large object can not blow up the log or the writer
+LOG_MAX_MESSAGE_CHARS=int(os.getenv("SENSOR_LOG_MAX_MESSAGE_CHARS","2000"))
+
+
+def parse_module_levels(module_levels:str)->dict:
+    levels = dict()
+    for item in module_levels.split(","):
+        if "=" in item:
+            module_name, level = item.split("=", 1)
+            levels[module_name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+class ModuleLevelFilter(logging.Filter):
+    """
+    Applies per module levels to records of the root logger, matched on the dotted module path of the caller
+    """
+
+    def __init__(self, module_levels:dict, default_level:int):
+        super().__init__()
+        self.module_levels = module_levels
+        self.default_level = default_level
+        self._module_names = dict()
+
+    def _module_name(self, pathname:str)->str:
+        module_name = self._module_names.get(pathname)
+        if module_name is None:
+            relative_path = os.path.relpath(pathname, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            module_name = os.path.splitext(relative_path)[0].replace(os.sep, ".")
+            self._module_names[pathname] = module_name
+        return module_name
+
+    def filter(self, record:logging.LogRecord)->bool:
+        if not self.module_levels:
+            return True
+        module_name = self._module_name(record.pathname)
+        for prefix, level in self.module_levels.items():
+            if module_name == prefix or module_name.startswith(prefix + "."):
+                return record.levelno >= level
+        return record.levelno >= self.default_level
+
+
+class CappedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Only merges and caps the message on the calling thread, the file write and final formatting happen on the listener
+    """
+
+    def __init__(self, log_queue:queue.Queue, max_message_chars:int):
+        super().__init__(log_queue)
+        self.max_message_chars = max_message_chars
+
+    def prepare(self, record:logging.LogRecord)->logging.LogRecord:
+        message = record.getMessage()
+        if len(message) > self.max_message_chars:
+            message = f"{message[:self.max_message_chars]}... [{len(message)-self.max_message_chars} chars truncated]"
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record:logging.LogRecord)->str:
+        structured_record = {"time": self.formatTime(record), "level": record.levelname, "name": record.name,
+                             "module": record.module, "line": record.lineno, "message": record.getMessage()}
+        if record.exc_text:
+            structured_record["exception"] = record.exc_text
+        return json.dumps(structured_record, default=str)
+
+
+def _start_listener()->logging.handlers.QueueListener:
+    file_handler = logging.FileHandler(LOG_FILE_PATH)
+    file_handler.setFormatter(JsonFormatter() if LOG_RECORD_FORMAT == "json" else logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(_log_queue, file_handler, respect_handler_level=False)
+    listener.start()
+    return listener
+
+
+def _restart_listener_in_child():
+    # a forked worker inherits the queue but not the listener thread
+    global _log_queue, _listener
+    _log_queue = queue.Queue(-1)
+    _queue_handler.queue = _log_queue
+    _listener = _start_listener()
+    # multiprocessing workers leave through os._exit, which skips atexit but runs multiprocessing finalizers
+    import multiprocessing.util
+    multiprocessing.util.Finalize(None, stop_logging, exitpriority=0)
+
+
+def stop_logging():
+    """
+    Flushes every queued record to the log file
+    """
+    if _listener._thread is not None:
+        _listener.stop()
+
+
+_default_level = logging.getLevelName(LOG_LEVEL.upper())
+_module_levels = parse_module_levels(MODULE_LOG_LEVELS)
+_log_queue = queue.Queue(-1)
+_queue_handler = CappedQueueHandler(_log_queue, max_message_chars=LOG_MAX_MESSAGE_CHARS)
+_queue_handler.addFilter(ModuleLevelFilter(_module_levels, default_level=_default_level))
+
 logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    format="[%(asctime)s] %(lineno)d %(name)s -%(levelname)s- %(message)s",
-    level=logging.INFO
+    handlers=[_queue_handler],
+    # the root logger lets through the most verbose configured level, the filter applies the per module levels
+    level=min([_default_level, *_module_levels.values()])
 
-)
\ No newline at end of file
+)
+_listener = _start_listener()
+atexit.register(stop_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listener_in_child)
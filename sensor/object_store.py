@@ -0,0 +1,261 @@
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.entity.config_entity import ObjectStoreConfig
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import hashlib
+import os, sys
+import shutil
+import time
+
+
+@dataclass
+class ObjectInfo:
+    size:int
+    etag:str
+
+
+def compute_etag(file_path:str, multipart_threshold:int, multipart_chunksize:int)->str:
+    """
+    S3 style etag: md5 of the file below multipart_threshold, otherwise md5 of the part md5s followed by -<parts>
+    """
+    try:
+        if os.path.getsize(file_path) < multipart_threshold:
+            file_hash = hashlib.md5()
+            with open(file_path, "rb") as file_obj:
+                for block in iter(lambda: file_obj.read(1 << 20), b""):
+                    file_hash.update(block)
+            return file_hash.hexdigest()
+        part_digests = []
+        with open(file_path, "rb") as file_obj:
+            for part in iter(lambda: file_obj.read(multipart_chunksize), b""):
+                part_digests.append(hashlib.md5(part).digest())
+        return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+class ObjectStoreBackend(ABC):
+    """
+    Minimal object store interface, keys are "/" separated paths inside the store
+    """
+
+    def __init__(self, object_store_config:ObjectStoreConfig):
+        self.object_store_config = object_store_config
+
+    @abstractmethod
+    def list_objects(self, prefix:str)->Dict[str, ObjectInfo]:
+        pass
+
+    @abstractmethod
+    def upload_file(self, file_path:str, key:str):
+        pass
+
+    @abstractmethod
+    def download_file(self, key:str, file_path:str):
+        pass
+
+
+class LocalObjectStore(ObjectStoreBackend):
+    """
+    Object store on the local filesystem under object_store_config.local_root, stands in for s3 in tests and benchmarks
+    """
+
+    def _path(self, key:str)->str:
+        return os.path.join(self.object_store_config.local_root, *key.split("/"))
+
+    def list_objects(self, prefix:str)->Dict[str, ObjectInfo]:
+        objects = dict()
+        prefix_dir = self._path(prefix)
+        for dir_path, _, file_names in os.walk(prefix_dir):
+            for file_name in file_names:
+                file_path = os.path.join(dir_path, file_name)
+                key = "/".join([prefix.rstrip("/"), *os.path.relpath(file_path, prefix_dir).split(os.sep)])
+                objects[key] = ObjectInfo(size=os.path.getsize(file_path),
+                    etag=compute_etag(file_path, self.object_store_config.multipart_threshold,
+                                      self.object_store_config.multipart_chunksize))
+        return objects
+
+    def _copy(self, source_path:str, target_path:str):
+        os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+        # copy to a temporary name first so a failed transfer never leaves a truncated object behind
+        tmp_path = f"{target_path}.part"
+        with open(source_path, "rb") as source, open(tmp_path, "wb") as target:
+            shutil.copyfileobj(source, target, self.object_store_config.multipart_chunksize)
+        os.replace(tmp_path, target_path)
+
+    def upload_file(self, file_path:str, key:str):
+        self._copy(file_path, self._path(key))
+
+    def download_file(self, key:str, file_path:str):
+        self._copy(self._path(key), file_path)
+
+
+class S3ObjectStore(ObjectStoreBackend):
+    """
+    Amazon s3 through boto3, large files are split in multipart_chunksize parts transferred max_concurrency at a time
+    """
+
+    def __init__(self, object_store_config:ObjectStoreConfig):
+        super().__init__(object_store_config=object_store_config)
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        self.client = boto3.client("s3")
+        self.transfer_config = TransferConfig(multipart_threshold=object_store_config.multipart_threshold,
+                                              multipart_chunksize=object_store_config.multipart_chunksize,
+                                              max_concurrency=object_store_config.max_concurrency)
+
+    def list_objects(self, prefix:str)->Dict[str, ObjectInfo]:
+        objects = dict()
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.object_store_config.bucket_name, Prefix=prefix.rstrip("/") + "/"):
+            for item in page.get("Contents", []):
+                objects[item["Key"]] = ObjectInfo(size=item["Size"], etag=item["ETag"].strip('"'))
+        return objects
+
+    def upload_file(self, file_path:str, key:str):
+        self.client.upload_file(file_path, self.object_store_config.bucket_name, key, Config=self.transfer_config)
+
+    def download_file(self, key:str, file_path:str):
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        self.client.download_file(self.object_store_config.bucket_name, key, file_path, Config=self.transfer_config)
+
+
+OBJECT_STORE_BACKENDS = {"s3": S3ObjectStore, "local": LocalObjectStore}
+
+
+def get_object_store(object_store_config:ObjectStoreConfig=None)->ObjectStoreBackend:
+    try:
+        object_store_config = object_store_config or ObjectStoreConfig()
+        if object_store_config.backend not in OBJECT_STORE_BACKENDS:
+            raise Exception(f"Object store backend: {object_store_config.backend} is not one of {list(OBJECT_STORE_BACKENDS)}")
+        return OBJECT_STORE_BACKENDS[object_store_config.backend](object_store_config=object_store_config)
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+class ObjectStoreSync:
+    """
+    Directory sync with an object store: files whose size and etag already match are skipped,
+    the others are transferred concurrently and retried with exponential backoff
+    """
+
+    def __init__(self, object_store:ObjectStoreBackend=None, object_store_config:ObjectStoreConfig=None):
+        try:
+            self.object_store_config = object_store_config or (object_store.object_store_config if object_store else ObjectStoreConfig())
+            self.object_store = object_store or get_object_store(self.object_store_config)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def _local_files(self, local_dir:str)->Dict[str, str]:
+        local_files = dict()
+        for dir_path, _, file_names in os.walk(local_dir):
+            for file_name in file_names:
+                file_path = os.path.join(dir_path, file_name)
+                local_files["/".join(os.path.relpath(file_path, local_dir).split(os.sep))] = file_path
+        return local_files
+
+    def _is_same(self, file_path:str, object_info:Optional[ObjectInfo])->bool:
+        if object_info is None or os.path.getsize(file_path) != object_info.size:
+            return False
+        return compute_etag(file_path, self.object_store_config.multipart_threshold,
+                            self.object_store_config.multipart_chunksize) == object_info.etag
+
+    def _with_retries(self, transfer, *args):
+        for attempt in range(self.object_store_config.max_retries + 1):
+            try:
+                return transfer(*args)
+            except Exception as e:
+                if attempt == self.object_store_config.max_retries:
+                    raise e
+                backoff = self.object_store_config.backoff_seconds * 2**attempt
+                logging.info("Transfer of %s failed: %s, retrying in %ss", args, e, backoff)
+                time.sleep(backoff)
+
+    def _run(self, transfers:list, n_skipped:int, direction:str)->dict:
+        start_time = time.perf_counter()
+        n_bytes, failed = 0, []
+        with ThreadPoolExecutor(max_workers=self.object_store_config.max_workers) as executor:
+            futures = {executor.submit(self._with_retries, transfer, source, target): (source, size)
+                       for transfer, source, target, size in transfers}
+            for future in as_completed(futures):
+                source, size = futures[future]
+                try:
+                    future.result()
+                    n_bytes += size
+                except Exception as e:
+                    failed.append({"source": source, "error": str(e)})
+        seconds = time.perf_counter() - start_time
+        report = {"direction": direction,
+                  "files_transferred": len(transfers) - len(failed),
+                  "files_skipped": n_skipped,
+                  "files_failed": failed,
+                  "bytes": n_bytes,
+                  "seconds": round(seconds, 4),
+                  "mb_per_second": round(n_bytes/2**20/seconds, 2) if seconds > 0 else None}
+        logging.info("Object store sync report: %s", report)
+        if failed:
+            raise Exception(f"{len(failed)} file(s) failed to transfer: {failed}")
+        return report
+
+    def upload_dir(self, local_dir:str, prefix:str)->dict:
+        """
+        Uploads every file of local_dir under prefix, unless an identical object is already there
+        """
+        try:
+            remote_objects = self.object_store.list_objects(prefix)
+            transfers, n_skipped = [], 0
+            for relative_key, file_path in self._local_files(local_dir).items():
+                key = f"{prefix.rstrip('/')}/{relative_key}"
+                if self._is_same(file_path, remote_objects.get(key)):
+                    n_skipped += 1
+                    continue
+                transfers.append((self.object_store.upload_file, file_path, key, os.path.getsize(file_path)))
+            return self._run(transfers, n_skipped=n_skipped, direction=f"{local_dir} -> {prefix}")
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def download_keys(self, prefix:str, relative_keys:List[str], local_dir:str)->dict:
+        """
+        Downloads only the given objects under prefix into local_dir, keeping their path relative to prefix,
+        unless an identical file is already there. A key missing from the object store counts as a failed transfer.
+        """
+        try:
+            os.makedirs(local_dir, exist_ok=True)
+            remote_objects = self.object_store.list_objects(prefix)
+            transfers, n_skipped, missing = [], 0, []
+            for relative_key in relative_keys:
+                key = f"{prefix.rstrip('/')}/{relative_key}"
+                object_info = remote_objects.get(key)
+                if object_info is None:
+                    missing.append(key)
+                    continue
+                file_path = os.path.join(local_dir, *relative_key.split("/"))
+                if os.path.exists(file_path) and self._is_same(file_path, object_info):
+                    n_skipped += 1
+                    continue
+                transfers.append((self.object_store.download_file, key, file_path, object_info.size))
+            if missing:
+                raise Exception(f"{len(missing)} object(s) not found: {missing}")
+            return self._run(transfers, n_skipped=n_skipped, direction=f"{prefix} -> {local_dir}")
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def download_dir(self, prefix:str, local_dir:str)->dict:
+        """
+        Downloads every object under prefix into local_dir, unless an identical file is already there
+        """
+        try:
+            os.makedirs(local_dir, exist_ok=True)
+            transfers, n_skipped = [], 0
+            for key, object_info in self.object_store.list_objects(prefix).items():
+                file_path = os.path.join(local_dir, *key[len(prefix.rstrip("/"))+1:].split("/"))
+                if os.path.exists(file_path) and self._is_same(file_path, object_info):
+                    n_skipped += 1
+                    continue
+                transfers.append((self.object_store.download_file, key, file_path, object_info.size))
+            return self._run(transfers, n_skipped=n_skipped, direction=f"{prefix} -> {local_dir}")
+        except Exception as e:
+            raise SensorException(e, sys)
@@ -1,52 +1,569 @@
 from sensor.exception import SensorException
 from sensor.logger import logging
-from sensor.predictor import ModelResolver
+from sensor.predictor import ModelResolver, ModelBundle, ModelBundlePaths, Predictor, load_model_bundle, predict_dataframe
+from sensor.entity.config_entity import BatchPredictionConfig
 import pandas as pd
 from datetime import datetime
 import os, sys
-from sensor.utils import load_object
-import numpy as np
+from sensor.utils import write_yaml_file, get_file_hash
+from sensor.pipeline.prediction_manifest import PredictionManifest
+from sensor.pipeline.prediction_cache import get_prediction_cache, predict_unique_rows
+from sensor.pipeline.input_validation import (NA_VALUE, INPUT_READ_ERRORS, coerce_feature_columns, validate_input_file,
+                                              validate_input_frame, quarantine_file)
+from sensor.pipeline.prediction_writer import get_prediction_writer, get_prediction_file_extension, select_output_columns
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 PREDICTION_DIR = "prediction"
 PREDICTION_FILE_NAME=f"{datetime.now().strftime('%m%d%Y__%H%M%S')}.csv"
 
-def start_batch_prediction(input_file_path):
+# marks the end of the chunk stream between the reader, scoring and writer threads
+_END_OF_STREAM = object()
+
+
+def _put(chunk_queue:queue.Queue, item, stop_event:threading.Event)->bool:
+    # blocks while the queue is full, but gives up once another stage has failed
+    while not stop_event.is_set():
+        try:
+            chunk_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(chunk_queue:queue.Queue, stop_event:threading.Event):
+    while not stop_event.is_set():
+        try:
+            return chunk_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END_OF_STREAM
+
+
+def get_input_columns(feature_names:List[str], batch_prediction_config:BatchPredictionConfig):
+    """
+    usecols for reading an input file: the features the transformers were fitted on plus the columns
+    written out, None when every input column is echoed to the prediction file
+    """
+    if batch_prediction_config.passthrough_columns is None:
+        return None
+    input_columns = {*feature_names, *batch_prediction_config.passthrough_columns,
+                     batch_prediction_config.row_id_column}
+    return lambda column: column in input_columns
+
+
+def _coerce_validated(df:pd.DataFrame, feature_names:List[str], batch_prediction_config:BatchPredictionConfig)->pd.DataFrame:
+    if batch_prediction_config.input_validation:
+        # the file passed validation, the few unparseable values it may still hold are scored as missing
+        df = coerce_feature_columns(df=df, feature_names=feature_names)
+    return df
+
+
+def read_input_chunks(input_file_path:str, feature_names:List[str], chunk_size:int,
+                      batch_prediction_config:BatchPredictionConfig)->Iterator[pd.DataFrame]:
+    """
+    Yields the input columns of input_file_path in chunks of chunk_size rows, "na" parsed as missing
+    """
+    usecols = get_input_columns(feature_names=feature_names, batch_prediction_config=batch_prediction_config)
+    for chunk in pd.read_csv(input_file_path, chunksize=chunk_size, usecols=usecols,
+                             na_values=[NA_VALUE]):
+        yield _coerce_validated(df=chunk, feature_names=feature_names, batch_prediction_config=batch_prediction_config)
+
+
+def read_input_file(input_file_path:str, feature_names:List[str], bundle:ModelBundle,
+                    batch_prediction_config:BatchPredictionConfig,
+                    start_time:float)->Tuple[Optional[pd.DataFrame], Optional[dict]]:
+    """
+    Validates input_file_path against feature_names and the feature statistics of bundle before any model work,
+    and reads it in full unless it is streamed in chunks.
+    Returns the frame (None for a streamed file) and the stats of the quarantined file (None when it passed).
+    """
+    if batch_prediction_config.chunk_size:
+        if batch_prediction_config.input_validation:
+            # only the feature columns of the first chunk (or of the whole stream) are read
+            report = validate_input_file(input_file_path=input_file_path, feature_names=feature_names,
+                                         feature_stats=bundle.feature_stats, batch_prediction_config=batch_prediction_config)
+            if not report["passed"]:
+                return None, quarantine_input_file(input_file_path=input_file_path, report=report, bundle=bundle,
+                                                   batch_prediction_config=batch_prediction_config, start_time=start_time)
+        return None, None
+
+    logging.info("Reading file: %s", input_file_path)
+    df, read_error = None, None
+    try:
+        # "na" is parsed as missing, so clean feature columns are read as floats directly
+        df = pd.read_csv(input_file_path, na_values=[NA_VALUE],
+                         usecols=get_input_columns(feature_names=feature_names, batch_prediction_config=batch_prediction_config))
+    except INPUT_READ_ERRORS as e:
+        if not batch_prediction_config.input_validation:
+            raise e
+        read_error = e
+    if batch_prediction_config.input_validation:
+        # the whole file is already in memory, it is validated before it is transformed
+        report = validate_input_frame(input_file_path=input_file_path, df=df, feature_names=feature_names,
+                                      feature_stats=bundle.feature_stats,
+                                      batch_prediction_config=batch_prediction_config, read_error=read_error)
+        if not report["passed"]:
+            return None, quarantine_input_file(input_file_path=input_file_path, report=report, bundle=bundle,
+                                               batch_prediction_config=batch_prediction_config, start_time=start_time)
+    return _coerce_validated(df=df, feature_names=feature_names, batch_prediction_config=batch_prediction_config), None
+
+
+def score_chunk(df:pd.DataFrame, transformer, model, target_encoder, batch_prediction_config:BatchPredictionConfig,
+                cache=None, scoring_stats:dict=None)->pd.DataFrame:
+    """
+    Scores one frame as configured: distinct rows only and through the prediction cache when enabled.
+    scoring_stats accumulates the rows, distinct rows and cache hits.
+    """
+    predict_kwargs = {"attribution_top_k": batch_prediction_config.attribution_top_k,
+                      "attribution_approx": batch_prediction_config.attribution_approx,
+                      "attribution_flagged_only": batch_prediction_config.attribution_flagged_only}
+    if not batch_prediction_config.deduplicate_rows and cache is None:
+        stats = {"rows": len(df), "unique_rows": len(df), "cache_hits": 0}
+        df = predict_dataframe(df=df, transformer=transformer, model=model, target_encoder=target_encoder, **predict_kwargs)
+    else:
+        df, stats = predict_unique_rows(df=df, transformer=transformer, model=model, target_encoder=target_encoder,
+                                        cache=cache, **predict_kwargs)
+    if scoring_stats is not None:
+        for key, value in stats.items():
+            scoring_stats[key] = scoring_stats.get(key, 0) + value
+    return df
+
+
+def get_file_prediction_cache(model_hash:str, batch_prediction_config:BatchPredictionConfig):
+    if batch_prediction_config.prediction_cache_file_path is None:
+        return None
+    if batch_prediction_config.attribution_top_k:
+        logging.info("Prediction cache bypassed, cached rows have no attributions")
+        return None
+    return get_prediction_cache(cache_file_path=batch_prediction_config.prediction_cache_file_path,
+                                model_hash=model_hash)
+
+
+def stream_batch_prediction(input_file_path:str, prediction_file_path:str, transformer, model, target_encoder,
+                            chunk_size:int, queue_size:int=4,
+                            batch_prediction_config:BatchPredictionConfig=None, cache=None,
+                            scoring_stats:dict=None)->int:
+    """
+    Scores input_file_path chunk by chunk and appends the scored rows to prediction_file_path.
+    Reading, scoring and writing run in separate threads connected by bounded queues,
+    so at most 2*queue_size+3 chunks are held in memory whatever the size of the file.
+    Returns the number of rows written.
+    """
+    if batch_prediction_config is None:
+        batch_prediction_config = BatchPredictionConfig(chunk_size=chunk_size, queue_size=queue_size)
+    read_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    errors = []
+
+    def read_chunks():
+        try:
+            for chunk in read_input_chunks(input_file_path=input_file_path, feature_names=list(transformer.feature_names_in_),
+                                           chunk_size=chunk_size, batch_prediction_config=batch_prediction_config):
+                if not _put(read_queue, chunk, stop_event):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+        finally:
+            _put(read_queue, _END_OF_STREAM, stop_event)
+
+    def score_chunks():
+        try:
+            row_offset = 0
+            while True:
+                chunk = _get(read_queue, stop_event)
+                if chunk is _END_OF_STREAM:
+                    break
+                chunk = score_chunk(df=chunk, transformer=transformer, model=model, target_encoder=target_encoder,
+                                    batch_prediction_config=batch_prediction_config, cache=cache,
+                                    scoring_stats=scoring_stats)
+                chunk = select_output_columns(df=chunk, passthrough_columns=batch_prediction_config.passthrough_columns,
+                                              row_id_column=batch_prediction_config.row_id_column, row_offset=row_offset)
+                row_offset += len(chunk)
+                if not _put(write_queue, chunk, stop_event):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+        finally:
+            _put(write_queue, _END_OF_STREAM, stop_event)
+
+    workers = [threading.Thread(target=read_chunks, name="prediction-reader", daemon=True),
+               threading.Thread(target=score_chunks, name="prediction-scorer", daemon=True)]
+    for worker in workers:
+        worker.start()
+
+    n_rows = 0
+    try:
+        with get_prediction_writer(file_path=prediction_file_path, output_format=batch_prediction_config.output_format,
+                                   compression=batch_prediction_config.compression) as writer:
+            while True:
+                chunk = _get(write_queue, stop_event)
+                if chunk is _END_OF_STREAM:
+                    break
+                writer.write(chunk)
+            n_rows = writer.n_rows
+    except Exception as e:
+        errors.append(e)
+        stop_event.set()
+    finally:
+        for worker in workers:
+            worker.join()
+
+    if errors:
+        # do not leave a half written prediction file behind
+        if os.path.exists(prediction_file_path):
+            os.remove(prediction_file_path)
+        raise errors[0]
+    logging.info("Streamed %s rows into %s", n_rows, prediction_file_path)
+    return n_rows
+
+
+def get_prediction_file_path(input_file_path:str, batch_prediction_config:BatchPredictionConfig)->str:
+    extension = get_prediction_file_extension(output_format=batch_prediction_config.output_format,
+                                              compression=batch_prediction_config.compression)
+    input_file_stem = os.path.splitext(os.path.basename(input_file_path))[0]
+    prediction_file_name = f"{input_file_stem}{datetime.now().strftime('%m%d%Y__%H%M%S')}{extension}"
+    return os.path.join(batch_prediction_config.prediction_dir, prediction_file_name)
+
+
+def quarantine_input_file(input_file_path:str, report:dict, bundle:ModelBundle,
+                          batch_prediction_config:BatchPredictionConfig, start_time:float)->dict:
+    report["model_version"] = bundle.version
+    quarantine_file_path = quarantine_file(input_file_path=input_file_path, report=report,
+                                           quarantine_dir=batch_prediction_config.quarantine_dir)
+    return {"input_file_path": input_file_path,
+            "quarantined": True,
+            "quarantine_file_path": quarantine_file_path,
+            "model_version": bundle.version,
+            "issues": report["issues"],
+            "rows": 0,
+            "seconds": round(time.perf_counter() - start_time, 4)}
+
+
+def predict_file(input_file_path:str, bundle:ModelBundle, batch_prediction_config:BatchPredictionConfig)->dict:
+    """
+    Scores one input file with an already loaded model bundle
+    Returns the prediction file path together with row count and throughput of the file,
+    or the quarantined file path when the input fails validation
+    """
+    start_time = time.perf_counter()
+    os.makedirs(batch_prediction_config.prediction_dir, exist_ok=True)
+    prediction_file_path = get_prediction_file_path(input_file_path=input_file_path,
+                                                    batch_prediction_config=batch_prediction_config)
+    df, quarantined_file_stats = read_input_file(input_file_path=input_file_path,
+                                                 feature_names=list(bundle.transformer.feature_names_in_), bundle=bundle,
+                                                 batch_prediction_config=batch_prediction_config, start_time=start_time)
+    if quarantined_file_stats is not None:
+        return quarantined_file_stats
+
+    cache = get_file_prediction_cache(model_hash=bundle.content_hash, batch_prediction_config=batch_prediction_config)
+    scoring_stats = dict()
+
+    if batch_prediction_config.chunk_size:
+        logging.info("Streaming file: %s in chunks of %s rows", input_file_path, batch_prediction_config.chunk_size)
+        n_rows = stream_batch_prediction(input_file_path=input_file_path, prediction_file_path=prediction_file_path,
+                                transformer=bundle.transformer, model=bundle.model, target_encoder=bundle.target_encoder,
+                                chunk_size=batch_prediction_config.chunk_size,
+                                queue_size=batch_prediction_config.queue_size,
+                                batch_prediction_config=batch_prediction_config, cache=cache,
+                                scoring_stats=scoring_stats)
+    else:
+        df = score_chunk(df=df, transformer=bundle.transformer, model=bundle.model, target_encoder=bundle.target_encoder,
+                         batch_prediction_config=batch_prediction_config, cache=cache, scoring_stats=scoring_stats)
+        df = select_output_columns(df=df, passthrough_columns=batch_prediction_config.passthrough_columns,
+                                   row_id_column=batch_prediction_config.row_id_column)
+        with get_prediction_writer(file_path=prediction_file_path, output_format=batch_prediction_config.output_format,
+                                   compression=batch_prediction_config.compression) as writer:
+            writer.write(df)
+        n_rows = len(df)
+    if cache is not None:
+        # only persisted once the prediction file is complete
+        cache.flush()
+
+    seconds = time.perf_counter() - start_time
+    return {"input_file_path": input_file_path,
+            "prediction_file_path": prediction_file_path,
+            "model_version": bundle.version,
+            "rows": int(n_rows),
+            "unique_rows": int(scoring_stats.get("unique_rows", n_rows)),
+            "cache_hits": int(scoring_stats.get("cache_hits", 0)),
+            "bytes_written": os.path.getsize(prediction_file_path),
+            "seconds": round(seconds, 4),
+            "rows_per_second": round(n_rows/seconds, 2) if seconds > 0 else None}
+
+
+# predictor shared by every start_batch_prediction call of this process
+_default_predictor:Predictor = None
+
+
+def get_default_predictor()->Predictor:
+    global _default_predictor
+    if _default_predictor is None:
+        _default_predictor = Predictor(model_registry="saved_models")
+    return _default_predictor
+
+
+def start_batch_prediction(input_file_path, batch_prediction_config:BatchPredictionConfig=None):
     try:
-        os.makedirs(PREDICTION_DIR, exist_ok=True)
-        logging.info(f"creating the model Resolver object ")
-        Model_resolver = ModelResolver(model_registry="saved_models")
-        logging.info(f"Reading file: {input_file_path}")
-        df=pd.read_csv(input_file_path)
-        df.replace({"na":np.NAN}, inplace = True)
+        if batch_prediction_config is None:
+            batch_prediction_config = BatchPredictionConfig(prediction_dir=PREDICTION_DIR)
+        logging.info(" Getting the transformer, model and target encoder of the latest version")
+        bundle = get_default_predictor().get_bundle()
+
+        file_stats = predict_file(input_file_path=input_file_path, bundle=bundle,
+                                  batch_prediction_config=batch_prediction_config)
+        if file_stats.get("quarantined"):
+            raise Exception(f"Input file: {input_file_path} failed validation {file_stats['issues']}, "
+                            f"quarantined to {file_stats['quarantine_file_path']}")
+        return file_stats["prediction_file_path"]
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+# model bundle of a worker process, loaded once by _init_worker
+_worker_bundle:ModelBundle = None
+
 
-        # Validation for the prediction data set    
-        
-        logging.info(f" Loading the transformer to transformer dataset")      
-        transformer = load_object(file_path = Model_resolver.get_latest_transformer_path())
+def _init_worker(bundle_paths:ModelBundlePaths, nthread:int=None):
+    global _worker_bundle
+    _worker_bundle = load_model_bundle(bundle_paths=bundle_paths, nthread=nthread)
 
-        input_feature_name = list(transformer.feature_names_in_)
-        input_arr = transformer.transform(df[input_feature_name])
 
-        
-        logging.info(f" Loading the model to make prediction")
-        model = load_object(file_path = Model_resolver.get_latest_models_path())
-        prediction = model.predict(input_arr)
+def _predict_file_in_worker(input_file_path:str, batch_prediction_config:BatchPredictionConfig)->dict:
+    return predict_file(input_file_path=input_file_path, bundle=_worker_bundle,
+                        batch_prediction_config=batch_prediction_config)
 
-        logging.info(f" Target Encoder to convert predicted columns into Categorical")
-        model = load_object(file_path = Model_resolver.get_latest_target_encoder_path())
 
-        logging.info(f" Target Encoder to convert the predicted column to Categorial")
+def list_input_files(input_dir:str)->List[str]:
+    return sorted(os.path.join(input_dir, file_name) for file_name in os.listdir(input_dir)
+                  if os.path.isfile(os.path.join(input_dir, file_name)))
 
-        target_encoder = load_object(file_path= Model_resolver.get_latest_target_encoder_path())
 
-        cat_prediction = target_encoder.inverse_transform(prediction)
-        df["prediction"] = prediction
-        df["cat_pred"] = cat_prediction
+def get_pending_files(input_file_paths:List[str], manifest_file_path:str, model_version:int)->Tuple[List[str], List[str], Dict[str, str]]:
+    """
+    Splits input files into the ones still to score with model_version and the ones the manifest already has,
+    returns the pending files, the skipped files and the content hash of every pending file
+    """
+    manifest = PredictionManifest(manifest_file_path=manifest_file_path)
+    pending_file_paths, skipped_files, file_hashes = [], [], dict()
+    for input_file_path in input_file_paths:
+        file_hash = get_file_hash(file_path=input_file_path)
+        if file_hash in file_hashes.values() or manifest.is_processed(file_hash=file_hash, model_version=model_version):
+            skipped_files.append(input_file_path)
+        else:
+            pending_file_paths.append(input_file_path)
+            file_hashes[input_file_path] = file_hash
+    logging.info("Skipping %s file(s) already scored with model version: %s", len(skipped_files), model_version)
+    return pending_file_paths, skipped_files, file_hashes
 
-        prediction_file_name = os.path.basename(input_file_path.replace(".csv",f"{datetime.now().strftime('%m%d%Y__%H%M%S')}.csv"))
 
-        prediction_file_path = os.path.join(PREDICTION_DIR, prediction_file_name)
-        df.to_csv(prediction_file_path, index=False, header = True)
-        return prediction_file_path
+def record_processed_files(manifest_file_path:str, files:List[dict], file_hashes:Dict[str, str]):
+    manifest = PredictionManifest(manifest_file_path=manifest_file_path)
+    for file_stats in files:
+        manifest.record(file_hash=file_hashes[file_stats["input_file_path"]], model_version=file_stats["model_version"],
+                        file_stats=file_stats)
+    manifest.save()
+
+
+def score_files(input_file_paths:List[str], bundle_paths:ModelBundlePaths,
+                batch_prediction_config:BatchPredictionConfig)->Tuple[List[dict], List[dict]]:
+    """
+    Scores input files across a process pool whose workers load the bundle once in their initializer,
+    returns the stats of the scored files and the failed files
+    """
+    files, failed_files = [], []
+    if not input_file_paths:
+        return files, failed_files
+    max_threads = batch_prediction_config.max_threads or os.cpu_count() or 1
+    max_workers = min(batch_prediction_config.max_workers or max_threads, len(input_file_paths))
+    # the cores are shared between the workers instead of every model call using all of them
+    nthread = max(1, max_threads//max_workers)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(bundle_paths, nthread)) as executor:
+        futures = {executor.submit(_predict_file_in_worker, input_file_path, batch_prediction_config): input_file_path
+                   for input_file_path in input_file_paths}
+        for future in as_completed(futures):
+            try:
+                file_stats = future.result()
+                logging.info("Scored file: %s", file_stats)
+                files.append(file_stats)
+            except Exception as e:
+                logging.info("Failed to score file: %s error: %s", futures[future], e)
+                failed_files.append({"input_file_path": futures[future], "error": str(e)})
+    return sorted(files, key=lambda file_stats: file_stats["input_file_path"]), failed_files
+
+
+def make_batch_summary(model_version:int, files:List[dict], failed_files:List[dict], skipped_files:List[str],
+                       seconds:float)->dict:
+    # files that failed input validation were moved to the quarantine directory instead of being scored
+    quarantined_files = [file_stats for file_stats in files if file_stats.get("quarantined")]
+    files = [file_stats for file_stats in files if not file_stats.get("quarantined")]
+    total_rows = sum(file_stats["rows"] for file_stats in files)
+    unique_rows = sum(file_stats.get("unique_rows", file_stats["rows"]) for file_stats in files)
+    cache_hits = sum(file_stats.get("cache_hits", 0) for file_stats in files)
+    return {"model_version": model_version,
+            "files": files,
+            "failed_files": failed_files,
+            "quarantined_files": quarantined_files,
+            "skipped_files": skipped_files,
+            "total_rows": total_rows,
+            # share of rows whose feature vector repeats within a chunk, and share of rows served by the prediction cache
+            "duplicate_row_rate": round(1 - unique_rows/total_rows, 4) if total_rows else None,
+            "cache_hit_rate": round(cache_hits/total_rows, 4) if total_rows else None,
+            "seconds": round(seconds, 4),
+            "rows_per_second": round(total_rows/seconds, 2) if seconds > 0 else None}
+
+
+def write_batch_summary(summary:dict, batch_prediction_config:BatchPredictionConfig, summary_file_name:str=None)->str:
+    summary_file_path = os.path.join(batch_prediction_config.prediction_dir,
+                                     summary_file_name or batch_prediction_config.summary_file_name)
+    write_yaml_file(file_path=summary_file_path, data=summary)
+    logging.info("Batch prediction summary written to %s", summary_file_path)
+    if summary["failed_files"]:
+        raise Exception(f"{len(summary['failed_files'])} file(s) failed to score, see {summary_file_path}")
+    return summary_file_path
+
+
+def start_parallel_batch_prediction(input_dir:str, batch_prediction_config:BatchPredictionConfig=None,
+                                    model_registry:str="saved_models")->str:
+    """
+    Scores every file of input_dir across a process pool.
+    The latest model bundle is resolved once, every worker loads it once in its initializer
+    and a summary with rows and throughput per file is written to the prediction directory.
+    With a manifest_file_path in the config, files already scored by the current model version are skipped.
+    Returns the summary file path.
+    """
+    try:
+        if batch_prediction_config is None:
+            batch_prediction_config = BatchPredictionConfig(prediction_dir=PREDICTION_DIR)
+        os.makedirs(batch_prediction_config.prediction_dir, exist_ok=True)
+        start_time = time.perf_counter()
+
+        bundle_paths = ModelResolver(model_registry=model_registry).get_latest_bundle_paths()
+        logging.info("Scoring files of %s with model version: %s", input_dir, bundle_paths.version)
+        input_file_paths = list_input_files(input_dir=input_dir)
+
+        skipped_files, file_hashes = [], dict()
+        if batch_prediction_config.manifest_file_path:
+            input_file_paths, skipped_files, file_hashes = get_pending_files(input_file_paths=input_file_paths,
+                manifest_file_path=batch_prediction_config.manifest_file_path, model_version=bundle_paths.version)
+
+        files, failed_files = score_files(input_file_paths=input_file_paths, bundle_paths=bundle_paths,
+                                          batch_prediction_config=batch_prediction_config)
+        if batch_prediction_config.manifest_file_path:
+            record_processed_files(manifest_file_path=batch_prediction_config.manifest_file_path, files=files,
+                                   file_hashes=file_hashes)
+
+        summary = make_batch_summary(model_version=bundle_paths.version, files=files, failed_files=failed_files,
+                                     skipped_files=skipped_files, seconds=time.perf_counter() - start_time)
+        return write_batch_summary(summary=summary, batch_prediction_config=batch_prediction_config)
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def shard_files_by_size(input_file_paths:List[str], n_shards:int)->List[List[str]]:
+    """
+    Greedy size balancing: the largest remaining file always goes to the lightest shard, empty shards are dropped
+    """
+    shards = [[] for _ in range(max(1, n_shards))]
+    shard_bytes = [0]*len(shards)
+    for input_file_path in sorted(input_file_paths, key=os.path.getsize, reverse=True):
+        lightest = shard_bytes.index(min(shard_bytes))
+        shards[lightest].append(input_file_path)
+        shard_bytes[lightest] += os.path.getsize(input_file_path)
+    return [sorted(shard) for shard in shards if shard]
+
+
+def plan_batch_prediction_shards(input_dir:str, n_shards:int, batch_prediction_config:BatchPredictionConfig=None,
+                                 model_registry:str="saved_models")->dict:
+    """
+    Pins the model version of the run, drops files the manifest already has and splits the rest into
+    size balanced shards. The returned plan is json serialisable, so it can travel between Airflow tasks.
+    """
+    try:
+        if batch_prediction_config is None:
+            batch_prediction_config = BatchPredictionConfig(prediction_dir=PREDICTION_DIR)
+        model_version = ModelResolver(model_registry=model_registry).get_latest_bundle_paths().version
+        input_file_paths = list_input_files(input_dir=input_dir)
+        skipped_files, file_hashes = [], dict()
+        if batch_prediction_config.manifest_file_path:
+            input_file_paths, skipped_files, file_hashes = get_pending_files(input_file_paths=input_file_paths,
+                manifest_file_path=batch_prediction_config.manifest_file_path, model_version=model_version)
+        shards = shard_files_by_size(input_file_paths=input_file_paths, n_shards=n_shards)
+        plan = {"model_version": model_version,
+                "shards": [{"shard_index": shard_index, "input_file_paths": shard,
+                            "bytes": sum(os.path.getsize(input_file_path) for input_file_path in shard)}
+                           for shard_index, shard in enumerate(shards)],
+                "skipped_files": skipped_files,
+                "file_hashes": file_hashes,
+                "started_at": time.time()}
+        logging.info("Planned %s shard(s) of %s file(s) with model version: %s", len(shards), len(input_file_paths), model_version)
+        return plan
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def predict_shard(input_file_paths:List[str], model_version:int, shard_index:int,
+                  batch_prediction_config:BatchPredictionConfig=None, model_registry:str="saved_models")->dict:
+    """
+    Scores one shard of a plan with the pinned model version and returns its summary.
+    Files that fail to score are listed in its failed_files instead of failing the shard,
+    so the files scored next to them are still gathered.
+    """
+    try:
+        if batch_prediction_config is None:
+            batch_prediction_config = BatchPredictionConfig(prediction_dir=PREDICTION_DIR)
+        os.makedirs(batch_prediction_config.prediction_dir, exist_ok=True)
+        start_time = time.perf_counter()
+        bundle_paths = ModelResolver(model_registry=model_registry).get_bundle_paths(version=model_version)
+        files, failed_files = score_files(input_file_paths=input_file_paths, bundle_paths=bundle_paths,
+                                          batch_prediction_config=batch_prediction_config)
+        summary = make_batch_summary(model_version=model_version, files=files, failed_files=failed_files,
+                                     skipped_files=[], seconds=time.perf_counter() - start_time)
+        summary["shard_index"] = shard_index
+        if failed_files:
+            logging.info("Shard %s: %s file(s) failed to score", shard_index, len(failed_files))
+        return summary
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def gather_shard_summaries(plan:dict, shard_summaries:List[dict],
+                           batch_prediction_config:BatchPredictionConfig=None)->str:
+    """
+    Merges the shard summaries of a plan into one run summary and records the scored files in the manifest.
+    The files of a planned shard without a summary count as failed. The summary is written and the scored files
+    recorded before an exception is raised for the failed files.
+    """
+    try:
+        if batch_prediction_config is None:
+            batch_prediction_config = BatchPredictionConfig(prediction_dir=PREDICTION_DIR)
+        shard_summaries = sorted((shard_summary for shard_summary in shard_summaries if shard_summary is not None),
+                                 key=lambda shard_summary: shard_summary["shard_index"])
+        reported_shards = {shard_summary["shard_index"] for shard_summary in shard_summaries}
+        files = sorted((file_stats for shard_summary in shard_summaries
+                        for file_stats in shard_summary["files"] + shard_summary.get("quarantined_files", [])),
+                       key=lambda file_stats: file_stats["input_file_path"])
+        failed_files = [failed for shard_summary in shard_summaries for failed in shard_summary["failed_files"]]
+        # a shard whose task failed as a whole has no summary
+        failed_files += [{"input_file_path": input_file_path, "error": f"shard {shard['shard_index']} did not report"}
+                         for shard in plan["shards"] if shard["shard_index"] not in reported_shards
+                         for input_file_path in shard["input_file_paths"]]
+        if batch_prediction_config.manifest_file_path:
+            record_processed_files(manifest_file_path=batch_prediction_config.manifest_file_path, files=files,
+                                   file_hashes=plan["file_hashes"])
+        summary = make_batch_summary(model_version=plan["model_version"], files=files, failed_files=failed_files,
+                                     skipped_files=plan["skipped_files"], seconds=time.time() - plan["started_at"])
+        summary["shards"] = [{"shard_index": shard_summary["shard_index"], "files": len(shard_summary["files"]),
+                              "rows": shard_summary["total_rows"], "seconds": shard_summary["seconds"],
+                              "rows_per_second": shard_summary["rows_per_second"]} for shard_summary in shard_summaries]
+        return write_batch_summary(summary=summary, batch_prediction_config=batch_prediction_config)
     except Exception as e:
-        raise SensorException(e, sys)
\ No newline at end of file
+        raise SensorException(e, sys)
@@ -0,0 +1,187 @@
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.entity.config_entity import BatchPredictionConfig
+from sensor.utils import write_yaml_file
+from datetime import datetime
+from typing import List, Optional
+import pandas as pd
+import numpy as np
+import os, sys
+import shutil
+
+# missing value sentinel of the sensor data, counted as null and not as unparseable
+NA_VALUE = "na"
+# malformed csv files are quarantined as well instead of failing later
+INPUT_READ_ERRORS = (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError)
+
+
+class InputValidator:
+    """
+    Checks batch prediction inputs against the features the transformer was fitted on and the training feature
+    statistics. Counts are accumulated column-wise over any number of chunks, report() then applies the thresholds.
+    Without feature_stats only column presence and parseability are checked.
+    """
+
+    def __init__(self, feature_names:List[str], feature_stats:Optional[dict]=None,
+                 batch_prediction_config:BatchPredictionConfig=None):
+        self.feature_names = list(feature_names)
+        self.batch_prediction_config = batch_prediction_config or BatchPredictionConfig()
+        n_features = len(self.feature_names)
+        training = (feature_stats or dict()).get("features", dict())
+        stats = [training.get(feature_name) or dict() for feature_name in self.feature_names]
+        self.train_null_ratio = np.array([np.nan if s.get("null_ratio") is None else s["null_ratio"] for s in stats])
+        minimum = np.array([np.nan if s.get("min") is None else s["min"] for s in stats], dtype=np.float64)
+        maximum = np.array([np.nan if s.get("max") is None else s["max"] for s in stats], dtype=np.float64)
+        margin = self.batch_prediction_config.range_margin*(maximum - minimum)
+        # nan bounds never compare true, so features without statistics are not range checked
+        self.lower, self.upper = minimum - margin, maximum + margin
+        self.rows = 0
+        self.missing_columns = None
+        self.null_counts = np.zeros(n_features, dtype=np.int64)
+        self.unparseable_counts = np.zeros(n_features, dtype=np.int64)
+        self.out_of_range_counts = np.zeros(n_features, dtype=np.int64)
+        self.unreadable = None
+
+    def update(self, df:pd.DataFrame):
+        if self.missing_columns is None:
+            self.missing_columns = [feature_name for feature_name in self.feature_names if feature_name not in df.columns]
+        present = np.array([feature_name in df.columns for feature_name in self.feature_names])
+        columns = [feature_name for feature_name in self.feature_names if feature_name in df.columns]
+        values = np.empty((len(df), len(columns)), dtype=np.float64)
+        null = np.empty((len(df), len(columns)), dtype=bool)
+        unparseable = np.zeros(len(columns), dtype=np.int64)
+        for index, column in enumerate(columns):
+            series = df[column]
+            if series.dtype.kind in "biuf":
+                values[:, index] = series.to_numpy(dtype=np.float64)
+                null[:, index] = np.isnan(values[:, index])
+                continue
+            # object columns hold "na" or text that failed to parse, only those need a coercion
+            numeric = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64)
+            null[:, index] = (series.isna() | (series == NA_VALUE)).to_numpy()
+            unparseable[index] = int((np.isnan(numeric) & ~null[:, index]).sum())
+            values[:, index] = numeric
+        with np.errstate(invalid="ignore"):
+            out_of_range = (values < self.lower[present]) | (values > self.upper[present])
+        self.rows += len(df)
+        self.null_counts[present] += null.sum(axis=0)
+        self.unparseable_counts[present] += unparseable
+        self.out_of_range_counts[present] += out_of_range.sum(axis=0)
+
+    def report(self)->dict:
+        config = self.batch_prediction_config
+        issues = []
+        if self.unreadable is not None:
+            issues.append(f"unreadable file: {self.unreadable}")
+        missing_columns = self.missing_columns or []
+        if missing_columns:
+            issues.append(f"{len(missing_columns)} feature column(s) missing")
+        rows = max(self.rows, 1)
+        unparseable_ratio = self.unparseable_counts/rows
+        null_ratio = self.null_counts/rows
+        out_of_range_ratio = self.out_of_range_counts/rows
+        with np.errstate(invalid="ignore"):
+            null_ratio_failed = null_ratio - self.train_null_ratio > config.max_null_ratio_increase
+        unparseable = {self.feature_names[index]: round(float(unparseable_ratio[index]), 6)
+                       for index in np.flatnonzero(unparseable_ratio > config.max_unparseable_ratio)}
+        null_ratio_increase = {self.feature_names[index]: {"null_ratio": round(float(null_ratio[index]), 6),
+                                                           "train_null_ratio": round(float(self.train_null_ratio[index]), 6)}
+                               for index in np.flatnonzero(null_ratio_failed)
+                               if self.feature_names[index] not in missing_columns}
+        out_of_range = {self.feature_names[index]: round(float(out_of_range_ratio[index]), 6)
+                        for index in np.flatnonzero(out_of_range_ratio > config.max_out_of_range_ratio)}
+        if unparseable:
+            issues.append(f"{len(unparseable)} feature(s) with unparseable values")
+        if null_ratio_increase:
+            issues.append(f"{len(null_ratio_increase)} feature(s) with a null ratio above training")
+        if out_of_range:
+            issues.append(f"{len(out_of_range)} feature(s) outside the training range")
+        return {"passed": not issues,
+                "rows_checked": int(self.rows),
+                "issues": issues,
+                "missing_columns": missing_columns,
+                "unparseable": unparseable,
+                "null_ratio_increase": null_ratio_increase,
+                "out_of_range": out_of_range}
+
+
+def coerce_feature_columns(df:pd.DataFrame, feature_names:List[str])->pd.DataFrame:
+    """
+    Converts the feature columns that are not numeric yet, values tolerated by the validation but not
+    parseable as numbers become nan instead of failing the transformer
+    """
+    for column in feature_names:
+        if column in df.columns and df[column].dtype.kind not in "biuf":
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+    return df
+
+
+def validate_input_frame(input_file_path:str, df:Optional[pd.DataFrame], feature_names:List[str],
+                         feature_stats:Optional[dict]=None, batch_prediction_config:BatchPredictionConfig=None,
+                         read_error:Exception=None)->dict:
+    """
+    Validates a file already read in full into df, or that failed to parse with read_error
+    """
+    try:
+        validator = InputValidator(feature_names=feature_names, feature_stats=feature_stats,
+                                   batch_prediction_config=batch_prediction_config)
+        if read_error is not None:
+            validator.unreadable = str(read_error)
+        else:
+            validator.update(df)
+        report = validator.report()
+        report["input_file_path"] = input_file_path
+        logging.info("Validation of %s: %s", input_file_path, report["issues"] or "passed")
+        return report
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def validate_input_file(input_file_path:str, feature_names:List[str], feature_stats:Optional[dict]=None,
+                        batch_prediction_config:BatchPredictionConfig=None)->dict:
+    """
+    Validates the feature columns of the first chunk_size rows of input_file_path, or of every row when
+    input_validation is "full" or the file is not streamed. Only the feature columns are read.
+    """
+    try:
+        batch_prediction_config = batch_prediction_config or BatchPredictionConfig()
+        validator = InputValidator(feature_names=feature_names, feature_stats=feature_stats,
+                                   batch_prediction_config=batch_prediction_config)
+        chunk_size = batch_prediction_config.chunk_size
+        feature_set = set(feature_names)
+        read_kwargs = {"usecols": lambda column: column in feature_set, "na_values": [NA_VALUE]}
+        try:
+            if not chunk_size:
+                validator.update(pd.read_csv(input_file_path, **read_kwargs))
+            elif batch_prediction_config.input_validation == "full":
+                for chunk in pd.read_csv(input_file_path, chunksize=chunk_size, **read_kwargs):
+                    validator.update(chunk)
+            else:
+                validator.update(pd.read_csv(input_file_path, nrows=chunk_size, **read_kwargs))
+        except INPUT_READ_ERRORS as e:
+            validator.unreadable = str(e)
+        report = validator.report()
+        report["input_file_path"] = input_file_path
+        logging.info("Validation of %s: %s", input_file_path, report["issues"] or "passed")
+        return report
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def quarantine_file(input_file_path:str, report:dict, quarantine_dir:str)->str:
+    """
+    Copies a file that failed validation to quarantine_dir and writes its validation report next to it,
+    returns the quarantined file path. The input file itself is left in place.
+    """
+    try:
+        os.makedirs(quarantine_dir, exist_ok=True)
+        quarantine_file_path = os.path.join(quarantine_dir, os.path.basename(input_file_path))
+        if os.path.exists(quarantine_file_path):
+            stem, extension = os.path.splitext(quarantine_file_path)
+            quarantine_file_path = f"{stem}{datetime.now().strftime('%m%d%Y__%H%M%S')}{extension}"
+        shutil.copyfile(input_file_path, quarantine_file_path)
+        write_yaml_file(file_path=f"{quarantine_file_path}.validation.yaml", data=report)
+        logging.info("Quarantined %s to %s: %s", input_file_path, quarantine_file_path, report['issues'])
+        return quarantine_file_path
+    except Exception as e:
+        raise SensorException(e, sys)
@@ -0,0 +1,225 @@
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.predictor import ModelResolver, ModelBundle, ModelBundlePaths, load_model_bundle, transform_array
+from sensor.entity.config_entity import BatchPredictionConfig
+from sensor.utils import get_file_hash
+from sensor.pipeline.batch_prediction import (PREDICTION_DIR, get_prediction_file_path, list_input_files,
+                                              read_input_chunks, read_input_file, make_batch_summary,
+                                              write_batch_summary)
+from sensor.pipeline.prediction_writer import get_prediction_writer, select_output_columns
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import OrderedDict
+from datetime import datetime
+from itertools import combinations
+from typing import List
+import pandas as pd
+import numpy as np
+import os, sys
+import time
+
+AGREEMENT_COLUMN = "agreement"
+
+
+def get_prediction_columns(model_versions:List[int])->List[str]:
+    return [column for version in model_versions for column in (f"prediction_v{version}", f"cat_pred_v{version}")] \
+        + [AGREEMENT_COLUMN]
+
+
+def _add_counts(total:dict, counts:dict):
+    # sums nested count dictionaries in place
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            _add_counts(total.setdefault(key, dict()), value)
+        else:
+            total[key] = total.get(key, 0) + value
+
+
+class MultiModelScorer:
+    """
+    Scores frames with several model bundles at once. Bundles sharing a transformer (same file hash) are grouped,
+    so every distinct transformer runs once per frame and every model predicts from the array of its transformer.
+    Label counts and pairwise agreement between the models are accumulated in counts until reset_counts.
+    """
+
+    def __init__(self, bundles:List[ModelBundle], transformer_hashes:List[str]):
+        self.bundles = bundles
+        self.model_versions = [bundle.version for bundle in bundles]
+        self.groups = OrderedDict()
+        for bundle, transformer_hash in zip(bundles, transformer_hashes):
+            self.groups.setdefault(transformer_hash, []).append(bundle)
+        self.feature_names = list(dict.fromkeys(feature_name for bundle in bundles
+                                                for feature_name in bundle.transformer.feature_names_in_))
+        self.counts = dict()
+
+    def reset_counts(self):
+        self.counts = dict()
+
+    def score(self, df:pd.DataFrame)->pd.DataFrame:
+        labels = dict()
+        for bundles in self.groups.values():
+            transformer = bundles[0].transformer
+            input_arr = transform_array(transformer=transformer,
+                                        input_arr=df[list(transformer.feature_names_in_)].to_numpy(dtype=np.float64))
+            for bundle in bundles:
+                prediction = bundle.model.predict(input_arr)
+                labels[bundle.version] = bundle.target_encoder.inverse_transform(prediction)
+                df[f"prediction_v{bundle.version}"] = prediction
+                df[f"cat_pred_v{bundle.version}"] = labels[bundle.version]
+        reference = labels[self.model_versions[0]]
+        df[AGREEMENT_COLUMN] = np.logical_and.reduce([labels[version] == reference for version in self.model_versions])
+        _add_counts(self.counts, self._count(labels=labels, agreement=df[AGREEMENT_COLUMN].to_numpy()))
+        return df
+
+    def _count(self, labels:dict, agreement:np.ndarray)->dict:
+        counts = {"rows": len(agreement), "all_agree": int(agreement.sum()), "label_counts": dict(), "pairs": dict()}
+        for version in self.model_versions:
+            values, value_counts = np.unique(labels[version].astype(str), return_counts=True)
+            counts["label_counts"][f"v{version}"] = dict(zip(values.tolist(), value_counts.tolist()))
+        for version_a, version_b in combinations(self.model_versions, 2):
+            differ = labels[version_a] != labels[version_b]
+            pairs = pd.Series(labels[version_a][differ].astype(str)) + "/" + pd.Series(labels[version_b][differ].astype(str))
+            counts["pairs"][f"v{version_a}_vs_v{version_b}"] = {"agree": int((~differ).sum()),
+                                                                 "disagreements": pairs.value_counts().to_dict()}
+        return counts
+
+
+def make_agreement_summary(counts:dict)->dict:
+    """
+    Agreement rates from the counts of MultiModelScorer, disagreements are keyed <label of a>/<label of b>
+    """
+    rows = counts.get("rows", 0)
+    return {"rows": rows,
+            "all_agree_rate": round(counts["all_agree"]/rows, 6) if rows else None,
+            "label_counts": counts.get("label_counts", dict()),
+            "pairs": {pair: {"agreement_rate": round(pair_counts["agree"]/rows, 6) if rows else None,
+                             "disagreements": pair_counts["disagreements"]}
+                      for pair, pair_counts in counts.get("pairs", dict()).items()}}
+
+
+def predict_file_multi_model(input_file_path:str, scorer:MultiModelScorer,
+                             batch_prediction_config:BatchPredictionConfig)->dict:
+    """
+    Reads and decodes input_file_path once, chunk by chunk when chunk_size is set, scores every chunk with all
+    the models of scorer and writes their predictions side by side. Input validation uses the first bundle.
+    scorer.counts only hold the counts of this file afterwards.
+    """
+    start_time = time.perf_counter()
+    scorer.reset_counts()
+    os.makedirs(batch_prediction_config.prediction_dir, exist_ok=True)
+    prediction_file_path = get_prediction_file_path(input_file_path=input_file_path,
+                                                    batch_prediction_config=batch_prediction_config)
+    df, quarantined_file_stats = read_input_file(input_file_path=input_file_path, feature_names=scorer.feature_names,
+                                                 bundle=scorer.bundles[0], batch_prediction_config=batch_prediction_config,
+                                                 start_time=start_time)
+    if quarantined_file_stats is not None:
+        return quarantined_file_stats
+    if batch_prediction_config.chunk_size:
+        chunks = read_input_chunks(input_file_path=input_file_path, feature_names=scorer.feature_names,
+                                   chunk_size=batch_prediction_config.chunk_size,
+                                   batch_prediction_config=batch_prediction_config)
+    else:
+        chunks = [df]
+
+    prediction_columns = get_prediction_columns(model_versions=scorer.model_versions)
+    try:
+        with get_prediction_writer(file_path=prediction_file_path, output_format=batch_prediction_config.output_format,
+                                   compression=batch_prediction_config.compression) as writer:
+            for chunk in chunks:
+                row_offset = writer.n_rows
+                chunk = scorer.score(chunk)
+                writer.write(select_output_columns(df=chunk, passthrough_columns=batch_prediction_config.passthrough_columns,
+                                                   row_id_column=batch_prediction_config.row_id_column,
+                                                   row_offset=row_offset, prediction_columns=prediction_columns))
+            n_rows = writer.n_rows
+    except Exception as e:
+        # do not leave a half written prediction file behind
+        if os.path.exists(prediction_file_path):
+            os.remove(prediction_file_path)
+        raise e
+
+    seconds = time.perf_counter() - start_time
+    return {"input_file_path": input_file_path,
+            "prediction_file_path": prediction_file_path,
+            "model_versions": scorer.model_versions,
+            "rows": int(n_rows),
+            "all_agree_rate": round(scorer.counts["all_agree"]/n_rows, 6) if n_rows else None,
+            "bytes_written": os.path.getsize(prediction_file_path),
+            "seconds": round(seconds, 4),
+            "rows_per_second": round(n_rows/seconds, 2) if seconds > 0 else None}
+
+
+# scorer of a worker process, built once by _init_multi_model_worker
+_worker_scorer:MultiModelScorer = None
+
+
+def _init_multi_model_worker(bundle_paths:List[ModelBundlePaths], transformer_hashes:List[str], nthread:int=None):
+    global _worker_scorer
+    _worker_scorer = MultiModelScorer(bundles=[load_model_bundle(bundle_paths=paths, nthread=nthread)
+                                               for paths in bundle_paths], transformer_hashes=transformer_hashes)
+
+
+def _predict_file_in_multi_model_worker(input_file_path:str, batch_prediction_config:BatchPredictionConfig):
+    file_stats = predict_file_multi_model(input_file_path=input_file_path, scorer=_worker_scorer,
+                                          batch_prediction_config=batch_prediction_config)
+    return file_stats, _worker_scorer.counts
+
+
+def start_multi_model_batch_prediction(input_dir:str, model_versions:List[int],
+                                       batch_prediction_config:BatchPredictionConfig=None,
+                                       model_registry:str="saved_models")->str:
+    """
+    Scores every file of input_dir with several registry versions in one pass, e.g. the champion and a challenger.
+    Every file is read once, every distinct transformer runs once per chunk and the predictions of all the
+    versions are written side by side with an agreement column. The first version is the reference for input
+    validation. The summary adds label counts and pairwise agreement of the versions over all the files.
+    Row deduplication, the prediction cache and attributions are not used in this mode.
+    Returns the summary file path.
+    """
+    try:
+        if batch_prediction_config is None:
+            batch_prediction_config = BatchPredictionConfig(prediction_dir=PREDICTION_DIR)
+        if len(model_versions) < 2:
+            raise Exception(f"At least two model versions are needed, got {model_versions}")
+        os.makedirs(batch_prediction_config.prediction_dir, exist_ok=True)
+        start_time = time.perf_counter()
+        model_resolver = ModelResolver(model_registry=model_registry)
+        bundle_paths = [model_resolver.get_bundle_paths(version=version) for version in model_versions]
+        transformer_hashes = [get_file_hash(file_path=paths.transformer_path) for paths in bundle_paths]
+        transformer_groups = OrderedDict()
+        for version, transformer_hash in zip(model_versions, transformer_hashes):
+            transformer_groups.setdefault(transformer_hash, []).append(version)
+        logging.info("Scoring files of %s with model versions: %s, transformer groups: %s",
+                     input_dir, model_versions, list(transformer_groups.values()))
+
+        input_file_paths = list_input_files(input_dir=input_dir)
+        files, failed_files, counts = [], [], dict()
+        if input_file_paths:
+            max_threads = batch_prediction_config.max_threads or os.cpu_count() or 1
+            max_workers = min(batch_prediction_config.max_workers or max_threads, len(input_file_paths))
+            nthread = max(1, max_threads//max_workers)
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_multi_model_worker,
+                                     initargs=(bundle_paths, transformer_hashes, nthread)) as executor:
+                futures = {executor.submit(_predict_file_in_multi_model_worker, input_file_path,
+                                           batch_prediction_config): input_file_path
+                           for input_file_path in input_file_paths}
+                for future in as_completed(futures):
+                    try:
+                        file_stats, file_counts = future.result()
+                        logging.info("Scored file: %s", file_stats)
+                        files.append(file_stats)
+                        _add_counts(counts, file_counts)
+                    except Exception as e:
+                        logging.info("Failed to score file: %s error: %s", futures[future], e)
+                        failed_files.append({"input_file_path": futures[future], "error": str(e)})
+
+        # every version scores the same rows, so one batch summary covers them all; model_version is the reference
+        summary = make_batch_summary(model_version=model_versions[0],
+                                     files=sorted(files, key=lambda file_stats: file_stats["input_file_path"]),
+                                     failed_files=failed_files, skipped_files=[], seconds=time.perf_counter()-start_time)
+        summary["model_versions"] = list(model_versions)
+        summary["transformer_groups"] = list(transformer_groups.values())
+        summary["agreement"] = make_agreement_summary(counts=counts)
+        return write_batch_summary(summary=summary, batch_prediction_config=batch_prediction_config,
+            summary_file_name=f"multi_model_summary_{datetime.now().strftime('%m%d%Y__%H%M%S')}.yaml")
+    except Exception as e:
+        raise SensorException(e, sys)
@@ -0,0 +1,178 @@
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.predictor import predict_dataframe
+from typing import Dict, Optional, Tuple
+import pandas as pd
+import numpy as np
+import os, sys
+import sqlite3
+import threading
+
+# two independent 64 bit hashes per row, so collisions stay negligible across millions of cached rows
+ROW_HASH_DTYPE = np.dtype([("high", "<u8"), ("low", "<u8")])
+# pandas hash keys are 16 characters
+_HASH_KEYS = ("sensor-rowhash-1", "sensor-rowhash-2")
+
+
+def hash_rows(feature_matrix:np.ndarray)->np.ndarray:
+    """
+    Hashes every row of the float feature matrix, rows with the same feature values get the same hash
+    """
+    try:
+        # +0.0 folds -0.0 into 0.0, every missing value is already nan
+        features = pd.DataFrame(feature_matrix + 0.0)
+        row_hashes = np.empty(len(feature_matrix), dtype=ROW_HASH_DTYPE)
+        row_hashes["high"] = pd.util.hash_pandas_object(features, index=False, hash_key=_HASH_KEYS[0]).to_numpy()
+        row_hashes["low"] = pd.util.hash_pandas_object(features, index=False, hash_key=_HASH_KEYS[1]).to_numpy()
+        return row_hashes
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def _to_signed(values:np.ndarray)->np.ndarray:
+    # sqlite integers are signed 64 bit
+    return values.view(np.int64)
+
+
+class PredictionCache:
+    """
+    Persistent predictions keyed by (row hash, model content hash) in a sqlite file, so a re-trained bundle that
+    reuses a registry version number never serves the predictions of the previous one.
+    The entries of one model are loaded once as a sorted array and looked up vectorized,
+    new entries are buffered and written by flush.
+    """
+
+    def __init__(self, cache_file_path:str, model_hash:str):
+        try:
+            self.cache_file_path = cache_file_path
+            self.model_hash = model_hash
+            os.makedirs(os.path.dirname(cache_file_path) or ".", exist_ok=True)
+            with self._connect() as connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS model_predictions (model_hash TEXT, high INTEGER, "
+                                   "low INTEGER, prediction INTEGER, PRIMARY KEY (model_hash, high, low)) WITHOUT ROWID")
+                rows = connection.execute("SELECT high, low, prediction FROM model_predictions WHERE model_hash = ?",
+                                          (self.model_hash,)).fetchall()
+            keys = np.empty(len(rows), dtype=ROW_HASH_DTYPE)
+            predictions = np.empty(len(rows), dtype=np.int64)
+            if rows:
+                values = np.array(rows, dtype=np.int64)
+                keys["high"], keys["low"] = values[:, 0].view(np.uint64), values[:, 1].view(np.uint64)
+                predictions = values[:, 2]
+            order = np.argsort(keys)
+            self._keys, self._predictions = keys[order], predictions[order]
+            self._pending_keys, self._pending_predictions = [], []
+            self._lock = threading.Lock()
+            self.hits = 0
+            self.lookups = 0
+            logging.info("Prediction cache of model %s has %s entries", self.model_hash, len(self._keys))
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def _connect(self)->sqlite3.Connection:
+        # several batch prediction workers may write at once, sqlite serialises them
+        return sqlite3.connect(self.cache_file_path, timeout=60)
+
+    def lookup(self, row_hashes:np.ndarray)->Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the mask of cached rows and their cached predictions
+        """
+        with self._lock:
+            keys, predictions = self._keys, self._predictions
+        if len(keys) == 0:
+            hit = np.zeros(len(row_hashes), dtype=bool)
+            cached = np.empty(0, dtype=np.int64)
+        else:
+            position = np.minimum(np.searchsorted(keys, row_hashes), len(keys)-1)
+            hit = keys[position] == row_hashes
+            cached = predictions[position[hit]]
+        self.lookups += len(row_hashes)
+        self.hits += int(hit.sum())
+        return hit, cached
+
+    def add(self, row_hashes:np.ndarray, predictions:np.ndarray):
+        with self._lock:
+            self._pending_keys.append(row_hashes.copy())
+            self._pending_predictions.append(np.asarray(predictions, dtype=np.int64))
+
+    def flush(self):
+        """
+        Writes the buffered entries and makes them visible to the next lookups
+        """
+        try:
+            with self._lock:
+                if not self._pending_keys:
+                    return
+                keys = np.concatenate([self._keys, *self._pending_keys])
+                predictions = np.concatenate([self._predictions, *self._pending_predictions])
+                new_keys, new_predictions = np.concatenate(self._pending_keys), np.concatenate(self._pending_predictions)
+                self._pending_keys, self._pending_predictions = [], []
+                keys, index = np.unique(keys, return_index=True)
+                self._keys, self._predictions = keys, predictions[index]
+            with self._connect() as connection:
+                connection.executemany("INSERT OR IGNORE INTO model_predictions VALUES (?, ?, ?, ?)",
+                                       zip([self.model_hash]*len(new_keys), _to_signed(new_keys["high"]).tolist(),
+                                           _to_signed(new_keys["low"]).tolist(), new_predictions.tolist()))
+        except Exception as e:
+            raise SensorException(e, sys)
+
+
+# caches already loaded by this process, keyed by file path and model content hash
+_prediction_caches:Dict[tuple, PredictionCache] = dict()
+
+
+def get_prediction_cache(cache_file_path:str, model_hash:str)->PredictionCache:
+    key = (os.path.abspath(cache_file_path), model_hash, os.getpid())
+    if key not in _prediction_caches:
+        _prediction_caches[key] = PredictionCache(cache_file_path=cache_file_path, model_hash=model_hash)
+    return _prediction_caches[key]
+
+
+def predict_unique_rows(df:pd.DataFrame, transformer, model, target_encoder, cache:Optional[PredictionCache]=None,
+                        **predict_kwargs)->Tuple[pd.DataFrame, dict]:
+    """
+    Same output as predict_dataframe, but every distinct feature vector of df is transformed and predicted once
+    and rows found in cache are not scored at all. Returns the scored frame with the number of distinct rows
+    and cache hits.
+    """
+    try:
+        feature_names = list(transformer.feature_names_in_)
+        # converted once, then used both for hashing and for scoring the distinct rows
+        feature_matrix = df[feature_names].to_numpy(dtype=np.float64)
+        row_hashes = hash_rows(feature_matrix=feature_matrix)
+        unique_hashes, first_index, inverse = np.unique(row_hashes, return_index=True, return_inverse=True)
+        stats = {"rows": len(df), "unique_rows": len(unique_hashes), "cache_hits": 0}
+
+        unique_prediction = np.empty(len(unique_hashes), dtype=np.int64)
+        to_score = np.ones(len(unique_hashes), dtype=bool)
+        if cache is not None:
+            hit, cached = cache.lookup(unique_hashes)
+            unique_prediction[hit] = cached
+            to_score = ~hit
+            # rows of the chunk served by the cache, duplicates included
+            stats["cache_hits"] = int(hit[inverse].sum())
+
+        scored_df = None
+        if to_score.any():
+            scored_df = predict_dataframe(df=pd.DataFrame(feature_matrix[first_index[to_score]], columns=feature_names),
+                                          transformer=transformer, model=model, target_encoder=target_encoder,
+                                          **predict_kwargs)
+            unique_prediction[to_score] = scored_df["prediction"].to_numpy()
+            if cache is not None:
+                cache.add(unique_hashes[to_score], unique_prediction[to_score])
+
+        prediction = unique_prediction[inverse]
+        df["prediction"] = prediction
+        df["cat_pred"] = target_encoder.inverse_transform(prediction)
+        if scored_df is not None:
+            # attribution columns only exist for scored rows, they are scattered back the same way
+            added_columns = [column for column in scored_df.columns
+                             if column not in feature_names and column not in ("prediction", "cat_pred")]
+            if added_columns:
+                position = np.full(len(unique_hashes), -1)
+                position[to_score] = np.arange(to_score.sum())
+                added = scored_df[added_columns].reset_index(drop=True).reindex(position[inverse])
+                added.index = df.index
+                df = pd.concat([df, added], axis=1)
+        return df, stats
+    except Exception as e:
+        raise SensorException(e, sys)
@@ -0,0 +1,50 @@
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.utils import read_yaml_file, write_yaml_file
+from datetime import datetime
+import os, sys
+
+
+class PredictionManifest:
+    """
+    Record of the input files already scored, keyed by content hash and model version.
+    A file is skipped when the same content was scored by the current model version,
+    so renamed or re-synced copies are not scored again and every file is rescored once a new model is published.
+    """
+
+    def __init__(self, manifest_file_path:str):
+        try:
+            self.manifest_file_path = manifest_file_path
+            self.entries = dict()
+            if os.path.exists(manifest_file_path):
+                self.entries = read_yaml_file(file_path=manifest_file_path) or dict()
+            logging.info("Loaded %s entries from prediction manifest: %s", len(self.entries), manifest_file_path)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    @staticmethod
+    def _key(file_hash:str, model_version:int)->str:
+        return f"{file_hash}:{model_version}"
+
+    def is_processed(self, file_hash:str, model_version:int)->bool:
+        return self._key(file_hash, model_version) in self.entries
+
+    def record(self, file_hash:str, model_version:int, file_stats:dict):
+        entry = {"input_file_path": file_stats["input_file_path"],
+                 "prediction_file_path": file_stats.get("prediction_file_path"),
+                 "model_version": model_version,
+                 "rows": file_stats["rows"],
+                 "scored_at": datetime.now().isoformat(timespec="seconds")}
+        # files that failed input validation are recorded too, so the same content is not quarantined again
+        if file_stats.get("quarantined"):
+            entry["quarantine_file_path"] = file_stats["quarantine_file_path"]
+        self.entries[self._key(file_hash, model_version)] = entry
+
+    def save(self):
+        try:
+            # write to a temporary file first so an interrupted run never leaves a truncated manifest
+            tmp_file_path = f"{self.manifest_file_path}.tmp"
+            write_yaml_file(file_path=tmp_file_path, data=self.entries)
+            os.replace(tmp_file_path, self.manifest_file_path)
+        except Exception as e:
+            raise SensorException(e, sys)
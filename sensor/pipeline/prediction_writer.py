@@ -0,0 +1,147 @@
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.predictor import ATTRIBUTION_COLUMN_PREFIX
+from abc import ABC, abstractmethod
+import pandas as pd
+import os, sys
+import gzip, bz2, lzma
+
+PREDICTION_COLUMNS = ["prediction", "cat_pred"]
+OUTPUT_FORMATS = ["csv", "parquet", "feather"]
+# stdlib codecs usable when csv rows are appended chunk by chunk
+CSV_COMPRESSION_OPENERS = {"gzip": (gzip.open, ".gz"), "bz2": (bz2.open, ".bz2"), "xz": (lzma.open, ".xz")}
+FILE_EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+
+def get_prediction_file_extension(output_format:str, compression:str=None)->str:
+    try:
+        if output_format not in OUTPUT_FORMATS:
+            raise Exception(f"Output format: {output_format} is not one of {OUTPUT_FORMATS}")
+        extension = FILE_EXTENSIONS[output_format]
+        if output_format == "csv" and compression is not None:
+            if compression not in CSV_COMPRESSION_OPENERS:
+                raise Exception(f"Csv compression: {compression} is not one of {list(CSV_COMPRESSION_OPENERS)}")
+            extension += CSV_COMPRESSION_OPENERS[compression][1]
+        return extension
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def select_output_columns(df:pd.DataFrame, passthrough_columns:list=None, row_id_column:str="row_id",
+                          row_offset:int=0, prediction_columns:list=None)->pd.DataFrame:
+    """
+    Keeps only what has to be written out of a scored frame
+
+    passthrough_columns: None keeps every input column, otherwise only these input columns are kept
+    row_id_column: kept as row key when present in the input, otherwise generated from the row position
+    row_offset: position of the first row of df in the input file
+    prediction_columns: columns added by scoring, PREDICTION_COLUMNS by default
+    """
+    try:
+        if passthrough_columns is None:
+            return df
+        missing_columns = [column for column in passthrough_columns if column not in df.columns]
+        if len(missing_columns) > 0:
+            raise Exception(f"Passthrough columns not available in input file: {missing_columns}")
+        attribution_columns = [column for column in df.columns if column.startswith(ATTRIBUTION_COLUMN_PREFIX)]
+        output_df = df[[column for column in passthrough_columns if column != row_id_column]
+                       + (prediction_columns or PREDICTION_COLUMNS) + attribution_columns].copy()
+        if row_id_column in df.columns:
+            row_id = df[row_id_column].to_numpy()
+        else:
+            row_id = range(row_offset, row_offset + len(df))
+        output_df.insert(0, row_id_column, row_id)
+        return output_df
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+class PredictionWriter(ABC):
+    """
+    Writes scored frames to one prediction file, either in a single call or chunk by chunk
+    """
+
+    def __init__(self, file_path:str, compression:str=None):
+        self.file_path = file_path
+        self.compression = compression
+        self.n_rows = 0
+
+    @abstractmethod
+    def write(self, df:pd.DataFrame):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CsvPredictionWriter(PredictionWriter):
+
+    def __init__(self, file_path:str, compression:str=None):
+        super().__init__(file_path=file_path, compression=compression)
+        if compression is None:
+            self.file_obj = open(file_path, "w", newline="")
+        else:
+            opener, _ = CSV_COMPRESSION_OPENERS[compression]
+            self.file_obj = opener(file_path, "wt", newline="")
+
+    def write(self, df:pd.DataFrame):
+        df.to_csv(self.file_obj, index=False, header=(self.n_rows == 0))
+        self.n_rows += len(df)
+
+    def close(self):
+        self.file_obj.close()
+
+
+class ArrowPredictionWriter(PredictionWriter):
+    """
+    Parquet and feather writer, every chunk is cast to the schema of the first one
+    """
+
+    def __init__(self, file_path:str, output_format:str, compression:str=None):
+        super().__init__(file_path=file_path, compression=compression)
+        self.output_format = output_format
+        self.schema = None
+        self.writer = None
+
+    def write(self, df:pd.DataFrame):
+        # pyarrow is only needed for columnar outputs
+        import pyarrow as pa
+        if self.schema is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            self.schema = table.schema
+            if self.output_format == "parquet":
+                import pyarrow.parquet as pq
+                self.writer = pq.ParquetWriter(self.file_path, self.schema, compression=self.compression or "none")
+            else:
+                import pyarrow.ipc as ipc
+                options = ipc.IpcWriteOptions(compression=self.compression)
+                self.writer = ipc.new_file(self.file_path, self.schema, options=options)
+        else:
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        self.writer.write_table(table)
+        self.n_rows += len(df)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        elif self.n_rows == 0:
+            # nothing was written, still leave an empty file behind like the csv writer
+            open(self.file_path, "wb").close()
+
+
+def get_prediction_writer(file_path:str, output_format:str="csv", compression:str=None)->PredictionWriter:
+    try:
+        get_prediction_file_extension(output_format=output_format, compression=compression)
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        logging.info("Writing predictions as %s with compression: %s to %s", output_format, compression, file_path)
+        if output_format == "csv":
+            return CsvPredictionWriter(file_path=file_path, compression=compression)
+        return ArrowPredictionWriter(file_path=file_path, output_format=output_format, compression=compression)
+    except Exception as e:
+        raise SensorException(e, sys)
@@ -5,39 +5,62 @@ import sys,os
 from sensor.entity import config_entity
 from sensor.components.data_ingestion import DataIngestion
 from sensor.components.data_validation import DataValidation
+from sensor.components.feature_selection import FeatureSelection
 from sensor.components.data_transformation import DataTransformation
 from sensor.components.model_trainer import ModelTrainer
 from sensor.components.model_evaluation import ModelEvaluation
 from sensor.components.model_pusher import ModelPusher
+from sensor.instrumentation import RunProfiler
+from sensor.artifact_retention import apply_artifact_retention
 
 
-def start_training_pipeline():
+def start_training_pipeline(stage_profiler:str=None):
     try:
-        training_pipeline_config = config_entity.TrainingPipelineConfig()
+        training_pipeline_config = config_entity.TrainingPipelineConfig(stage_profiler=stage_profiler)
+        run_profiler = RunProfiler(run_profile_file_path=training_pipeline_config.run_profile_file_path,
+                                   profiler=training_pipeline_config.stage_profiler)
+
+        #artifact retention: drop old unpublished runs, failed ones included, and compress the large files of the retained ones
+        artifact_retention_config = config_entity.ArtifactRetentionConfig(
+                artifact_root=os.path.dirname(training_pipeline_config.artifact_dir))
+        apply_artifact_retention(artifact_retention_config=artifact_retention_config)
 
         #data ingestion
         data_ingestion_config  = config_entity.DataIngestionConfig(training_pipeline_config=training_pipeline_config)
         print(data_ingestion_config.to_dict())
         data_ingestion = DataIngestion(data_ingestion_config=data_ingestion_config)
-        data_ingestion_artifact = data_ingestion.initiate_data_ingestion()
+        with run_profiler.stage("data_ingestion"):
+            data_ingestion_artifact = data_ingestion.initiate_data_ingestion()
         
         #data validation
         data_validation_config = config_entity.DataValidationConfig(training_pipeline_config=training_pipeline_config)
         data_validation = DataValidation(data_validation_config=data_validation_config,
                         data_ingestion_artifact=data_ingestion_artifact)
 
-        data_validation_artifact = data_validation.initiate_data_validation()
+        with run_profiler.stage("data_validation"):
+            data_validation_artifact = data_validation.initiate_data_validation()
+
+        #feature selection
+        feature_selection_config = config_entity.FeatureSelectionConfig(training_pipeline_config=training_pipeline_config)
+        feature_selection = FeatureSelection(feature_selection_config=feature_selection_config,
+                        data_ingestion_artifact=data_ingestion_artifact,
+                        data_validation_artifact=data_validation_artifact)
+        with run_profiler.stage("feature_selection"):
+            feature_selection_artifact = feature_selection.initiate_feature_selection()
 
         #data transformation
         data_transformation_config = config_entity.DataTransformationConfig(training_pipeline_config=training_pipeline_config)
         data_transformation = DataTransformation(data_transformation_config=data_transformation_config, 
-        data_ingestion_artifact=data_ingestion_artifact)
-        data_transformation_artifact = data_transformation.initiate_data_transformation()
+        data_ingestion_artifact=data_ingestion_artifact,
+        feature_selection_artifact=feature_selection_artifact)
+        with run_profiler.stage("data_transformation"):
+            data_transformation_artifact = data_transformation.initiate_data_transformation()
         
         #model trainer
         model_trainer_config = config_entity.ModelTrainerConfig(training_pipeline_config=training_pipeline_config)
         model_trainer = ModelTrainer(model_trainer_config=model_trainer_config, data_transformation_artifact=data_transformation_artifact)
-        model_trainer_artifact = model_trainer.initiate_model_trainer()
+        with run_profiler.stage("model_trainer"):
+            model_trainer_artifact = model_trainer.initiate_model_trainer()
 
         #model evaluation
         model_eval_config = config_entity.ModelEvaluationConfig(training_pipeline_config=training_pipeline_config)
@@ -45,15 +68,22 @@ def start_training_pipeline():
         data_ingestion_artifact=data_ingestion_artifact,
         data_transformation_artifact=data_transformation_artifact,
         model_trainer_artifact=model_trainer_artifact)
-        model_eval_artifact = model_eval.initiate_model_evaluation()
+        with run_profiler.stage("model_evaluation"):
+            model_eval_artifact = model_eval.initiate_model_evaluation()
 
         #model pusher
         model_pusher_config = config_entity.ModelPusherConfig(training_pipeline_config)
         
         model_pusher = ModelPusher(model_pusher_config=model_pusher_config, 
                 data_transformation_artifact=data_transformation_artifact,
-                model_trainer_artifact=model_trainer_artifact)
+                model_trainer_artifact=model_trainer_artifact,
+                feature_selection_artifact=feature_selection_artifact)
+
+        with run_profiler.stage("model_pusher"):
+            model_pusher_artifact = model_pusher.initiate_model_pusher()
 
-        model_pusher_artifact = model_pusher.initiate_model_pusher()
+        #compress the large files of this run too, so they are synced compressed
+        with run_profiler.stage("artifact_retention"):
+            apply_artifact_retention(artifact_retention_config=artifact_retention_config)
     except Exception as e:
         raise SensorException(e, sys)
\ No newline at end of file
@@ -1,9 +1,125 @@
 from sensor.logger import logging
 from sensor.exception import SensorException
 import os,sys
-from sensor.entity.config_entity import TRANSFORMER_OBJECT_FILE_NAME, TARGET_ENCODER_OBJECT_FILE_NAME, MODEL_FILE_NAME
+from sensor.entity.config_entity import TRANSFORMER_OBJECT_FILE_NAME, TARGET_ENCODER_OBJECT_FILE_NAME, MODEL_FILE_NAME, FEATURE_STATS_FILE_NAME
+from sensor.utils import load_object, read_yaml_file, get_file_hash
 from glob import glob
 from typing import Optional,Union
+from dataclasses import dataclass
+from collections import OrderedDict
+import hashlib
+import threading
+import warnings
+import pandas as pd
+import numpy as np
+
+
+@dataclass
+class ModelBundlePaths:
+    version:int
+    transformer_path:str
+    model_path:str
+    target_encoder_path:str
+    # None for versions published without training feature statistics
+    feature_stats_path:Optional[str]=None
+
+
+@dataclass
+class ModelBundle:
+    version:int
+    transformer:object
+    model:object
+    target_encoder:object
+    feature_stats:Optional[dict]=None
+    # sha256 of the transformer, model and target encoder files, a re-trained bundle reusing a version number differs
+    content_hash:Optional[str]=None
+
+
+class InplacePredictor:
+    """
+    Scores an XGBClassifier through booster.inplace_predict, which reads a contiguous float32 array
+    directly instead of building a DMatrix per call, and applies the probability threshold in NumPy.
+
+    nthread: threads used by every call, None keeps the xgboost default of all cores
+    threshold: probability above which a binary prediction is the positive class
+    """
+
+    def __init__(self, model, nthread:Optional[int]=None, threshold:float=0.5):
+        self.model = model
+        # own copy, so capping threads never changes the booster of the wrapped model
+        self.booster = model.get_booster().copy()
+        self.booster_nthread = -1 if nthread is None else int(nthread)
+        if nthread is not None:
+            self.booster.set_param({"nthread": int(nthread)})
+        best_iteration = self.booster.attr("best_iteration")
+        # early stopped models only use the trees up to their best iteration, (0, 0) uses every tree
+        self.iteration_range = (0, int(best_iteration)+1) if best_iteration is not None else (0, 0)
+        self.threshold = threshold
+
+    def _inplace_predict(self, x)->np.ndarray:
+        # positive class probability for binary models, one column per class otherwise
+        return self.booster.inplace_predict(np.ascontiguousarray(x, dtype=np.float32),
+                                            iteration_range=self.iteration_range, missing=np.nan,
+                                            validate_features=False)
+
+    def predict_proba(self, x)->np.ndarray:
+        probability = self._inplace_predict(x)
+        if probability.ndim == 1:
+            return np.column_stack([1.0 - probability, probability])
+        return probability
+
+    def predict_contributions(self, x, approx:bool=False)->np.ndarray:
+        """
+        Per feature contributions to the margin, one column per feature followed by the bias column.
+        approx uses the cheaper Saabas approximation instead of exact tree SHAP.
+        """
+        from xgboost import DMatrix
+        # contributions are not available through inplace_predict
+        dmatrix = DMatrix(np.ascontiguousarray(x, dtype=np.float32), missing=np.nan, nthread=self.booster_nthread)
+        return self.booster.predict(dmatrix, pred_contribs=True, approx_contribs=approx,
+                                    iteration_range=self.iteration_range, validate_features=False)
+
+    def predict(self, x)->np.ndarray:
+        probability = self._inplace_predict(x)
+        # class indexes, like XGBClassifier.predict
+        if probability.ndim == 1:
+            return (probability > self.threshold).astype(np.int64)
+        return np.argmax(probability, axis=1)
+
+
+def get_fast_predictor(model, nthread:Optional[int]=None):
+    """
+    Wraps xgboost models in an InplacePredictor, other models are returned unchanged
+    """
+    if hasattr(model, "get_booster"):
+        return InplacePredictor(model=model, nthread=nthread)
+    return model
+
+
+def get_bundle_content_hash(bundle_paths:ModelBundlePaths)->str:
+    """
+    Hash of the transformer, model and target encoder file contents of a bundle
+    """
+    file_hashes = [get_file_hash(file_path=file_path) for file_path in
+                   (bundle_paths.transformer_path, bundle_paths.model_path, bundle_paths.target_encoder_path)]
+    return hashlib.sha256("".join(file_hashes).encode()).hexdigest()
+
+
+def load_model_bundle(bundle_paths:ModelBundlePaths, nthread:Optional[int]=None)->ModelBundle:
+    """
+    nthread: threads of every model call, set it when several bundles score in parallel
+    """
+    try:
+        logging.info("Loading model bundle version: %s", bundle_paths.version)
+        return ModelBundle(version=bundle_paths.version,
+                           transformer=load_object(file_path=bundle_paths.transformer_path),
+                           model=get_fast_predictor(model=load_object(file_path=bundle_paths.model_path), nthread=nthread),
+                           target_encoder=load_object(file_path=bundle_paths.target_encoder_path),
+                           feature_stats=None if bundle_paths.feature_stats_path is None
+                                         else read_yaml_file(file_path=bundle_paths.feature_stats_path),
+                           content_hash=get_bundle_content_hash(bundle_paths=bundle_paths))
+    except Exception as e:
+        raise SensorException(e, sys)
 
 class ModelResolver:
 
@@ -22,12 +138,12 @@ class ModelResolver:
         try:
             dir_names = os.listdir(self.model_registry)
             # convering dir mane to int
-            logging.info("error message from get_latest_dir_path 1")
+            logging.debug("error message from get_latest_dir_path 1")
             if len(dir_names) == 0:
                 return None
             dir_names = list(map(int, dir_names)) 
             latest_dir_name = max(dir_names)
-            logging.info("error message from get_latest_dir_path 2")
+            logging.debug("error message from get_latest_dir_path 2")
             return os.path.join(self.model_registry, f"{latest_dir_name}")
         except Exception as e:
             raise SensorException(e, sys)
@@ -60,12 +176,36 @@ class ModelResolver:
         except Exception as e:
             raise SensorException(e, sys)
 
+    def get_bundle_paths(self, version:int)->ModelBundlePaths:
+        try:
+            version_dir=os.path.join(self.model_registry,f"{version}")
+            feature_stats_path=os.path.join(version_dir,FEATURE_STATS_FILE_NAME)
+            return ModelBundlePaths(version=int(version),
+                transformer_path=os.path.join(version_dir,self.transformer_dir_name,TRANSFORMER_OBJECT_FILE_NAME),
+                model_path=os.path.join(version_dir,self.model_dir_name,MODEL_FILE_NAME),
+                target_encoder_path=os.path.join(version_dir,self.target_encoder_dir_name,TARGET_ENCODER_OBJECT_FILE_NAME),
+                feature_stats_path=feature_stats_path if os.path.exists(feature_stats_path) else None)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def get_latest_bundle_paths(self)->ModelBundlePaths:
+        """
+        Resolves the transformer, model and target encoder of the latest version with a single registry scan
+        """
+        try:
+            latest_dir=self.get_latest_dir_path()
+            if latest_dir is None:
+                raise Exception(f"Model is not available")
+            return self.get_bundle_paths(version=int(os.path.basename(latest_dir)))
+        except Exception as e:
+            raise SensorException(e, sys)
+
     def get_latest_save_dir_path(self)-> str:
         try:
             latest_dir=self.get_latest_dir_path()
             if latest_dir == None:
                 return os.path.join(self.model_registry,f"{0}")
-            logging.info("error message from get_latest_save_dir_path 1")
+            logging.debug("error message from get_latest_save_dir_path 1")
             latest_dir_num=int(os.path.basename(self.get_latest_dir_path()))
             return os.path.join(self.model_registry,f"{latest_dir_num+1}")
         except Exception as e:
@@ -74,9 +214,9 @@ class ModelResolver:
     def get_latest_save_model_path(self):
         try:
             latest_dir = self.get_latest_save_dir_path()
-            logging.info("error message from get_latest_save_model_path1")
+            logging.debug("error message from get_latest_save_model_path1")
             return os.path.join(latest_dir,self.model_dir_name,MODEL_FILE_NAME)
-            logging.info("error message from get_latest_save_model_path2")
+            logging.debug("error message from get_latest_save_model_path2")
         except Exception as e:
             raise e
 
@@ -95,3 +235,179 @@ class ModelResolver:
         except Exception as e:
             raise e
 
+
+# prefix of the top-k attribution columns added by predict_dataframe
+ATTRIBUTION_COLUMN_PREFIX = "attribution_"
+
+
+def get_top_k_attributions(contributions:np.ndarray, feature_names:list, top_k:int)->pd.DataFrame:
+    """
+    Keeps the top_k features of every row by absolute contribution, as feature and contribution column pairs
+    ordered from the strongest one, instead of the dense feature matrix
+    """
+    feature_contributions = contributions[:, :-1]
+    top_k = min(top_k, feature_contributions.shape[1])
+    strength = np.abs(feature_contributions)
+    top_index = np.argpartition(-strength, top_k-1, axis=1)[:, :top_k]
+    order = np.argsort(-np.take_along_axis(strength, top_index, axis=1), axis=1)
+    top_index = np.take_along_axis(top_index, order, axis=1)
+    top_contributions = np.take_along_axis(feature_contributions, top_index, axis=1)
+    names = np.asarray(feature_names, dtype=object)
+    columns = dict()
+    for rank in range(top_k):
+        columns[f"{ATTRIBUTION_COLUMN_PREFIX}{rank+1}_feature"] = names[top_index[:, rank]]
+        columns[f"{ATTRIBUTION_COLUMN_PREFIX}{rank+1}_contribution"] = top_contributions[:, rank]
+    return pd.DataFrame(columns)
+
+
+def predict_dataframe(df:pd.DataFrame, transformer, model, target_encoder, attribution_top_k:Optional[int]=None,
+                      attribution_approx:bool=False, attribution_flagged_only:bool=True)->pd.DataFrame:
+    """
+    Adds the prediction and cat_pred columns to df using already loaded objects
+
+    attribution_top_k: also adds the top_k features that drove every prediction, from the xgboost contributions
+    attribution_approx: approximate contributions, cheaper than exact tree SHAP
+    attribution_flagged_only: only explains rows predicted as the positive class (encoded label 1), the other rows
+    are left empty, so the cost follows the number of flagged trucks rather than the number of rows
+    """
+    input_feature_name = list(transformer.feature_names_in_)
+    input_arr = transformer.transform(df[input_feature_name])
+    prediction = model.predict(input_arr)
+    cat_prediction = target_encoder.inverse_transform(prediction)
+    df["prediction"] = prediction
+    df["cat_pred"] = cat_prediction
+    if attribution_top_k:
+        if not hasattr(model, "predict_contributions"):
+            raise Exception(f"Attributions need an xgboost model, got {type(model).__name__}")
+        explained = np.flatnonzero(prediction == 1) if attribution_flagged_only else np.arange(len(df))
+        contributions = model.predict_contributions(input_arr[explained], approx=attribution_approx)
+        attributions = get_top_k_attributions(contributions=contributions, feature_names=input_feature_name,
+                                              top_k=attribution_top_k)
+        attributions.index = df.index[explained]
+        attributions = attributions.reindex(df.index)
+        # nullable strings, so a chunk without any flagged row keeps the same columnar schema as the others
+        for column in attributions.columns[::2]:
+            attributions[column] = attributions[column].astype("string")
+        df = pd.concat([df, attributions], axis=1)
+    return df
+
+
+def warm_up_bundle(bundle:ModelBundle, sample_df:pd.DataFrame=None):
+    """
+    Smoke prediction through transformer, model and target encoder of a freshly loaded bundle.
+    Raises if the bundle can not score, and leaves lazily built state (booster, thread pools) initialised.
+    """
+    try:
+        input_feature_name = list(bundle.transformer.feature_names_in_)
+        if sample_df is None:
+            sample_df = pd.DataFrame([[np.nan]*len(input_feature_name), [0.0]*len(input_feature_name)],
+                                     columns=input_feature_name)
+        scored_df = predict_dataframe(df=sample_df.copy(), transformer=bundle.transformer, model=bundle.model,
+                                      target_encoder=bundle.target_encoder)
+        if len(scored_df) != len(sample_df) or scored_df["prediction"].isna().any():
+            raise Exception(f"Smoke prediction of model version: {bundle.version} returned invalid predictions")
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def transform_array(transformer, input_arr:np.ndarray)->np.ndarray:
+    """
+    Runs the transformer on an array whose columns already follow transformer.feature_names_in_,
+    skipping the DataFrame construction that transform would otherwise need to match feature names
+    """
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        return transformer.transform(input_arr)
+
+
+class Predictor:
+    """
+    Keeps recently used model bundles in memory so repeated predictions only pay for compute.
+    Bundles are cached in LRU order keyed by registry version and the mtime of their files,
+    so a bundle rewritten in place or a newly published version is never served from a stale entry.
+
+    max_bundles: maximum number of bundles kept in memory
+    max_bytes: maximum total size on disk of the cached bundles, None for no limit
+    """
+
+    def __init__(self, model_registry:str="saved_models", max_bundles:int=2, max_bytes:Optional[int]=None):
+        try:
+            if max_bundles < 1:
+                raise Exception(f"max_bundles should be at least 1 but got {max_bundles}")
+            self.model_resolver = ModelResolver(model_registry=model_registry)
+            self.max_bundles = max_bundles
+            self.max_bytes = max_bytes
+            self._cache = OrderedDict()
+            self._cache_bytes = dict()
+            self._lock = threading.Lock()
+            self.hits = 0
+            self.misses = 0
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    @staticmethod
+    def _bundle_key(bundle_paths:ModelBundlePaths)->tuple:
+        return (bundle_paths.version,
+                os.path.getmtime(bundle_paths.transformer_path),
+                os.path.getmtime(bundle_paths.model_path),
+                os.path.getmtime(bundle_paths.target_encoder_path))
+
+    @staticmethod
+    def _bundle_size(bundle_paths:ModelBundlePaths)->int:
+        return (os.path.getsize(bundle_paths.transformer_path)
+                + os.path.getsize(bundle_paths.model_path)
+                + os.path.getsize(bundle_paths.target_encoder_path))
+
+    def invalidate(self, version:Optional[int]=None):
+        """
+        Drops the cached bundles of version, or every cached bundle when version is None
+        """
+        with self._lock:
+            for key in list(self._cache):
+                if version is None or key[0] == version:
+                    self._cache.pop(key)
+                    self._cache_bytes.pop(key)
+
+    def _evict(self):
+        while len(self._cache) > self.max_bundles or (
+                self.max_bytes is not None and len(self._cache) > 1 and sum(self._cache_bytes.values()) > self.max_bytes):
+            key, _ = self._cache.popitem(last=False)
+            self._cache_bytes.pop(key)
+            logging.info("Evicted model bundle version: %s from predictor cache", key[0])
+
+    def get_bundle(self, version:Optional[int]=None)->ModelBundle:
+        """
+        Returns the bundle of version, or of the latest published version when version is None
+        """
+        try:
+            if version is None:
+                bundle_paths = self.model_resolver.get_latest_bundle_paths()
+            else:
+                bundle_paths = self.model_resolver.get_bundle_paths(version=version)
+            key = self._bundle_key(bundle_paths)
+            with self._lock:
+                if key in self._cache:
+                    self.hits += 1
+                    self._cache.move_to_end(key)
+                    return self._cache[key]
+                self.misses += 1
+                # entries of the same version with other mtimes were overwritten on disk
+                for stale_key in [cached_key for cached_key in self._cache if cached_key[0] == key[0]]:
+                    self._cache.pop(stale_key)
+                    self._cache_bytes.pop(stale_key)
+                bundle = load_model_bundle(bundle_paths=bundle_paths)
+                self._cache[key] = bundle
+                self._cache_bytes[key] = self._bundle_size(bundle_paths)
+                self._evict()
+                return bundle
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def predict(self, df:pd.DataFrame, version:Optional[int]=None)->pd.DataFrame:
+        try:
+            bundle = self.get_bundle(version=version)
+            return predict_dataframe(df=df, transformer=bundle.transformer, model=bundle.model,
+                                     target_encoder=bundle.target_encoder)
+        except Exception as e:
+            raise SensorException(e, sys)
+
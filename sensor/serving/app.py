@@ -0,0 +1,96 @@
+from sensor.logger import logging
+from sensor.entity.config_entity import ServingConfig
+from sensor.serving.scoring_service import ScoringService
+from sensor.serving import binary_codec
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import Dict, List, Optional, Union
+import asyncio
+import time
+
+
+class PredictionRequest(BaseModel):
+    # one record per truck, sensor name to reading; missing sensors and "na" are treated as missing values
+    records: List[Dict[str, Optional[Union[float, str]]]]
+
+
+def create_app(serving_config:ServingConfig=None)->FastAPI:
+    """
+    Builds the app and its scoring service, served with `uvicorn --factory sensor.serving.app:create_app`
+    """
+    app = FastAPI(title="Sensor Fault Detection scoring service")
+    service = ScoringService(serving_config=serving_config)
+    app.state.scoring_service = service
+
+    @app.on_event("startup")
+    def start_service():
+        service.start()
+
+    @app.on_event("shutdown")
+    def stop_service():
+        service.stop()
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "model_version": service.bundle.version if service.bundle else None}
+
+    @app.get("/metrics")
+    def metrics():
+        return service.metrics.snapshot()
+
+    @app.post("/predict")
+    async def predict(request:PredictionRequest):
+        start_time = time.perf_counter()
+        if len(request.records) == 0:
+            return {"predictions": []}
+        try:
+            predictions = await asyncio.wrap_future(service.batcher.submit(request.records))
+        except Exception as e:
+            service.metrics.observe_error()
+            logging.info("Scoring request failed: %s", e)
+            raise HTTPException(status_code=400, detail=str(e))
+        service.metrics.observe_request(latency_ms=(time.perf_counter()-start_time)*1000, n_rows=len(request.records))
+        return {"predictions": predictions}
+
+    def score_binary(matrix, feature_names, start_time:float):
+        try:
+            prediction, cat_prediction, bundle = service.predict_matrix(matrix=matrix, feature_names=feature_names)
+        except Exception as e:
+            service.metrics.observe_error()
+            logging.info("Bulk scoring request failed: %s", e)
+            raise HTTPException(status_code=400, detail=str(e))
+        service.metrics.observe_batch(n_rows=len(matrix))
+        service.metrics.observe_request(latency_ms=(time.perf_counter()-start_time)*1000, n_rows=len(matrix))
+        return prediction, cat_prediction, bundle
+
+    @app.post("/predict/float32")
+    async def predict_float32(request:Request):
+        start_time = time.perf_counter()
+        body = await request.body()
+        # decoding and scoring a bulk matrix takes long enough to stall the event loop, both run in the threadpool
+        try:
+            feature_names, matrix = await run_in_threadpool(binary_codec.decode_float32_matrix, body)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        prediction, _, bundle = await run_in_threadpool(score_binary, matrix, feature_names, start_time)
+        classes = ",".join(str(label) for label in bundle.target_encoder.classes_)
+        return Response(content=binary_codec.encode_prediction_int32(prediction),
+                        media_type=binary_codec.FLOAT32_CONTENT_TYPE,
+                        headers={"X-Model-Version": str(bundle.version), "X-Class-Labels": classes})
+
+    @app.post("/predict/arrow")
+    async def predict_arrow(request:Request):
+        start_time = time.perf_counter()
+        body = await request.body()
+        try:
+            feature_names, matrix = await run_in_threadpool(binary_codec.decode_arrow_matrix, body)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        prediction, cat_prediction, bundle = await run_in_threadpool(score_binary, matrix, feature_names, start_time)
+        content = await run_in_threadpool(binary_codec.encode_arrow_predictions, prediction, cat_prediction)
+        return Response(content=content,
+                        media_type=binary_codec.ARROW_CONTENT_TYPE,
+                        headers={"X-Model-Version": str(bundle.version)})
+
+    return app
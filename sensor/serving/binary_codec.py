@@ -0,0 +1,90 @@
+"""
+Binary payloads of the bulk scoring endpoints
+
+float32 request:  uint32 little-endian header length | utf-8 comma separated feature names | float32 little-endian rows, row major
+float32 response: int32 little-endian predicted class index per row
+arrow request:    Arrow IPC stream with one float column per feature
+arrow response:   Arrow IPC stream with int32 "prediction" and string "cat_pred" columns
+"""
+from sensor.exception import SensorException
+from typing import List, Tuple
+import numpy as np
+import struct
+import os, sys
+
+FLOAT32_CONTENT_TYPE = "application/octet-stream"
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+_HEADER_LENGTH = struct.Struct("<I")
+
+
+def encode_float32_matrix(feature_names:List[str], rows:np.ndarray)->bytes:
+    try:
+        header = ",".join(feature_names).encode("utf-8")
+        matrix = np.ascontiguousarray(rows, dtype="<f4")
+        if matrix.ndim != 2 or matrix.shape[1] != len(feature_names):
+            raise Exception(f"Rows of shape {matrix.shape} do not match {len(feature_names)} feature names")
+        return _HEADER_LENGTH.pack(len(header)) + header + matrix.tobytes()
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def decode_float32_matrix(body:bytes)->Tuple[List[str], np.ndarray]:
+    try:
+        (header_length,) = _HEADER_LENGTH.unpack_from(body, 0)
+        header_end = _HEADER_LENGTH.size + header_length
+        feature_names = body[_HEADER_LENGTH.size:header_end].decode("utf-8").split(",")
+        matrix = np.frombuffer(body, dtype="<f4", offset=header_end)
+        if matrix.size % len(feature_names) != 0:
+            raise Exception(f"Payload of {matrix.size} floats is not a multiple of {len(feature_names)} features")
+        return feature_names, matrix.reshape(-1, len(feature_names))
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def encode_prediction_int32(prediction:np.ndarray)->bytes:
+    return np.ascontiguousarray(prediction, dtype="<i4").tobytes()
+
+
+def decode_prediction_int32(body:bytes)->np.ndarray:
+    return np.frombuffer(body, dtype="<i4")
+
+
+def decode_arrow_matrix(body:bytes)->Tuple[List[str], np.ndarray]:
+    """
+    Reads every column of an Arrow IPC stream straight into one float32 matrix, without pandas
+    """
+    try:
+        import pyarrow as pa
+        table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+        matrix = np.empty((table.num_rows, table.num_columns), dtype=np.float32)
+        for column_index, column in enumerate(table.columns):
+            matrix[:, column_index] = column.cast(pa.float32()).to_numpy(zero_copy_only=False)
+        return table.column_names, matrix
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def encode_arrow_predictions(prediction:np.ndarray, cat_prediction:np.ndarray)->bytes:
+    try:
+        import pyarrow as pa
+        batch = pa.record_batch([pa.array(np.asarray(prediction, dtype=np.int32)), pa.array(np.asarray(cat_prediction, dtype=str))],
+                                names=["prediction", "cat_pred"])
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes()
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def encode_arrow_matrix(feature_names:List[str], rows:np.ndarray)->bytes:
+    try:
+        import pyarrow as pa
+        batch = pa.record_batch([pa.array(np.ascontiguousarray(rows[:, column_index], dtype=np.float32))
+                                 for column_index in range(rows.shape[1])], names=list(feature_names))
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes()
+    except Exception as e:
+        raise SensorException(e, sys)
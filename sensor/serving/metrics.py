@@ -0,0 +1,54 @@
+from collections import deque
+import threading
+import time
+import numpy as np
+
+
+class LatencyMetrics:
+    """
+    Thread safe request latency and throughput counters of the scoring service.
+    Percentiles are computed over the last window_size requests only, so memory stays bounded.
+    """
+
+    def __init__(self, window_size:int=10000):
+        self._latencies_ms = deque(maxlen=window_size)
+        self._batch_sizes = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.n_requests = 0
+        self.n_rows = 0
+        self.n_batches = 0
+        self.n_errors = 0
+
+    def observe_request(self, latency_ms:float, n_rows:int):
+        with self._lock:
+            self._latencies_ms.append(latency_ms)
+            self.n_requests += 1
+            self.n_rows += n_rows
+
+    def observe_batch(self, n_rows:int):
+        with self._lock:
+            self._batch_sizes.append(n_rows)
+            self.n_batches += 1
+
+    def observe_error(self):
+        with self._lock:
+            self.n_errors += 1
+
+    def snapshot(self)->dict:
+        with self._lock:
+            latencies_ms = np.array(self._latencies_ms, dtype=float)
+            batch_sizes = np.array(self._batch_sizes, dtype=float)
+            uptime = time.perf_counter() - self.start_time
+            return {
+                "requests": self.n_requests,
+                "rows": self.n_rows,
+                "batches": self.n_batches,
+                "errors": self.n_errors,
+                "uptime_seconds": round(uptime, 3),
+                "requests_per_second": round(self.n_requests/uptime, 2) if uptime > 0 else None,
+                "rows_per_second": round(self.n_rows/uptime, 2) if uptime > 0 else None,
+                "latency_p50_ms": round(float(np.percentile(latencies_ms, 50)), 3) if latencies_ms.size else None,
+                "latency_p99_ms": round(float(np.percentile(latencies_ms, 99)), 3) if latencies_ms.size else None,
+                "mean_batch_size": round(float(batch_sizes.mean()), 2) if batch_sizes.size else None,
+            }
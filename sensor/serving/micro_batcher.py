@@ -0,0 +1,106 @@
+from sensor.logger import logging
+from concurrent.futures import Future
+from typing import Callable
+import numpy as np
+import queue
+import threading
+import time
+
+
+def _concatenate(parts:list):
+    if isinstance(parts[0], np.ndarray):
+        return np.concatenate(parts)
+    return [item for part in parts for item in part]
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent scoring requests into one call of predict_fn.
+    A batch is closed as soon as it holds max_batch_size rows or max_wait_ms has passed since its first request,
+    so a lone request waits at most max_wait_ms while bursts are scored together.
+    When a batch of several requests fails, every request is scored again on its own,
+    so only the requests that caused the failure get the exception.
+
+    predict_fn: takes the concatenated items of a batch (array rows or list elements) and returns one result per item
+    """
+
+    def __init__(self, predict_fn:Callable, max_batch_size:int=64, max_wait_ms:float=2.0, metrics=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.metrics = metrics
+        self._requests = queue.Queue()
+        self._stop_event = threading.Event()
+        self._worker = None
+
+    def start(self):
+        if self._worker is None:
+            self._stop_event.clear()
+            self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._worker.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def submit(self, rows)->Future:
+        """
+        Queues rows (a 2d array or a list of records) for scoring, the returned future resolves to their results
+        """
+        future = Future()
+        self._requests.put((rows, future))
+        return future
+
+    def _collect_batch(self)->list:
+        try:
+            first_request = self._requests.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first_request]
+        n_rows = len(first_request[0])
+        deadline = time.perf_counter() + self.max_wait_ms/1000
+        while n_rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            n_rows += len(request[0])
+        return batch
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if len(batch) == 0:
+                continue
+            try:
+                rows = batch[0][0] if len(batch) == 1 else _concatenate([request_rows for request_rows, _ in batch])
+                results = self.predict_fn(rows)
+                if self.metrics is not None:
+                    self.metrics.observe_batch(n_rows=len(rows))
+                start = 0
+                for request_rows, future in batch:
+                    future.set_result(results[start:start+len(request_rows)])
+                    start += len(request_rows)
+            except Exception as e:
+                logging.info("Micro batch of %s request(s) failed: %s", len(batch), e)
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                for request_rows, future in batch:
+                    if not future.done():
+                        self._run_alone(request_rows, future)
+
+    def _run_alone(self, rows, future:Future):
+        try:
+            results = self.predict_fn(rows)
+            if self.metrics is not None:
+                self.metrics.observe_batch(n_rows=len(rows))
+            future.set_result(results)
+        except Exception as e:
+            future.set_exception(e)
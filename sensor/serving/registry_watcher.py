@@ -0,0 +1,75 @@
+from sensor.logger import logging
+from sensor.predictor import ModelResolver, ModelBundle, load_model_bundle, warm_up_bundle
+from typing import Callable, Optional
+import os
+import threading
+
+
+class RegistryWatcher:
+    """
+    Polls the model registry and hands every newly published, successfully warmed bundle to on_new_bundle.
+    Loading and the smoke prediction run on the watcher thread, so serving never waits for them.
+    A version that fails to load, warm up or swap is not retried until its files change,
+    and the previously served bundle simply stays in place.
+    """
+
+    def __init__(self, model_registry:str, on_new_bundle:Callable[[ModelBundle], None],
+                 poll_interval_seconds:float=30.0, current_version:Optional[int]=None):
+        self.model_resolver = ModelResolver(model_registry=model_registry)
+        self.on_new_bundle = on_new_bundle
+        self.poll_interval_seconds = poll_interval_seconds
+        self.current_version = current_version
+        self.failed_key = None
+        self._stop_event = threading.Event()
+        self._worker = None
+
+    def start(self):
+        if self._worker is None:
+            self._stop_event.clear()
+            self._worker = threading.Thread(target=self._run, name="registry-watcher", daemon=True)
+            self._worker.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def check_once(self)->bool:
+        """
+        Loads, warms and publishes the latest version if it is new, returns True when a swap happened
+        """
+        latest_dir = self.model_resolver.get_latest_dir_path()
+        if latest_dir is None:
+            return False
+        bundle_paths = self.model_resolver.get_bundle_paths(version=int(os.path.basename(latest_dir)))
+        if bundle_paths.version == self.current_version:
+            return False
+        try:
+            key = (bundle_paths.version, os.path.getmtime(bundle_paths.transformer_path),
+                   os.path.getmtime(bundle_paths.model_path), os.path.getmtime(bundle_paths.target_encoder_path))
+        except OSError:
+            # the pusher is still writing this version, try again on the next poll
+            return False
+        if key == self.failed_key:
+            return False
+        try:
+            logging.info("Registry watcher found model version: %s, loading it in the background", bundle_paths.version)
+            bundle = load_model_bundle(bundle_paths=bundle_paths)
+            warm_up_bundle(bundle=bundle)
+            self.on_new_bundle(bundle)
+        except Exception as e:
+            self.failed_key = key
+            logging.info("Keeping model version: %s, version: %s failed: %s", self.current_version, bundle_paths.version, e)
+            return False
+        logging.info("Swapped serving model from version: %s to version: %s", self.current_version, bundle.version)
+        self.current_version = bundle.version
+        self.failed_key = None
+        return True
+
+    def _run(self):
+        while not self._stop_event.wait(self.poll_interval_seconds):
+            try:
+                self.check_once()
+            except Exception as e:
+                logging.info("Registry watcher poll failed: %s", e)
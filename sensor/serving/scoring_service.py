@@ -0,0 +1,114 @@
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.entity.config_entity import ServingConfig
+from sensor.predictor import Predictor, ModelBundle, warm_up_bundle, transform_array
+from sensor.serving.metrics import LatencyMetrics
+from sensor.serving.micro_batcher import MicroBatcher
+from sensor.serving.registry_watcher import RegistryWatcher
+from typing import List, Tuple
+import pandas as pd
+import numpy as np
+import os, sys
+
+
+def _to_float(value)->float:
+    if value is None or value == "na":
+        return np.nan
+    return float(value)
+
+
+def records_to_rows(records:List[dict], feature_names:List[str])->np.ndarray:
+    """
+    Orders the features of every record like the transformer, absent features and "na" become NaN
+    """
+    try:
+        return np.array([[_to_float(record.get(feature_name)) for feature_name in feature_names]
+                         for record in records], dtype=np.float64).reshape(len(records), len(feature_names))
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+def align_matrix(matrix:np.ndarray, feature_names:List[str], model_feature_names:List[str])->np.ndarray:
+    """
+    Reorders the columns of matrix from feature_names to model_feature_names, absent features become NaN
+    """
+    try:
+        if list(feature_names) == list(model_feature_names):
+            return matrix
+        column_index = {feature_name: index for index, feature_name in enumerate(feature_names)}
+        aligned = np.full((matrix.shape[0], len(model_feature_names)), np.nan, dtype=matrix.dtype)
+        for index, feature_name in enumerate(model_feature_names):
+            if feature_name in column_index:
+                aligned[:, index] = matrix[:, column_index[feature_name]]
+        return aligned
+    except Exception as e:
+        raise SensorException(e, sys)
+
+
+class ScoringService:
+    """
+    Keeps the latest model bundle resident and scores records through a MicroBatcher.
+    A RegistryWatcher swaps in newly published versions; every batch is scored by the bundle
+    that was current when the batch started, so a swap never affects an in-flight batch.
+    """
+
+    def __init__(self, serving_config:ServingConfig=None):
+        try:
+            self.serving_config = serving_config or ServingConfig()
+            self.predictor = Predictor(model_registry=self.serving_config.model_registry, max_bundles=1)
+            self.metrics = LatencyMetrics(window_size=self.serving_config.metrics_window)
+            self.bundle:ModelBundle = None
+            self.batcher = MicroBatcher(predict_fn=self.predict_records,
+                                        max_batch_size=self.serving_config.max_batch_size,
+                                        max_wait_ms=self.serving_config.max_wait_ms,
+                                        metrics=self.metrics)
+            self.watcher = None
+            if self.serving_config.reload_poll_seconds:
+                self.watcher = RegistryWatcher(model_registry=self.serving_config.model_registry,
+                                               on_new_bundle=self.swap_bundle,
+                                               poll_interval_seconds=self.serving_config.reload_poll_seconds)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def start(self):
+        try:
+            bundle = self.predictor.get_bundle()
+            warm_up_bundle(bundle=bundle)
+            self.swap_bundle(bundle)
+            logging.info("Scoring service started with model version: %s", bundle.version)
+            self.batcher.start()
+            if self.watcher is not None:
+                self.watcher.current_version = bundle.version
+                self.watcher.start()
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def stop(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.batcher.stop()
+
+    def swap_bundle(self, bundle:ModelBundle):
+        # a single attribute assignment, so readers see either the old or the new bundle
+        self.bundle = bundle
+
+    def predict_records(self, records:List[dict])->List[dict]:
+        bundle = self.bundle
+        feature_names = list(bundle.transformer.feature_names_in_)
+        rows = records_to_rows(records=records, feature_names=feature_names)
+        input_arr = bundle.transformer.transform(pd.DataFrame(rows, columns=feature_names))
+        prediction = bundle.model.predict(input_arr)
+        cat_prediction = bundle.target_encoder.inverse_transform(prediction)
+        return [{"prediction": int(pred), "cat_pred": str(cat_pred), "model_version": bundle.version}
+                for pred, cat_pred in zip(prediction, cat_prediction)]
+
+    def predict_matrix(self, matrix:np.ndarray, feature_names:List[str])->Tuple[np.ndarray, np.ndarray, ModelBundle]:
+        """
+        Bulk scoring of a float matrix without pandas, returns class indices, labels and the bundle used
+        """
+        bundle = self.bundle
+        input_arr = align_matrix(matrix=matrix, feature_names=feature_names,
+                                 model_feature_names=list(bundle.transformer.feature_names_in_))
+        prediction = bundle.model.predict(transform_array(transformer=bundle.transformer, input_arr=input_arr))
+        return prediction, bundle.target_encoder.inverse_transform(prediction), bundle
+
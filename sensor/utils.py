@@ -1,13 +1,18 @@
 import pandas as pd
-from sensor.config import mongo_client
+from sensor.config import get_mongo_client
 from sensor.logger import logging
 from sensor.exception import SensorException
 import os,sys
 import yaml
 import dill
 import numpy as np
+import hashlib
+import io
 
-def get_collection_as_dataframe(database_name:str, collection_name:str)->pd.DataFrame():
+# suffix of artifacts compressed by the retention policy, readers fall back to it when the plain file is gone
+COMPRESSED_ARTIFACT_SUFFIX=".zst"
+
+def get_collection_as_dataframe(database_name:str, collection_name:str, columns:list=None)->pd.DataFrame():
     
     """
     Description: This function return collection as dataframe
@@ -15,21 +20,83 @@ def get_collection_as_dataframe(database_name:str, collection_name:str)->pd.Data
     Params:
     database_name: database name
     collection_name: collection name
+    columns: when given, only these fields are transferred from the database
     =========================================================
     return Pandas dataframe of a collection
     """
     try:
         logging.info(f"Reading data from database: {database_name} and collection: {collection_name}")
-        df = pd.DataFrame(list(mongo_client[database_name][collection_name].find()))
-        logging.info(f"Found columns: {df.columns}")
+        projection = None if columns is None else {column: 1 for column in columns}
+        df = pd.DataFrame(list(get_mongo_client()[database_name][collection_name].find({}, projection)))
+        logging.debug("Found columns: %s", list(df.columns))
         if "_id" in df.columns:
             logging.info(f"Dropping column: _id ")
             df = df.drop("_id",axis=1)
-        logging.info(f"Row and columns in df: {df.shape}")
+        logging.info("Row and columns in df: %s", df.shape)
         return df
     except Exception as e:
         raise SensorException(e, sys) from e
 
+def _field_stats_group(fields:list, convert_strings:bool)->dict:
+    group = {"_id": None, "count": {"$sum": 1}}
+    for index, field in enumerate(fields):
+        value = f"${field}"
+        if convert_strings:
+            # numeric strings are parsed server side, "na" and other text become null and are ignored by $min/$max
+            number = {"$convert": {"input": value, "to": "double", "onError": None, "onNull": None}}
+        else:
+            number = {"$cond": [{"$isNumber": value}, value, None]}
+        group[f"null_{index}"] = {"$sum": {"$cond": [{"$eq": [{"$ifNull": [value, None]}, None]}, 1, 0]}}
+        group[f"na_{index}"] = {"$sum": {"$cond": [{"$eq": [value, "na"]}, 1, 0]}}
+        group[f"min_{index}"] = {"$min": number}
+        group[f"max_{index}"] = {"$max": number}
+    return group
+
+def _get_collection_fields(collection)->list:
+    # every field of any document, listed by the database; documents are grouped by their field list, so only
+    # the few distinct document shapes are returned. Fields of the first document keep their order
+    keys = {key for result in collection.aggregate([
+                {"$project": {"_id": 0, "keys": {"$map": {"input": {"$objectToArray": "$$ROOT"}, "in": "$$this.k"}}}},
+                {"$group": {"_id": "$keys"}}])
+            for key in result["_id"]}
+    first_document = collection.find_one() or dict()
+    fields = [field for field in first_document if field != "_id"]
+    return fields + sorted(keys - set(fields) - {"_id"})
+
+def get_collection_field_stats(database_name:str, collection_name:str, fields:list=None)->dict:
+    """
+    Null and "na" counts, missing ratio and numeric min/max of every field, computed by the database in one
+    aggregation pass so that no document is transferred
+    fields: fields to describe, by default every field found in any document except _id
+    """
+    try:
+        from pymongo.errors import OperationFailure
+        collection = get_mongo_client()[database_name][collection_name]
+        if fields is None:
+            fields = _get_collection_fields(collection)
+        if len(fields) == 0:
+            return {"count": 0, "fields": dict()}
+        try:
+            result = list(collection.aggregate([{"$group": _field_stats_group(fields, convert_strings=True)}]))
+        except (NotImplementedError, OperationFailure) as e:
+            # servers without $convert (before MongoDB 4.0, or an in-process stand-in) only get min/max of numbers
+            logging.info("Numeric strings can not be converted by the database: %s", e)
+            result = list(collection.aggregate([{"$group": _field_stats_group(fields, convert_strings=False)}]))
+        if len(result) == 0:
+            return {"count": 0, "fields": dict()}
+        result = result[0]
+        count = result["count"]
+        field_stats = dict()
+        for index, field in enumerate(fields):
+            missing = result[f"null_{index}"] + result[f"na_{index}"]
+            field_stats[field] = {"null": result[f"null_{index}"], "na": result[f"na_{index}"],
+                                  "present": count - missing, "missing_ratio": missing/count,
+                                  "min": result[f"min_{index}"], "max": result[f"max_{index}"]}
+        logging.info("Computed statistics of %s fields over %s documents in the database", len(fields), count)
+        return {"count": count, "fields": field_stats}
+    except Exception as e:
+        raise SensorException(e, sys)
+
 def write_yaml_file(file_path, data:dict):
     try:
         file_dir=os.path.dirname(file_path)
@@ -40,6 +107,80 @@ def write_yaml_file(file_path, data:dict):
     except Exception as e:
         raise SensorException(e, sys)
 
+def read_yaml_file(file_path)->dict:
+    try:
+        with open(file_path,"rb") as yaml_file:
+            return yaml.safe_load(yaml_file)
+    except Exception as e:
+        raise SensorException(e, sys)
+
+def get_file_hash(file_path:str, block_size:int=1<<20)->str:
+    """
+    Returns the sha256 of the file content, read in blocks so large files are never fully in memory
+    """
+    try:
+        file_hash = hashlib.sha256()
+        with open(file_path,"rb") as file_obj:
+            for block in iter(lambda: file_obj.read(block_size), b""):
+                file_hash.update(block)
+        return file_hash.hexdigest()
+    except Exception as e:
+        raise SensorException(e, sys)
+
+def resolve_artifact_path(file_path:str)->str:
+    """
+    Returns file_path, or its zstd compressed copy when the retention policy compressed it
+    """
+    if not os.path.exists(file_path) and os.path.exists(file_path + COMPRESSED_ARTIFACT_SUFFIX):
+        return file_path + COMPRESSED_ARTIFACT_SUFFIX
+    return file_path
+
+def open_artifact(file_path:str):
+    """
+    Opens an artifact for binary reading, zstd compressed artifacts are decompressed transparently
+    """
+    try:
+        file_path = resolve_artifact_path(file_path)
+        if not file_path.endswith(COMPRESSED_ARTIFACT_SUFFIX):
+            return open(file_path, "rb")
+        # zstandard is only needed once compressed artifacts exist
+        import zstandard
+        with open(file_path, "rb") as file_obj:
+            return io.BytesIO(zstandard.ZstdDecompressor().stream_reader(file_obj).read())
+    except Exception as e:
+        raise SensorException(e, sys)
+
+def compress_file(file_path:str, level:int=3)->str:
+    """
+    Replaces file_path by a zstd compressed copy and returns the path of the copy
+    """
+    try:
+        import zstandard
+        compressed_file_path = file_path + COMPRESSED_ARTIFACT_SUFFIX
+        tmp_file_path = compressed_file_path + ".part"
+        with open(file_path, "rb") as source, open(tmp_file_path, "wb") as target:
+            zstandard.ZstdCompressor(level=level).copy_stream(source, target)
+        os.replace(tmp_file_path, compressed_file_path)
+        os.remove(file_path)
+        return compressed_file_path
+    except Exception as e:
+        raise SensorException(e, sys)
+
+def get_feature_stats(df:pd.DataFrame)->dict:
+    """
+    Null ratio, min and max of every column of a numeric feature frame
+    """
+    try:
+        null_ratio = df.isna().mean()
+        minimum, maximum = df.min(), df.max()
+        return {"rows": len(df),
+                "features": {column: {"null_ratio": float(null_ratio[column]),
+                                      "min": None if pd.isna(minimum[column]) else float(minimum[column]),
+                                      "max": None if pd.isna(maximum[column]) else float(maximum[column])}
+                             for column in df.columns}}
+    except Exception as e:
+        raise SensorException(e, sys) from e
+
 def convert_columns_float(df:pd.DataFrame, exclude_column:list):
     try:
         for column in df.columns:
@@ -51,19 +192,19 @@ def convert_columns_float(df:pd.DataFrame, exclude_column:list):
 
 def save_object(file_path:str, obj:object):
     try:
-        logging.info("entering the save Object method of main Utils class ")
+        logging.debug("entering the save Object method of main Utils class ")
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         with open(file_path,"wb") as file_obj:
             dill.dump(obj,file_obj)
-        logging.info("exited the save Object method of main Utils class")
+        logging.debug("exited the save Object method of main Utils class")
     except Exception as e:
         raise SensorException(e, sys) from e
 
 def load_object(file_path:str, ) -> object:
     try:
-        if not os.path.exists(file_path):
+        if not os.path.exists(resolve_artifact_path(file_path)):
             raise Exception(f"The File:{file_path} is not exists")
-        with open(file_path, "rb") as file_obj:
+        with open_artifact(file_path) as file_obj:
             return dill.load(file_obj)
     except Exception as e:
         raise SensorException(e, sys) from e
@@ -81,6 +222,53 @@ def save_numpy_array_data(file_path:str, array:np.array):
             np.save(file_obj, array)
     except Exception as e:
         raise SensorException(e,sys) from e
+def save_split_indices(file_path:str, split_indices:dict):
+    """
+    Saves the sorted row positions of every split of the feature store, e.g. {"train": ..., "test": ...}
+    """
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as file_obj:
+            np.savez(file_obj, **{split: np.sort(np.asarray(index)).astype(np.int32) for split, index in split_indices.items()})
+    except Exception as e:
+        raise SensorException(e, sys) from e
+
+def load_split_indices(file_path:str)->dict:
+    try:
+        with open_artifact(file_path) as file_obj:
+            split_file = np.load(file_obj)
+            return {split: split_file[split] for split in split_file.files}
+    except Exception as e:
+        raise SensorException(e, sys) from e
+
+def read_dataset_split(feature_store_file_path:str, split_file_path:str, split:str, usecols=None)->pd.DataFrame:
+    """
+    Reads the rows of one split from the feature store, the rows of the other splits are skipped by the parser
+    usecols: passed to read_csv, only these columns are parsed
+    """
+    try:
+        split_indices = load_split_indices(file_path=split_file_path)
+        other_rows = np.concatenate([index for name, index in split_indices.items() if name != split])
+        # +1 for the header line
+        df = pd.read_csv(resolve_artifact_path(feature_store_file_path), usecols=usecols, skiprows=other_rows + 1)
+        if len(df) != len(split_indices[split]):
+            raise Exception(f"Split {split} has {len(split_indices[split])} rows but {len(df)} were read from {feature_store_file_path}")
+        return df
+    except Exception as e:
+        raise SensorException(e, sys) from e
+
+def read_dataset_splits(feature_store_file_path:str, split_file_path:str, usecols=None)->tuple:
+    """
+    Parses the feature store once and returns the train and test frames
+    """
+    try:
+        split_indices = load_split_indices(file_path=split_file_path)
+        df = pd.read_csv(resolve_artifact_path(feature_store_file_path), usecols=usecols)
+        return (df.iloc[split_indices["train"]].reset_index(drop=True),
+                df.iloc[split_indices["test"]].reset_index(drop=True))
+    except Exception as e:
+        raise SensorException(e, sys) from e
+
 def load_numpy_array_data(file_path:str)->np.array:
     """
     load the numpy array data from file
@@ -88,7 +276,7 @@ def load_numpy_array_data(file_path:str)->np.array:
     return:np.array data loaded
     """ 
     try:
-        with open (file_path, "rb") as file_obj:
+        with open_artifact(file_path) as file_obj:
             return np.load(file_obj)
     except Exception as e:
         raise SensorException(e,sys)
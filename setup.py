@@ -17,7 +17,7 @@ setup(
     version='0.0.1',
     author='inueron',
     author_email='ravi544747@gmail.com',
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmark", "benchmark.*"]),
     install_requires=get_requirements(),
 
 )
\ No newline at end of file
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sensor import utils
+from sensor.config import TARGET_COLUMN
+from sensor.entity.config_entity import (TRANSFORMER_OBJECT_FILE_NAME, TARGET_ENCODER_OBJECT_FILE_NAME, MODEL_FILE_NAME,
+                                         FEATURE_STATS_FILE_NAME)
+
+FEATURE_NAMES = [f"{prefix}_000" for prefix in ("aa", "ab", "ac", "ad", "ae", "af")]
+
+
+def make_sensor_frame(n_rows:int, seed:int=0)->pd.DataFrame:
+    """
+    Sensor readings with a few "na" values, the positive class reads higher on the first two sensors
+    """
+    rng = np.random.default_rng(seed)
+    target = rng.random(n_rows) < 0.2
+    values = rng.normal(10, 2, size=(n_rows, len(FEATURE_NAMES)))
+    values[target, :2] += 6
+    df = pd.DataFrame(np.round(values, 3), columns=FEATURE_NAMES).astype(object)
+    df = df.mask(rng.random(df.shape) < 0.02, "na")
+    df.insert(0, TARGET_COLUMN, np.where(target, "pos", "neg"))
+    return df
+
+
+def save_model_bundle(version_dir, model_seed:int=0):
+    """
+    Fits a small transformer, model and target encoder on synthetic readings and saves them in the registry layout
+    """
+    from sklearn.preprocessing import LabelEncoder
+    from xgboost import XGBClassifier
+    from sensor.components.data_transformation import DataTransformation
+    df = make_sensor_frame(n_rows=600, seed=model_seed).replace("na", np.nan)
+    x = df[FEATURE_NAMES].astype(float)
+    target_encoder = LabelEncoder().fit(df[TARGET_COLUMN])
+    transformer = DataTransformation.get_data_transformer_object().fit(x)
+    model = XGBClassifier(n_estimators=10, max_depth=3, random_state=model_seed)
+    model.fit(transformer.transform(x), target_encoder.transform(df[TARGET_COLUMN]))
+    utils.save_object(file_path=str(version_dir / "transformer" / TRANSFORMER_OBJECT_FILE_NAME), obj=transformer)
+    utils.save_object(file_path=str(version_dir / "model" / MODEL_FILE_NAME), obj=model)
+    utils.save_object(file_path=str(version_dir / "target_encoder" / TARGET_ENCODER_OBJECT_FILE_NAME), obj=target_encoder)
+    utils.write_yaml_file(file_path=str(version_dir / FEATURE_STATS_FILE_NAME), data=utils.get_feature_stats(df=x))
+
+
+@pytest.fixture(scope="session")
+def model_registry(tmp_path_factory)->str:
+    model_registry = tmp_path_factory.mktemp("saved_models")
+    save_model_bundle(model_registry / "0")
+    return str(model_registry)
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    """
+    Three input files of 200 rows, without the target column
+    """
+    input_dir = tmp_path / "input_files"
+    input_dir.mkdir()
+    for index in range(3):
+        make_sensor_frame(n_rows=200, seed=index + 1).drop(columns=TARGET_COLUMN).to_csv(
+            input_dir / f"file_{index}.csv", index=False)
+    return input_dir
@@ -0,0 +1,82 @@
+import os
+import pytest
+from sensor.entity.config_entity import BatchPredictionConfig
+from sensor.exception import SensorException
+from sensor.pipeline.batch_prediction import gather_shard_summaries, plan_batch_prediction_shards, predict_shard
+from sensor.pipeline.prediction_manifest import PredictionManifest
+from sensor.utils import read_yaml_file
+
+
+@pytest.fixture
+def batch_prediction_config(tmp_path):
+    # without validation a non numeric cell fails the file instead of quarantining it
+    return BatchPredictionConfig(prediction_dir=str(tmp_path / "prediction"), max_workers=1, passthrough_columns=[],
+                                 input_validation=None, manifest_file_path=str(tmp_path / "manifest" / "manifest.yaml"))
+
+
+def break_file(file_path):
+    with open(file_path) as file_obj:
+        lines = file_obj.readlines()
+    lines[1] = "abc," + lines[1].split(",", 1)[1]
+    with open(file_path, "w") as file_obj:
+        file_obj.writelines(lines)
+
+
+def run_shards(plan:dict, batch_prediction_config:BatchPredictionConfig, model_registry:str)->list:
+    return [predict_shard(input_file_paths=shard["input_file_paths"], model_version=plan["model_version"],
+                          shard_index=shard["shard_index"], batch_prediction_config=batch_prediction_config,
+                          model_registry=model_registry)
+            for shard in plan["shards"]]
+
+
+def recorded_files(batch_prediction_config:BatchPredictionConfig)->list:
+    manifest = PredictionManifest(manifest_file_path=batch_prediction_config.manifest_file_path)
+    return sorted(os.path.basename(entry["input_file_path"]) for entry in manifest.entries.values())
+
+
+def test_failed_file_does_not_discard_the_other_shards(input_dir, model_registry, batch_prediction_config):
+    break_file(input_dir / "file_1.csv")
+    plan = plan_batch_prediction_shards(input_dir=str(input_dir), n_shards=2,
+                                        batch_prediction_config=batch_prediction_config, model_registry=model_registry)
+    assert len(plan["shards"]) == 2
+
+    shard_summaries = run_shards(plan, batch_prediction_config, model_registry)
+    failed_files = [failed["input_file_path"] for shard_summary in shard_summaries for failed in shard_summary["failed_files"]]
+    assert [os.path.basename(file_path) for file_path in failed_files] == ["file_1.csv"]
+
+    with pytest.raises(SensorException, match="1 file\\(s\\) failed to score"):
+        gather_shard_summaries(plan=plan, shard_summaries=shard_summaries, batch_prediction_config=batch_prediction_config)
+    assert recorded_files(batch_prediction_config) == ["file_0.csv", "file_2.csv"]
+    summary_file_path = os.path.join(batch_prediction_config.prediction_dir, batch_prediction_config.summary_file_name)
+    summary = read_yaml_file(summary_file_path)
+    assert summary["total_rows"] == 400
+    assert len(summary["failed_files"]) == 1
+
+
+def test_shard_without_summary_counts_as_failed(input_dir, model_registry, batch_prediction_config):
+    plan = plan_batch_prediction_shards(input_dir=str(input_dir), n_shards=3,
+                                        batch_prediction_config=batch_prediction_config, model_registry=model_registry)
+    shard_summaries = run_shards(plan, batch_prediction_config, model_registry)
+    lost_shard = plan["shards"][0]
+
+    with pytest.raises(SensorException, match="1 file\\(s\\) failed to score"):
+        gather_shard_summaries(plan=plan, shard_summaries=shard_summaries[1:] + [None],
+                               batch_prediction_config=batch_prediction_config)
+    lost_files = [os.path.basename(file_path) for file_path in lost_shard["input_file_paths"]]
+    assert recorded_files(batch_prediction_config) == sorted({"file_0.csv", "file_1.csv", "file_2.csv"} - set(lost_files))
+
+
+def test_empty_plan_is_gathered(input_dir, model_registry, batch_prediction_config):
+    plan = plan_batch_prediction_shards(input_dir=str(input_dir), n_shards=2,
+                                        batch_prediction_config=batch_prediction_config, model_registry=model_registry)
+    gather_shard_summaries(plan=plan, shard_summaries=run_shards(plan, batch_prediction_config, model_registry),
+                           batch_prediction_config=batch_prediction_config)
+
+    plan = plan_batch_prediction_shards(input_dir=str(input_dir), n_shards=2,
+                                        batch_prediction_config=batch_prediction_config, model_registry=model_registry)
+    assert plan["shards"] == []
+    assert len(plan["skipped_files"]) == 3
+    summary = read_yaml_file(gather_shard_summaries(plan=plan, shard_summaries=[],
+                                                    batch_prediction_config=batch_prediction_config))
+    assert summary["total_rows"] == 0
+    assert len(summary["skipped_files"]) == 3
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sensor import config, utils
+from sensor.config import TARGET_COLUMN
+
+mongomock = pytest.importorskip("mongomock")
+
+DATABASE_NAME = "aps"
+COLLECTION_NAME = "sensor"
+MISSING_THRESHOLD = 0.7
+
+
+def make_documents(n_rows:int=500, seed:int=42)->list:
+    """
+    Documents shaped like the APS collection: numbers, "na" strings, nulls, absent fields and mostly missing fields
+    """
+    rng = np.random.default_rng(seed)
+    documents = []
+    for row in range(n_rows):
+        document = {TARGET_COLUMN: "pos" if rng.random() < 0.1 else "neg",
+                    "aa_000": int(rng.integers(0, 100000)),
+                    "ab_000": "na" if rng.random() < 0.3 else float(rng.normal(5, 2)),
+                    "ac_000": None if rng.random() < 0.2 else float(rng.normal(-3, 1)),
+                    "cr_000": "na" if rng.random() < 0.8 else int(rng.integers(0, 10)),
+                    "br_000": None if rng.random() < 0.5 else ("na" if rng.random() < 0.8 else float(rng.random()))}
+        # a field absent from some documents counts as missing, the first document keeps every field
+        if row > 0 and rng.random() < 0.4:
+            del document["ac_000"]
+        documents.append(document)
+    return documents
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    client = mongomock.MongoClient()
+    collection = client[DATABASE_NAME][COLLECTION_NAME]
+    collection.insert_many(make_documents())
+    monkeypatch.setattr(config, "_mongo_client", client)
+    return collection
+
+
+def test_field_stats_match_pandas(collection):
+    field_stats = utils.get_collection_field_stats(database_name=DATABASE_NAME, collection_name=COLLECTION_NAME)
+
+    df = pd.DataFrame(list(collection.find({}, {"_id": 0})))
+    missing_ratio = df.replace("na", np.nan).isna().mean()
+    numeric_df = df.apply(pd.to_numeric, errors="coerce")
+    assert field_stats["count"] == len(df)
+    assert sorted(field_stats["fields"]) == sorted(df.columns)
+    for field, stats in field_stats["fields"].items():
+        assert stats["missing_ratio"] == pytest.approx(missing_ratio[field]), field
+        assert stats["na"] == int((df[field] == "na").sum()), field
+        assert stats["present"] == int(df[field].replace("na", np.nan).notna().sum()), field
+        if field == TARGET_COLUMN:
+            continue
+        assert stats["min"] == pytest.approx(numeric_df[field].min()), field
+        assert stats["max"] == pytest.approx(numeric_df[field].max()), field
+
+
+def test_fields_dropped_as_missing_match_pandas(collection):
+    field_stats = utils.get_collection_field_stats(database_name=DATABASE_NAME, collection_name=COLLECTION_NAME)
+    drop_fields = sorted(field for field, stats in field_stats["fields"].items()
+                         if stats["missing_ratio"] > MISSING_THRESHOLD)
+
+    df = pd.DataFrame(list(collection.find({}, {"_id": 0})))
+    missing_ratio = df.replace("na", np.nan).isna().mean()
+    assert drop_fields == sorted(missing_ratio[missing_ratio > MISSING_THRESHOLD].index)
+    assert drop_fields == ["br_000", "cr_000"]
+
+
+def test_field_stats_of_selected_fields(collection):
+    field_stats = utils.get_collection_field_stats(database_name=DATABASE_NAME, collection_name=COLLECTION_NAME,
+                                                   fields=["aa_000", "cr_000"])
+    assert list(field_stats["fields"]) == ["aa_000", "cr_000"]
+    assert field_stats["fields"]["aa_000"]["missing_ratio"] == 0
+
+
+def test_fields_absent_from_the_first_document_are_described(monkeypatch, tmp_path):
+    from sensor.components.data_ingestion import DataIngestion
+    from sensor.entity.config_entity import DataIngestionConfig, TrainingPipelineConfig
+    client = mongomock.MongoClient()
+    documents = make_documents(n_rows=100)
+    del documents[0]["ac_000"]
+    for document in documents[1:50]:
+        document["ba_000"] = 1.5
+    client[DATABASE_NAME][COLLECTION_NAME].insert_many(documents)
+    monkeypatch.setattr(config, "_mongo_client", client)
+
+    field_stats = utils.get_collection_field_stats(database_name=DATABASE_NAME, collection_name=COLLECTION_NAME)
+    assert "ac_000" in field_stats["fields"]
+    assert field_stats["fields"]["ba_000"]["missing_ratio"] == pytest.approx(0.51)
+    assert field_stats["fields"]["ba_000"]["max"] == 1.5
+
+    # the fields ingestion reads come from the same statistics
+    monkeypatch.chdir(tmp_path)
+    data_ingestion = DataIngestion(data_ingestion_config=DataIngestionConfig(TrainingPipelineConfig()))
+    columns = data_ingestion.drop_missing_fields()
+    assert "ac_000" in columns
+    assert "ba_000" in columns
+
+
+def test_field_stats_of_an_empty_collection(monkeypatch):
+    monkeypatch.setattr(config, "_mongo_client", mongomock.MongoClient())
+    assert utils.get_collection_field_stats(database_name=DATABASE_NAME, collection_name=COLLECTION_NAME) == \
+        {"count": 0, "fields": dict()}
@@ -0,0 +1,81 @@
+import dataclasses
+import os
+import pandas as pd
+import pytest
+from sensor.entity.config_entity import BatchPredictionConfig
+from sensor.pipeline.batch_prediction import (gather_shard_summaries, plan_batch_prediction_shards, predict_file,
+                                              predict_shard)
+from sensor.predictor import ModelResolver, load_model_bundle
+from sensor.utils import read_yaml_file
+
+
+class NoModelWork:
+    """
+    Stands in for the transformer and model, only the feature names may be read before validation passed
+    """
+
+    def __init__(self, feature_names_in_=None):
+        self.feature_names_in_ = feature_names_in_
+
+    def __getattr__(self, name):
+        raise AssertionError(f"{name} used before the input passed validation")
+
+
+def drop_column(file_path, column:str):
+    pd.read_csv(file_path).drop(columns=column).to_csv(file_path, index=False)
+
+
+@pytest.fixture
+def bundle(model_registry):
+    return load_model_bundle(ModelResolver(model_registry=model_registry).get_bundle_paths(version=0))
+
+
+@pytest.mark.parametrize("chunk_size", [None, 50])
+def test_file_missing_columns_is_quarantined_before_model_work(input_dir, bundle, tmp_path, chunk_size):
+    input_file_path = str(input_dir / "file_1.csv")
+    drop_column(input_file_path, "ac_000")
+    batch_prediction_config = BatchPredictionConfig(prediction_dir=str(tmp_path / "prediction"), chunk_size=chunk_size)
+    guarded_bundle = dataclasses.replace(bundle, model=NoModelWork(),
+                                         transformer=NoModelWork(feature_names_in_=bundle.transformer.feature_names_in_))
+
+    file_stats = predict_file(input_file_path=input_file_path, bundle=guarded_bundle,
+                              batch_prediction_config=batch_prediction_config)
+    assert file_stats["quarantined"]
+    assert file_stats["issues"] == ["1 feature column(s) missing"]
+    assert os.listdir(batch_prediction_config.prediction_dir) == []
+    # the input is copied, not moved, and the report is written next to the copy
+    assert os.path.exists(input_file_path)
+    report = read_yaml_file(f"{file_stats['quarantine_file_path']}.validation.yaml")
+    assert report["missing_columns"] == ["ac_000"]
+    assert report["model_version"] == 0
+
+
+def test_valid_file_is_scored(input_dir, bundle, tmp_path):
+    batch_prediction_config = BatchPredictionConfig(prediction_dir=str(tmp_path / "prediction"), chunk_size=50)
+    file_stats = predict_file(input_file_path=str(input_dir / "file_0.csv"), bundle=bundle,
+                              batch_prediction_config=batch_prediction_config)
+    assert not file_stats.get("quarantined")
+    assert file_stats["rows"] == 200
+    assert not os.path.exists(batch_prediction_config.quarantine_dir)
+
+
+def test_quarantined_file_is_recorded_and_not_quarantined_again(input_dir, model_registry, tmp_path):
+    drop_column(input_dir / "file_2.csv", "aa_000")
+    batch_prediction_config = BatchPredictionConfig(prediction_dir=str(tmp_path / "prediction"), max_workers=1,
+                                                    manifest_file_path=str(tmp_path / "manifest" / "manifest.yaml"))
+    plan = plan_batch_prediction_shards(input_dir=str(input_dir), n_shards=1,
+                                        batch_prediction_config=batch_prediction_config, model_registry=model_registry)
+    shard_summaries = [predict_shard(input_file_paths=shard["input_file_paths"], model_version=plan["model_version"],
+                                     shard_index=shard["shard_index"], batch_prediction_config=batch_prediction_config,
+                                     model_registry=model_registry)
+                       for shard in plan["shards"]]
+    summary = read_yaml_file(gather_shard_summaries(plan=plan, shard_summaries=shard_summaries,
+                                                    batch_prediction_config=batch_prediction_config))
+    assert [os.path.basename(file_stats["input_file_path"]) for file_stats in summary["quarantined_files"]] == ["file_2.csv"]
+    assert summary["total_rows"] == 400
+    assert len(os.listdir(batch_prediction_config.quarantine_dir)) == 2
+
+    plan = plan_batch_prediction_shards(input_dir=str(input_dir), n_shards=1,
+                                        batch_prediction_config=batch_prediction_config, model_registry=model_registry)
+    assert plan["shards"] == []
+    assert len(plan["skipped_files"]) == 3
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import pytest
+from sensor import object_store
+from sensor.entity.config_entity import ObjectStoreConfig
+from sensor.exception import SensorException
+from sensor.object_store import LocalObjectStore, ObjectStoreSync, compute_etag
+
+
+class FlakyObjectStore(LocalObjectStore):
+    """
+    Fails the first n_failures uploads of every key
+    """
+
+    def __init__(self, object_store_config:ObjectStoreConfig, n_failures:int):
+        super().__init__(object_store_config)
+        self.n_failures = n_failures
+        self.attempts = dict()
+
+    def upload_file(self, file_path:str, key:str):
+        self.attempts[key] = self.attempts.get(key, 0) + 1
+        if self.attempts[key] <= self.n_failures:
+            raise ConnectionError(f"upload of {key} interrupted")
+        super().upload_file(file_path, key)
+
+
+def make_config(tmp_path, **kwargs)->ObjectStoreConfig:
+    return ObjectStoreConfig(backend="local", local_root=str(tmp_path / "bucket"), **kwargs)
+
+
+def write_files(local_dir, files:dict):
+    for relative_path, content in files.items():
+        file_path = local_dir / relative_path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(object_store.time, "sleep", delays.append)
+    return delays
+
+
+def test_upload_and_download_dir_round_trip(tmp_path):
+    files = {"a.csv": b"a,b\n1,2\n", "nested/b.csv": b"a,b\n3,4\n"}
+    write_files(tmp_path / "local", files)
+    sync = ObjectStoreSync(LocalObjectStore(make_config(tmp_path)))
+
+    report = sync.upload_dir(local_dir=str(tmp_path / "local"), prefix="input_files")
+    assert report["files_transferred"] == 2
+    assert report["files_skipped"] == 0
+    assert report["bytes"] == sum(len(content) for content in files.values())
+
+    report = sync.download_dir(prefix="input_files", local_dir=str(tmp_path / "downloaded"))
+    assert report["files_transferred"] == 2
+    for relative_path, content in files.items():
+        assert (tmp_path / "downloaded" / relative_path).read_bytes() == content
+
+
+def test_identical_files_are_skipped_by_etag(tmp_path):
+    write_files(tmp_path / "local", {"a.csv": b"1", "b.csv": b"2"})
+    sync = ObjectStoreSync(LocalObjectStore(make_config(tmp_path)))
+    sync.upload_dir(local_dir=str(tmp_path / "local"), prefix="input_files")
+
+    report = sync.upload_dir(local_dir=str(tmp_path / "local"), prefix="input_files")
+    assert report["files_transferred"] == 0
+    assert report["files_skipped"] == 2
+
+    # same size, different content: only the etag tells the files apart
+    write_files(tmp_path / "local", {"b.csv": b"3"})
+    report = sync.upload_dir(local_dir=str(tmp_path / "local"), prefix="input_files")
+    assert report["files_transferred"] == 1
+    assert report["files_skipped"] == 1
+
+    sync.download_dir(prefix="input_files", local_dir=str(tmp_path / "downloaded"))
+    report = sync.download_dir(prefix="input_files", local_dir=str(tmp_path / "downloaded"))
+    assert report["files_transferred"] == 0
+    assert report["files_skipped"] == 2
+
+
+def test_multipart_etag(tmp_path):
+    content = os.urandom(2500)
+    file_path = tmp_path / "large.bin"
+    file_path.write_bytes(content)
+
+    assert compute_etag(str(file_path), multipart_threshold=4096, multipart_chunksize=1024) == hashlib.md5(content).hexdigest()
+    part_digests = b"".join(hashlib.md5(content[start:start+1024]).digest() for start in range(0, len(content), 1024))
+    expected_etag = f"{hashlib.md5(part_digests).hexdigest()}-3"
+    assert compute_etag(str(file_path), multipart_threshold=1024, multipart_chunksize=1024) == expected_etag
+
+
+def test_multipart_files_are_skipped_by_etag(tmp_path):
+    write_files(tmp_path / "local", {"large.bin": os.urandom(5000)})
+    sync = ObjectStoreSync(LocalObjectStore(make_config(tmp_path, multipart_threshold=1024, multipart_chunksize=1024)))
+    sync.upload_dir(local_dir=str(tmp_path / "local"), prefix="input_files")
+
+    remote_objects = sync.object_store.list_objects("input_files")
+    assert remote_objects["input_files/large.bin"].etag.endswith("-5")
+    report = sync.upload_dir(local_dir=str(tmp_path / "local"), prefix="input_files")
+    assert report["files_skipped"] == 1
+
+
+def test_failed_transfers_are_retried_with_backoff(tmp_path, sleeps):
+    write_files(tmp_path / "local", {"a.csv": b"1"})
+    flaky_store = FlakyObjectStore(make_config(tmp_path, max_retries=3, backoff_seconds=0.5), n_failures=2)
+
+    report = ObjectStoreSync(flaky_store).upload_dir(local_dir=str(tmp_path / "local"), prefix="input_files")
+    assert report["files_transferred"] == 1
+    assert report["files_failed"] == []
+    assert flaky_store.attempts == {"input_files/a.csv": 3}
+    assert sleeps == [0.5, 1.0]
+
+
+def test_failure_report_after_the_last_retry(tmp_path, sleeps):
+    write_files(tmp_path / "local", {"a.csv": b"1", "b.csv": b"2"})
+    flaky_store = FlakyObjectStore(make_config(tmp_path, max_retries=2, backoff_seconds=0.1, max_workers=1),
+                                   n_failures=10)
+
+    with pytest.raises(SensorException, match="2 file\\(s\\) failed to transfer"):
+        ObjectStoreSync(flaky_store).upload_dir(local_dir=str(tmp_path / "local"), prefix="input_files")
+    assert flaky_store.attempts == {"input_files/a.csv": 3, "input_files/b.csv": 3}
+    assert sorted(sleeps) == [0.1, 0.1, 0.2, 0.2]
+    assert flaky_store.list_objects("input_files") == {}
+
+
+def test_download_keys_fetches_only_the_given_keys(tmp_path):
+    write_files(tmp_path / "local", {"a.csv": b"1", "b.csv": b"2", "nested/c.csv": b"3"})
+    sync = ObjectStoreSync(LocalObjectStore(make_config(tmp_path)))
+    sync.upload_dir(local_dir=str(tmp_path / "local"), prefix="input_files")
+
+    report = sync.download_keys(prefix="input_files", relative_keys=["a.csv", "nested/c.csv"],
+                                local_dir=str(tmp_path / "shard"))
+    assert report["files_transferred"] == 2
+    assert sorted(os.listdir(tmp_path / "shard")) == ["a.csv", "nested"]
+
+    with pytest.raises(SensorException, match="not found"):
+        sync.download_keys(prefix="input_files", relative_keys=["missing.csv"], local_dir=str(tmp_path / "shard"))
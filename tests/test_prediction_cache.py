@@ -0,0 +1,50 @@
+import numpy as np
+from conftest import FEATURE_NAMES, make_sensor_frame, save_model_bundle
+from sensor.predictor import ModelResolver, load_model_bundle, predict_dataframe
+from sensor.pipeline.prediction_cache import PredictionCache, predict_unique_rows
+
+
+def score(df, bundle, cache):
+    scored_df, stats = predict_unique_rows(df=df.copy(), transformer=bundle.transformer, model=bundle.model,
+                                           target_encoder=bundle.target_encoder, cache=cache)
+    cache.flush()
+    return scored_df, stats
+
+
+def test_cached_predictions_match_scoring(tmp_path):
+    save_model_bundle(tmp_path / "saved_models" / "0")
+    bundle = load_model_bundle(ModelResolver(model_registry=str(tmp_path / "saved_models")).get_bundle_paths(version=0))
+    df = make_sensor_frame(n_rows=300, seed=5)[FEATURE_NAMES].replace("na", np.nan).astype(float)
+    cache_file_path = str(tmp_path / "cache" / "predictions.sqlite")
+
+    scored_df, stats = score(df, bundle, PredictionCache(cache_file_path=cache_file_path, model_hash=bundle.content_hash))
+    assert stats["cache_hits"] == 0
+
+    # a new cache on the same file serves every row of the same model
+    cached_df, stats = score(df, bundle, PredictionCache(cache_file_path=cache_file_path, model_hash=bundle.content_hash))
+    assert stats["cache_hits"] == len(df)
+    assert (cached_df["prediction"] == scored_df["prediction"]).all()
+
+
+def test_retrained_bundle_with_the_same_version_is_not_served_from_cache(tmp_path):
+    model_registry = tmp_path / "saved_models"
+    resolver = ModelResolver(model_registry=str(model_registry))
+    df = make_sensor_frame(n_rows=300, seed=5)[FEATURE_NAMES].replace("na", np.nan).astype(float)
+    cache_file_path = str(tmp_path / "cache" / "predictions.sqlite")
+
+    save_model_bundle(model_registry / "0", model_seed=0)
+    bundle = load_model_bundle(resolver.get_bundle_paths(version=0))
+    score(df, bundle, PredictionCache(cache_file_path=cache_file_path, model_hash=bundle.content_hash))
+
+    # the registry is reset and a different model is published again as version 0
+    save_model_bundle(model_registry / "0", model_seed=1)
+    retrained_bundle = load_model_bundle(resolver.get_bundle_paths(version=0))
+    assert retrained_bundle.version == bundle.version
+    assert retrained_bundle.content_hash != bundle.content_hash
+
+    cache = PredictionCache(cache_file_path=cache_file_path, model_hash=retrained_bundle.content_hash)
+    scored_df, stats = score(df, retrained_bundle, cache)
+    assert stats["cache_hits"] == 0
+    expected_df = predict_dataframe(df=df.copy(), transformer=retrained_bundle.transformer, model=retrained_bundle.model,
+                                    target_encoder=retrained_bundle.target_encoder)
+    assert (scored_df["prediction"] == expected_df["prediction"]).all()